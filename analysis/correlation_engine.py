@@ -0,0 +1,759 @@
+# Project: NBA Correlations App
+# Description: Vectorized Pearson and Spearman correlation matrices
+# Data Sources: Basketball-Reference
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+METHODS = ['pearson', 'spearman']
+# Weight of the identity in the correlation matrix inverted for partial
+# correlations; keeps the inversion stable when statistics are collinear
+# (W, L and W/L%) or outnumber observations (one season of 30 teams)
+PARTIAL_SHRINKAGE = 0.05
+
+
+def rank_columns(values, groups=None):
+    """
+    Rank every column of a 2-D array, assigning tied values their average
+    rank (pandas' method='average'). Missing values keep a rank of NaN.
+
+    Args:
+        values (ndarray): Array of shape (observations, statistics).
+        groups (ndarray): Optional integer group code per observation. Ranks
+                          are then computed within each group in the same pass.
+
+    Returns:
+        ranks (ndarray): float64 array of 1-based ranks, same shape as values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    # Sort each statistic as a contiguous row; NaNs sort last
+    rows = np.ascontiguousarray(values.T)
+    n = rows.shape[1]
+    order = np.argsort(rows, axis=1)
+    if groups is not None:
+        # A stable sort on the group code keeps values sorted within groups
+        groups = np.asarray(groups)
+        order = np.take_along_axis(order, np.argsort(groups[order], axis=1, kind='mergesort'), axis=1)
+    sorted_rows = np.take_along_axis(rows, order, axis=1)
+    positions = np.arange(n)[None, :]
+    ranks = np.empty(rows.shape)
+
+    # Ties form runs in the sorted rows; every member of a run gets the
+    # average of the run's first and last position
+    starts = np.ones(sorted_rows.shape, dtype=bool)
+    starts[:, 1:] = sorted_rows[:, 1:] != sorted_rows[:, :-1]
+    if groups is None and starts.all():
+        # Without ties a rank is the position in sort order
+        np.put_along_axis(ranks, order, np.broadcast_to(positions + 1.0, order.shape), axis=1)
+        ranks = ranks.T
+        ranks[np.isnan(values)] = np.nan
+        return ranks
+    if groups is not None:
+        sorted_groups = groups[order]
+        group_starts = np.ones(sorted_rows.shape, dtype=bool)
+        group_starts[:, 1:] = sorted_groups[:, 1:] != sorted_groups[:, :-1]
+        starts |= group_starts
+        offset = np.maximum.accumulate(np.where(group_starts, positions, 0), axis=1)
+    else:
+        offset = 0
+    ends = np.ones(sorted_rows.shape, dtype=bool)
+    ends[:, :-1] = starts[:, 1:]
+    first = np.maximum.accumulate(np.where(starts, positions, 0), axis=1)
+    last = np.minimum.accumulate(np.where(ends, positions, n - 1)[:, ::-1], axis=1)[:, ::-1]
+
+    np.put_along_axis(ranks, order, (first + last) / 2.0 + 1 - offset, axis=1)
+    ranks = ranks.T
+    ranks[np.isnan(values)] = np.nan
+    return ranks
+
+
+def _pearson(values, mask, dtype, min_periods, rows=None):
+    """
+    Pairwise-complete Pearson correlation of the columns of `values`. With
+    `rows`, only the correlations of those columns against every column are
+    computed, giving a (len(rows), statistics) block of the matrix.
+    """
+    complete = mask.all()
+    every_row = rows is None
+    rows = np.arange(values.shape[1]) if rows is None else np.asarray(rows)
+    # Center and scale each column once; correlation is invariant to both and
+    # it keeps the pairwise sums below well conditioned
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        # Columns with no observations (e.g. residualized controls) stay NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        center = values.mean(axis=0) if complete else np.nanmean(values, axis=0)
+        scale = values.std(axis=0) if complete else np.nanstd(values, axis=0)
+    scale[~(scale > 0)] = 1.0
+    z = (values - center) / scale
+    z = (z if complete else np.where(mask, z, 0.0)).astype(dtype, copy=False)
+    z_rows = z if every_row else z[:, rows]
+
+    if complete:
+        n = values.shape[0]
+        sums = z.sum(axis=0, dtype=np.float64)
+        squares = (z * z).sum(axis=0, dtype=np.float64) - sums * sums / n
+        # z.T against z itself is a symmetric product, half the work
+        cross = np.dot(z_rows.T, z).astype(np.float64) - np.outer(sums[rows], sums) / n
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = cross / np.sqrt(np.outer(squares[rows], squares))
+        counts = np.full(corr.shape, n)
+    else:
+        # Each statistic restricted to the rows where its partner is observed
+        m = mask.astype(dtype)
+        m_rows = m[:, rows]
+        counts = np.dot(m_rows.T, m).astype(np.float64)
+        row_sums = np.dot(z_rows.T, m).astype(np.float64)
+        col_sums = np.dot(m_rows.T, z).astype(np.float64)
+        row_squares = np.dot((z_rows * z_rows).T, m).astype(np.float64)
+        col_squares = np.dot(m_rows.T, z * z).astype(np.float64)
+        cross = np.dot(z_rows.T, z).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = cross - row_sums * col_sums / counts
+            row_var = row_squares - row_sums * row_sums / counts
+            col_var = col_squares - col_sums * col_sums / counts
+            corr = cov / np.sqrt(row_var * col_var)
+
+    corr[counts < max(min_periods, 2)] = np.nan
+    np.clip(corr, -1, 1, out=corr)
+    return corr
+
+
+def _sorted_runs(rows):
+    """
+    Sort order of every row of a (statistics, observations) array, with the
+    first and one-past-last sort position of each position's run of tied
+    values. Missing values sort last.
+    """
+    order = np.argsort(rows, axis=1, kind='mergesort')
+    sorted_rows = np.take_along_axis(rows, order, axis=1)
+    n = rows.shape[1]
+    starts = np.ones(sorted_rows.shape, dtype=bool)
+    starts[:, 1:] = sorted_rows[:, 1:] != sorted_rows[:, :-1]
+    positions = np.arange(n)[None, :]
+    run_start = np.maximum.accumulate(np.where(starts, positions, 0), axis=1)
+    ends = np.ones(sorted_rows.shape, dtype=bool)
+    ends[:, :-1] = starts[:, 1:]
+    run_end = np.minimum.accumulate(np.where(ends, positions, n - 1)[:, ::-1], axis=1)[:, ::-1] + 1
+    return order, run_start, run_end
+
+
+def _ranks_on(observed, order, run_start, run_end):
+    """
+    Average ranks within each row of a (statistics, observations) array
+    among its `observed` entries only, from the row's sort order and tie
+    runs: an entry's rank counts the observed entries sorting before its run
+    plus half of those within it. Orders and runs given as 1-D arrays are
+    shared by every row.
+    """
+    if order.ndim == 1:
+        sorted_observed = observed[:, order]
+    else:
+        sorted_observed = np.take_along_axis(observed, order, axis=1)
+    counts = np.zeros((len(observed), observed.shape[1] + 1))
+    np.cumsum(sorted_observed, axis=1, out=counts[:, 1:])
+    if order.ndim == 1:
+        below, upto = counts[:, run_start], counts[:, run_end]
+    else:
+        below, upto = np.take_along_axis(counts, run_start, axis=1), np.take_along_axis(counts, run_end, axis=1)
+    ranks = np.empty(observed.shape)
+    if order.ndim == 1:
+        ranks[:, order] = below + (upto - below + 1) / 2.0
+    else:
+        np.put_along_axis(ranks, order, below + (upto - below + 1) / 2.0, axis=1)
+    return ranks
+
+
+def _common_row_spearman(values, mask, pairs, min_periods):
+    """
+    Spearman correlation of (i, j) column pairs on the rows where both are
+    observed. Every column is sorted once; for each column i, i and all of
+    its partners are then ranked on their common rows at once by cumulative
+    counts along those sort orders, without sorting again.
+
+    Args:
+        values (ndarray): Array of shape (observations, statistics).
+        mask (ndarray): Observed values.
+        pairs (tuple): Arrays of the column indices i and j of every pair.
+        min_periods (int): Minimum common observations for a valid result.
+
+    Returns:
+        corr (ndarray): Correlation of every pair, NaN when undefined.
+    """
+    first, second = (np.asarray(columns) for columns in pairs)
+    corr = np.full(len(first), np.nan)
+    if not len(first):
+        return corr
+    # Statistics as contiguous rows, as in rank_columns
+    rows = np.ascontiguousarray(np.asarray(values, dtype=np.float64).T)
+    observed_rows = np.ascontiguousarray(mask.T)
+    order, run_start, run_end = _sorted_runs(rows)
+    for i in np.unique(first):
+        selected = np.flatnonzero(first == i)
+        partners = second[selected]
+        common = observed_rows[i] & observed_rows[partners]
+        x_ranks = _ranks_on(common, order[i], run_start[i], run_end[i])
+        y_ranks = _ranks_on(common, order[partners], run_start[partners], run_end[partners])
+        n = common.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # Average ranks of n observations always have mean (n + 1) / 2
+            x_centered = np.where(common, x_ranks - (n[:, None] + 1) / 2.0, 0.0)
+            y_centered = np.where(common, y_ranks - (n[:, None] + 1) / 2.0, 0.0)
+            pair_corr = ((x_centered * y_centered).sum(axis=1)
+                         / np.sqrt((x_centered ** 2).sum(axis=1) * (y_centered ** 2).sum(axis=1)))
+        pair_corr[n < max(min_periods, 2)] = np.nan
+        corr[selected] = np.clip(pair_corr, -1, 1)
+    return corr
+
+
+def _spearman(values, mask, dtype, min_periods, rows=None, ranks=None, common_rows=True):
+    """Pairwise-complete Spearman correlation of the columns of `values`."""
+    every_row = rows is None
+    rows = np.arange(values.shape[1]) if rows is None else np.asarray(rows)
+    ranks = rank_columns(values) if ranks is None else ranks
+    corr = _pearson(ranks, mask, dtype, min_periods, None if every_row else rows)
+
+    # Column-level ranks are only exact for pairs observed on the same rows;
+    # pairs with differing missing rows are re-ranked on their common rows
+    if common_rows and not mask.all():
+        observed = mask.sum(axis=0)
+        counts = np.dot(mask[:, rows].T.astype(np.float64), mask.astype(np.float64))
+        mismatched = (counts < observed[rows][:, None]) | (counts < observed[None, :])
+        if every_row:
+            # The matrix is symmetric, so each pair is computed once
+            mismatched = np.triu(mismatched, 1)
+        b, j = np.nonzero(mismatched)
+        corr[b, j] = _common_row_spearman(values, mask, (rows[b], j), min_periods)
+        if every_row:
+            corr[j, b] = corr[b, j]
+    return corr
+
+
+def correlation_matrices(values, methods=METHODS, dtype=np.float64, min_periods=1, common_rows=True):
+    """
+    Compute correlation matrices between the columns of a 2-D array as
+    batched matrix products. Missing values (NaN) are handled with masks so
+    every pair uses its pairwise-complete observations, matching
+    DataFrame.corr.
+
+    Args:
+        values (ndarray): Array of shape (observations, statistics).
+        methods (list): Any of 'pearson' and 'spearman'.
+        dtype (type): Floating point type of the matrix products. float32
+                      roughly halves time and memory for wide inputs at the
+                      cost of precision. Defaults to np.float64.
+        min_periods (int): Minimum pairwise observations for a valid result.
+        common_rows (bool): Rank each pair of statistics with different
+                            missing rows again on their common rows, so
+                            Spearman matches DataFrame.corr. False keeps the
+                            column-level ranks for every pair, as
+                            streaming_correlations does: one matrix product,
+                            approximate only for such pairs.
+
+    Returns:
+        matrices (dict): Method name to (statistics, statistics) float64 array.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    mask = ~np.isnan(values)
+    matrices = {}
+    for method in methods:
+        if method == 'pearson':
+            matrices[method] = _pearson(values, mask, dtype, min_periods)
+        elif method == 'spearman':
+            matrices[method] = _spearman(values, mask, dtype, min_periods, common_rows=common_rows)
+        else:
+            raise ValueError('method must be one of {0}, got {1!r}'.format(METHODS, method))
+    return matrices
+
+
+def _grouped_pearson(values, mask, codes, n_groups, targets, min_periods):
+    """Pairwise-complete Pearson correlation of `targets` against every column within each group."""
+    p = values.shape[1]
+    q = len(targets)
+    # Rows sorted by group, so per-group sums reduce contiguous runs and
+    # memory grows with the rows rather than rows times groups
+    order = np.argsort(codes, kind='mergesort')
+    starts = np.searchsorted(codes[order], np.arange(n_groups))
+
+    def group_totals(x):
+        return np.add.reduceat(x[order], starts, axis=0)
+
+    observed = mask.astype(np.float64)
+
+    # Standardize within each group so the products below are well conditioned
+    group_counts = group_totals(observed)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = group_totals(np.where(mask, values, 0.0)) / group_counts
+        centered = np.where(mask, values - means[codes], 0.0)
+        scale = np.sqrt(group_totals(centered ** 2) / group_counts)
+    scale[~(scale > 0)] = 1.0
+    z = centered / scale[codes]
+
+    # Per-group sums needed for each (target, statistic) pair: counts, sums,
+    # sums of squares and cross sums
+    z_targets = z[:, targets]
+    right = np.concatenate([observed, z, z * z], axis=1)[order]
+    sums = np.empty((3, q, n_groups, 3 * p))
+    for f, factor in enumerate((observed[:, targets], z_targets, z_targets ** 2)):
+        factor = factor[order]
+        for t in range(q):
+            sums[f, t] = np.add.reduceat(factor[:, t, None] * right, starts, axis=0)
+    sums = sums.reshape(3, q, n_groups, 3, p).transpose(0, 2, 1, 3, 4)
+    counts, stat_sums, stat_squares = sums[0, :, :, 0], sums[0, :, :, 1], sums[0, :, :, 2]
+    target_sums, cross = sums[1, :, :, 0], sums[1, :, :, 1]
+    target_squares = sums[2, :, :, 0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = cross - target_sums * stat_sums / counts
+        target_var = target_squares - target_sums ** 2 / counts
+        stat_var = stat_squares - stat_sums ** 2 / counts
+        corr = cov / np.sqrt(target_var * stat_var)
+
+    corr[counts < max(min_periods, 2)] = np.nan
+    np.clip(corr, -1, 1, out=corr)
+    return corr, counts, group_counts
+
+
+def grouped_target_correlations(values, groups, targets, methods=METHODS, min_periods=1):
+    """
+    Correlate target statistics against every statistic within each group
+    (e.g. season) in a single pass. Values are ranked and standardized within
+    their group once, and only target-vs-all correlations are computed.
+
+    Args:
+        values (ndarray): Array of shape (observations, statistics).
+        groups (array-like): Group label per observation.
+        targets (list): Column indices of the target statistics.
+        methods (list): Any of 'pearson' and 'spearman'.
+        min_periods (int): Minimum pairwise observations for a valid result.
+
+    Returns:
+        labels (ndarray): Sorted unique group labels.
+        correlations (dict): Method name to float64 array of shape
+        (groups, targets, statistics).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    mask = ~np.isnan(values)
+    labels, codes = np.unique(np.asarray(groups), return_inverse=True)
+    targets = list(targets)
+    correlations = {}
+    for method in methods:
+        if method == 'pearson':
+            correlations[method] = _grouped_pearson(values, mask, codes, len(labels), targets, min_periods)[0]
+        elif method == 'spearman':
+            ranks = rank_columns(values, codes)
+            corr, counts, group_counts = _grouped_pearson(ranks, mask, codes, len(labels), targets, min_periods)
+            # Re-rank pairs whose missing rows differ on their common rows,
+            # as in _spearman
+            target_counts = group_counts[:, targets][:, :, None]
+            mismatched = (counts < target_counts) | (counts < group_counts[:, None, :])
+            for k in np.flatnonzero(mismatched.any(axis=(1, 2))):
+                t, j = np.nonzero(mismatched[k])
+                in_group = codes == k
+                corr[k, t, j] = _common_row_spearman(values[in_group], mask[in_group],
+                                                     (np.asarray(targets)[t], j), min_periods)
+            correlations[method] = corr
+        else:
+            raise ValueError('method must be one of {0}, got {1!r}'.format(METHODS, method))
+    return labels, correlations
+
+
+def lag_pairs(entities, periods, lag=1, order=None):
+    """
+    Pair each observation with the observation of the same entity `lag`
+    periods later. Periods are aligned by their position in an explicit
+    ordering rather than by row order, so an entity missing a period is never
+    paired across the gap.
+
+    Args:
+        entities (array-like): Entity label per observation (e.g. franchise).
+        periods (array-like): Period label per observation (e.g. season).
+        lag (int): Number of periods between the paired observations.
+        order (list): Period labels in chronological order. Defaults to the
+                      sorted unique labels of `periods`.
+
+    Returns:
+        rows (ndarray): Row indices of the earlier observations, ascending.
+        lagged_rows (ndarray): Row indices of the matching later observations.
+    """
+    periods = np.asarray(periods)
+    order = np.unique(periods) if order is None else order
+    positions = pd.Index(order).get_indexer(periods)
+    if (positions < 0).any():
+        raise ValueError('Periods missing from order: {0}'.format(sorted(set(periods[positions < 0]))))
+    codes, labels = pd.factorize(np.asarray(entities))
+    grid = np.full((len(labels), len(order)), -1)
+    grid[codes, positions] = np.arange(len(periods))
+    if (grid >= 0).sum() < len(periods):
+        raise ValueError('Entities must have at most one observation per period')
+    if lag >= len(order):
+        return np.array([], dtype=int), np.array([], dtype=int)
+    earlier, later = grid[:, :len(order) - lag].ravel(), grid[:, lag:].ravel()
+    paired = (earlier >= 0) & (later >= 0)
+    rows, lagged_rows = earlier[paired], later[paired]
+    ascending = np.argsort(rows)
+    return rows[ascending], lagged_rows[ascending]
+
+
+def lagged_cross_correlations(values, entities, periods, lags, methods=METHODS, order=None,
+                              dtype=np.float64, min_periods=1):
+    """
+    Correlate every statistic in period t with every statistic in period
+    t + k for each lag k. Each lag is a single (statistics, 2 * statistics)
+    block of the correlation matrix of the paired observations.
+
+    Args:
+        values (ndarray): Array of shape (observations, statistics).
+        entities (array-like): Entity label per observation.
+        periods (array-like): Period label per observation.
+        lags (list): Lags k to compute.
+        methods (list): Any of 'pearson' and 'spearman'.
+        order (list): Period labels in chronological order. Defaults to the
+                      sorted unique labels of `periods`.
+        dtype (type): Floating point type of the matrix products.
+        min_periods (int): Minimum pairwise observations for a valid result.
+
+    Returns:
+        correlations (dict): Method name to float64 array of shape
+        (lags, statistics, statistics), where [l, i, j] correlates statistic
+        i in period t with statistic j in period t + lags[l].
+        counts (ndarray): Number of paired observations per lag.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n_statistics = values.shape[1]
+    rows = np.arange(n_statistics)
+    correlations = {}
+    for method in methods:
+        if method not in METHODS:
+            raise ValueError('method must be one of {0}, got {1!r}'.format(METHODS, method))
+        correlations[method] = np.full((len(lags), n_statistics, n_statistics), np.nan)
+    counts = np.zeros(len(lags), dtype=int)
+    for l, lag in enumerate(lags):
+        earlier, later = lag_pairs(entities, periods, lag, order)
+        counts[l] = len(earlier)
+        if not len(earlier):
+            continue
+        paired = np.concatenate([values[earlier], values[later]], axis=1)
+        mask = ~np.isnan(paired)
+        for method in methods:
+            if method == 'pearson':
+                block = _pearson(paired, mask, dtype, min_periods, rows)
+            else:
+                block = _spearman(paired, mask, dtype, min_periods, rows)
+            correlations[method][l] = block[:, n_statistics:]
+    return correlations, counts
+
+
+def residualize(values, controls):
+    """
+    Residuals of every column after a least-squares regression, with an
+    intercept, on the `controls` columns. Fully observed columns are
+    regressed together in a single least-squares solve; only columns with
+    missing values fall back to a solve on their own observed rows.
+
+    Args:
+        values (ndarray): Array of shape (observations, statistics).
+        controls (list): Column indices of the statistics controlled for.
+
+    Returns:
+        residuals (ndarray): float64 array of the same shape, NaN where the
+        value or any control is missing. Control columns are left NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    controls = list(controls)
+    design = np.column_stack([np.ones(len(values)), values[:, controls]])
+    usable = ~np.isnan(design).any(axis=1)
+    residuals = np.full(values.shape, np.nan)
+    observed = values[usable]
+    complete = ~np.isnan(observed).any(axis=0)
+    complete[controls] = False
+    coefficients = np.linalg.lstsq(design[usable], observed[:, complete], rcond=None)[0]
+    residuals[np.ix_(usable, complete)] = observed[:, complete] - np.dot(design[usable], coefficients)
+    incomplete = np.nonzero(~complete)[0]
+    for j in incomplete[~np.isin(incomplete, controls)]:
+        rows = usable & ~np.isnan(values[:, j])
+        if rows.any():
+            coefficients = np.linalg.lstsq(design[rows], values[rows, j], rcond=None)[0]
+            residuals[rows, j] = values[rows, j] - np.dot(design[rows], coefficients)
+    return residuals
+
+
+def partial_correlations(corr, shrinkage=PARTIAL_SHRINKAGE):
+    """
+    Partial correlation of every pair of statistics given all the others,
+    from a single eigendecomposition of the correlation matrix shrunk toward
+    the identity.
+
+    Args:
+        corr (ndarray): Correlation matrix of shape (statistics, statistics).
+        shrinkage (float): Weight of the identity, between 0 and 1.
+
+    Returns:
+        partial (ndarray): float64 array of the same shape. Statistics with
+        no valid correlation (e.g. constant ones) are NaN.
+    """
+    corr = np.array(corr, dtype=np.float64)
+    off_diagonal = corr.copy()
+    np.fill_diagonal(off_diagonal, np.nan)
+    valid = ~np.isnan(off_diagonal).all(axis=1)
+    # Pairs without enough common observations carry no information
+    shrunk = np.nan_to_num(corr[np.ix_(valid, valid)])
+    np.fill_diagonal(shrunk, 1.0)
+    shrunk = (1 - shrinkage) * shrunk + shrinkage * np.eye(len(shrunk))
+    eigenvalues, eigenvectors = np.linalg.eigh(shrunk)
+    # Pairwise-complete matrices need not be positive definite
+    eigenvalues = np.maximum(eigenvalues, max(shrinkage, 1e-10))
+    precision = np.dot(eigenvectors / eigenvalues, eigenvectors.T)
+    scale = np.sqrt(np.diag(precision))
+    partial = np.full(corr.shape, np.nan)
+    partial[np.ix_(valid, valid)] = -precision / np.outer(scale, scale)
+    partial[np.diag_indices_from(partial)] = np.where(valid, 1.0, np.nan)
+    return np.clip(partial, -1, 1)
+
+
+def adjusted_correlation_matrices(values, methods=METHODS, controls=None, partial=False,
+                                  shrinkage=PARTIAL_SHRINKAGE, dtype=np.float64, min_periods=1):
+    """
+    Correlation matrices adjusted for confounders. With `controls`, each
+    statistic is first residualized on the control statistics (Spearman uses
+    residuals of ranks). With `partial`, every pair is further conditioned on
+    all other statistics through the regularized precision matrix.
+
+    Args:
+        values (ndarray): Array of shape (observations, statistics).
+        methods (list): Any of 'pearson' and 'spearman'.
+        controls (list): Column indices of statistics to control for.
+        partial (bool): Compute partial correlations given all statistics.
+        shrinkage (float): See partial_correlations.
+        dtype (type): Floating point type of the matrix products.
+        min_periods (int): Minimum pairwise observations for a valid result.
+
+    Returns:
+        matrices (dict): Method name to (statistics, statistics) float64
+        array. Control statistics are NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not controls:
+        matrices = correlation_matrices(values, methods, dtype, min_periods)
+    else:
+        matrices = {}
+        for method in methods:
+            if method not in METHODS:
+                raise ValueError('method must be one of {0}, got {1!r}'.format(METHODS, method))
+            data = rank_columns(values) if method == 'spearman' else values
+            residuals = residualize(data, controls)
+            matrices[method] = _pearson(residuals, ~np.isnan(residuals), dtype, min_periods)
+    if partial:
+        matrices = {method: partial_correlations(matrix, shrinkage) for method, matrix in matrices.items()}
+    return matrices
+
+
+def grouped_adjusted_correlations(values, groups, targets, methods=METHODS, controls=None, partial=False,
+                                  shrinkage=PARTIAL_SHRINKAGE, min_periods=1):
+    """
+    Adjusted correlations of target statistics against every statistic
+    within each group, with one residualization and one factorization per
+    group and method. See adjusted_correlation_matrices.
+
+    Args:
+        values (ndarray): Array of shape (observations, statistics).
+        groups (array-like): Group label per observation.
+        targets (list): Column indices of the target statistics.
+        methods (list): Any of 'pearson' and 'spearman'.
+        controls (list): Column indices of statistics to control for.
+        partial (bool): Compute partial correlations given all statistics.
+        shrinkage (float): See partial_correlations.
+        min_periods (int): Minimum pairwise observations for a valid result.
+
+    Returns:
+        labels (ndarray): Sorted unique group labels.
+        correlations (dict): Method name to float64 array of shape
+        (groups, targets, statistics).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    labels, codes = np.unique(np.asarray(groups), return_inverse=True)
+    targets = list(targets)
+    correlations = {method: np.empty((len(labels), len(targets), values.shape[1])) for method in methods}
+    for k in range(len(labels)):
+        matrices = adjusted_correlation_matrices(values[codes == k], methods, controls, partial,
+                                                 shrinkage, min_periods=min_periods)
+        for method in methods:
+            correlations[method][k] = matrices[method][targets]
+    return labels, correlations
+
+
+def group_sums(values, groups, targets, reference=None):
+    """
+    Sufficient statistics of the correlation of each target against every
+    statistic within each group: the pairwise-complete count and the sums of
+    x, y, x^2, y^2 and xy. Sums are additive, so the correlation over any
+    union of groups follows from adding their sums, and removing a group is
+    a subtraction.
+
+    Args:
+        values (ndarray): Array of shape (observations, statistics).
+        groups (array-like): Group label per observation.
+        targets (list): Column indices of the target statistics.
+        reference (ndarray): Value subtracted from each statistic before
+                             summing, keeping the sums well conditioned.
+                             Defaults to each group's own column means, so
+                             a group's sums depend on its rows alone; sums
+                             about different references are added after
+                             rebase_sums.
+
+    Returns:
+        labels (ndarray): Sorted unique group labels.
+        sums (ndarray): float64 array of shape (groups, targets, statistics,
+        6) holding n, sum x, sum y, sum x^2, sum y^2 and sum xy, where x is
+        the target and y the statistic.
+        reference (ndarray): Reference value of each statistic in each
+        group, of shape (groups, statistics).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    labels, codes = np.unique(np.asarray(groups), return_inverse=True)
+    sums = np.empty((len(labels), len(targets), values.shape[1], 6))
+    if not len(values):
+        return labels, sums, np.zeros((0, values.shape[1])) if reference is None else \
+            np.broadcast_to(reference, (0, values.shape[1])).copy()
+    # Rows sorted by group, so per-group sums reduce contiguous runs and
+    # memory grows with the rows rather than rows times groups, as in
+    # _grouped_pearson
+    order = np.argsort(codes, kind='mergesort')
+    starts = np.searchsorted(codes[order], np.arange(len(labels)))
+    values = values[order]
+    mask = ~np.isnan(values)
+    if reference is None:
+        counts = np.add.reduceat(mask, starts, axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            reference = np.nan_to_num(np.add.reduceat(np.where(mask, values, 0.0), starts, axis=0) / counts)
+    else:
+        reference = np.broadcast_to(np.asarray(reference, dtype=np.float64), (len(labels), values.shape[1])).copy()
+    y = np.where(mask, values - reference[codes[order]], 0.0)
+    for t, target in enumerate(targets):
+        # Rows where both the target and the statistic are observed
+        both = mask[:, [target]] & mask
+        x = np.where(both, y[:, [target]], 0.0)
+        y_both = np.where(both, y, 0.0)
+        for k, term in enumerate([both, x, y_both, x * x, y_both * y_both, x * y_both]):
+            sums[:, t, :, k] = np.add.reduceat(term, starts, axis=0)
+    return labels, sums, reference
+
+
+def rebase_sums(sums, references, targets, reference):
+    """
+    Express per-group sums taken about per-group references about one
+    common reference, so they can be added.
+
+    Args:
+        sums (ndarray): Per-group sums from group_sums.
+        references (ndarray): (groups, statistics) references of the sums.
+        targets (list): Column indices of the target statistics.
+        reference (ndarray): Common reference value of each statistic.
+
+    Returns:
+        sums (ndarray): Sums of the same shape about `reference`.
+    """
+    # x - reference = (x - group reference) + shift
+    shift = np.asarray(references, dtype=np.float64) - reference
+    dx = shift[:, targets][:, :, None]
+    dy = shift[:, None, :]
+    n, sx, sy, sxx, syy, sxy = np.moveaxis(sums, -1, 0)
+    return np.stack([n, sx + n * dx, sy + n * dy,
+                     sxx + 2 * dx * sx + n * dx * dx,
+                     syy + 2 * dy * sy + n * dy * dy,
+                     sxy + dx * sy + dy * sx + n * dx * dy], axis=-1)
+
+
+def window_sums(sums, window=None):
+    """
+    Add per-group sufficient statistics over windows of consecutive groups.
+    Each window is the difference of two running totals, i.e. the previous
+    window plus the incoming group minus the outgoing one, so it costs
+    O(targets x statistics) however long the window is.
+
+    Args:
+        sums (ndarray): Per-group sums from group_sums, in chronological order.
+        window (int): Groups per rolling window. None gives expanding
+                      windows starting at the first group.
+
+    Returns:
+        sums (ndarray): Sums of every complete window, indexed by the
+        window's last group.
+    """
+    totals = np.cumsum(sums, axis=0)
+    if window is None:
+        return totals
+    if window > len(sums):
+        return totals[:0]
+    return np.concatenate([totals[window - 1:window], totals[window:] - totals[:-window]])
+
+
+def sums_correlations(sums, min_periods=1):
+    """
+    Pearson correlation from sufficient statistics.
+
+    Args:
+        sums (ndarray): Array whose last axis holds n, sum x, sum y, sum x^2,
+                        sum y^2 and sum xy, as returned by group_sums.
+        min_periods (int): Minimum pairwise observations for a valid result.
+
+    Returns:
+        corr (ndarray): float64 array of the leading shape of `sums`.
+    """
+    n, sx, sy, sxx, syy, sxy = np.moveaxis(sums, -1, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = (sxy - sx * sy / n) / np.sqrt((sxx - sx * sx / n) * (syy - sy * sy / n))
+    corr[n < max(min_periods, 2)] = np.nan
+    return np.clip(corr, -1, 1)
+
+
+def correlation_blocks(values, method='pearson', block_size=256, dtype=np.float64, min_periods=1):
+    """
+    Yield the correlation matrix of the columns of a 2-D array one block of
+    rows at a time, so it can be consumed without holding the dense
+    (statistics, statistics) matrix in memory.
+
+    Args:
+        values (ndarray): Array of shape (observations, statistics).
+        method (str): 'pearson' or 'spearman'.
+        block_size (int): Statistics per block.
+        dtype (type): Floating point type of the matrix products.
+        min_periods (int): Minimum pairwise observations for a valid result.
+
+    Yields:
+        rows (ndarray): Indices of the statistics in the block.
+        block (ndarray): float64 array of shape (len(rows), statistics).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    mask = ~np.isnan(values)
+    if method not in METHODS:
+        raise ValueError('method must be one of {0}, got {1!r}'.format(METHODS, method))
+    ranks = rank_columns(values) if method == 'spearman' else None
+    for start in range(0, values.shape[1], block_size):
+        rows = np.arange(start, min(start + block_size, values.shape[1]))
+        if method == 'pearson':
+            yield rows, _pearson(values, mask, dtype, min_periods, rows)
+        else:
+            yield rows, _spearman(values, mask, dtype, min_periods, rows, ranks)
+
+
+def correlation_frames(df, methods=METHODS, dtype=np.float64, min_periods=1, common_rows=True):
+    """
+    DataFrame wrapper around correlation_matrices. Like DataFrame.corr, only
+    numeric columns are used.
+
+    Args:
+        df (DataFrame): Table of observations.
+        methods (list): Any of 'pearson' and 'spearman'.
+        dtype (type): Floating point type of the matrix products.
+        min_periods (int): Minimum pairwise observations for a valid result.
+        common_rows (bool): See correlation_matrices.
+
+    Returns:
+        frames (dict): Method name to correlation matrix DataFrame indexed by
+        statistic on both axes.
+    """
+    numeric_df = df.select_dtypes(include=[np.number, 'bool'])
+    matrices = correlation_matrices(numeric_df.values, methods, dtype, min_periods, common_rows)
+    return {method: pd.DataFrame(matrix, index=numeric_df.columns, columns=numeric_df.columns)
+            for method, matrix in matrices.items()}
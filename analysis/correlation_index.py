@@ -0,0 +1,200 @@
+# Project: NBA Correlations App
+# Description: Precomputed top-K correlated statistics for instant lookups
+# Data Sources: Basketball-Reference
+
+import numpy as np
+import pandas as pd
+
+from correlation_engine import METHODS, correlation_blocks
+from storage import COLUMNAR_DIRECTORY, load_table, write_table
+
+INDEX_TABLE = 'correlation_index'
+# Neighbors kept per statistic; None keeps every statistic
+INDEX_NEIGHBORS = 50
+# RANK is a per-table ordinal, not a statistic worth correlating against
+EXCLUDED_STATISTICS = ['RANK']
+
+
+def _top_k(block, rows, k, excluded):
+    """
+    Select the k largest absolute correlations in every row of a block,
+    skipping each statistic itself, excluded statistics and missing values.
+    Returns neighbor indices (-1 for empty slots) and their correlations.
+    """
+    strength = np.abs(block)
+    strength[np.isnan(strength)] = -1
+    strength[np.arange(len(rows)), rows] = -1
+    strength[:, excluded] = -1
+    if k < strength.shape[1]:
+        # Partition first so only k candidates per row are sorted
+        candidates = np.argpartition(-strength, k - 1, axis=1)[:, :k]
+        candidate_strength = np.take_along_axis(strength, candidates, axis=1)
+        order = np.take_along_axis(candidates, np.lexsort((candidates, -candidate_strength), axis=1), axis=1)
+    else:
+        order = np.argsort(-strength, axis=1, kind='mergesort')
+    empty = np.take_along_axis(strength, order, axis=1) < 0
+    correlations = np.take_along_axis(block, order, axis=1)
+    correlations[empty] = np.nan
+    return np.where(empty, -1, order), correlations
+
+
+def build_correlation_index(statistics, blocks, k=INDEX_NEIGHBORS):
+    """
+    Build the neighbor index for every statistic from blocks of correlation
+    matrix rows, such as those produced by correlation_blocks, so the dense
+    matrix never has to be held at once.
+
+    Args:
+        statistics (list): Statistic names, in matrix column order.
+        blocks (dict): Method name to an iterable of (rows, block) pairs.
+        k (int): Neighbors kept per statistic. None keeps all of them.
+
+    Returns:
+        index_df (DataFrame): One row per (method, statistic, neighbor) with
+        columns METHOD, STATISTIC, RANK, NEIGHBOR, CORRELATION and SIGN,
+        sorted so the neighbors of a statistic are contiguous and ordered by
+        descending absolute correlation.
+    """
+    statistics = list(statistics)
+    excluded = [statistics.index(stat) for stat in EXCLUDED_STATISTICS if stat in statistics]
+    k = len(statistics) - 1 if k is None else min(k, len(statistics) - 1)
+    names = np.asarray(statistics + [None], dtype=object)
+    frames = []
+    for method in METHODS:
+        for rows, block in blocks[method]:
+            neighbors, correlations = _top_k(block, rows, k, excluded)
+            frames.append(pd.DataFrame({
+                'METHOD': method,
+                'STATISTIC': np.repeat(names[rows], k),
+                'RANK': np.tile(np.arange(1, k + 1), len(rows)),
+                # Empty slots (-1) map to the trailing None
+                'NEIGHBOR': names[neighbors.ravel()],
+                'CORRELATION': correlations.ravel(),
+                'SIGN': np.sign(correlations.ravel())}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def index_from_matrices(statistics, matrices, k=INDEX_NEIGHBORS):
+    """
+    Build the neighbor index from dense correlation matrices.
+
+    Args:
+        statistics (list): Statistic names, in matrix column order.
+        matrices (dict): Method name to (statistics, statistics) array.
+        k (int): Neighbors kept per statistic. None keeps all of them.
+
+    Returns:
+        index_df (DataFrame): See build_correlation_index.
+    """
+    rows = np.arange(len(statistics))
+    return build_correlation_index(statistics, {method: [(rows, np.asarray(matrices[method]))]
+                                                for method in METHODS}, k)
+
+
+def index_from_values(df, k=INDEX_NEIGHBORS, block_size=256):
+    """
+    Build the neighbor index straight from observations, computing the
+    correlation matrix one block of rows at a time. Use this when there are
+    too many statistics for the dense matrix.
+
+    Args:
+        df (DataFrame): Table of observations; numeric columns are used.
+        k (int): Neighbors kept per statistic. None keeps all of them.
+        block_size (int): Statistics per block.
+
+    Returns:
+        index_df (DataFrame): See build_correlation_index.
+    """
+    numeric_df = df.select_dtypes(include=[np.number])
+    return build_correlation_index(numeric_df.columns,
+                                   {method: correlation_blocks(numeric_df.values, method, block_size)
+                                    for method in METHODS}, k)
+
+
+def save_correlation_index(index_df, directory=COLUMNAR_DIRECTORY):
+    """
+    Store the neighbor index in the columnar store.
+
+    Args:
+        index_df (DataFrame): Index built by build_correlation_index.
+        directory (str): Root directory of the columnar store.
+
+    Returns:
+        None
+    """
+    write_table(index_df, INDEX_TABLE, directory, decimals=None)
+
+
+class CorrelationIndex(object):
+    """
+    In-memory neighbor index. Lookups slice the precomputed neighbors of a
+    statistic, so they cost O(k) regardless of how many statistics exist.
+
+    Args:
+        index_df (DataFrame): Index built by build_correlation_index.
+    """
+    def __init__(self, index_df):
+        self.methods = list(pd.unique(index_df['METHOD']))
+        self.statistics = list(pd.unique(index_df['STATISTIC']))
+        self.k = int(index_df['RANK'].max())
+        shape = (len(self.methods), len(self.statistics), self.k)
+        self.position = {stat: i for i, stat in enumerate(self.statistics)}
+        self.neighbors = np.asarray(index_df['NEIGHBOR'], dtype=object).reshape(shape)
+        self.correlations = np.asarray(index_df['CORRELATION'], dtype=np.float64).reshape(shape)
+
+    def top_correlated(self, stat, method='pearson', k=10):
+        """
+        Return the statistics most correlated with `stat`.
+
+        Args:
+            stat (str): Statistic to look up.
+            method (str): 'pearson' or 'spearman'.
+            k (int): Number of neighbors. At most the k the index was built with.
+
+        Returns:
+            neighbors_df (DataFrame): STATISTIC, CORRELATION, SIGN and RANK of
+            up to k neighbors by descending absolute correlation.
+        """
+        m, i = self.methods.index(method), self.position[stat]
+        k = min(k, self.k)
+        neighbors = self.neighbors[m, i, :k]
+        correlations = self.correlations[m, i, :k]
+        found = ~np.isnan(correlations)
+        return pd.DataFrame({'STATISTIC': neighbors[found],
+                             'CORRELATION': correlations[found],
+                             'SIGN': np.sign(correlations[found]).astype(int),
+                             'RANK': np.arange(1, k + 1)[found]})
+
+
+_loaded_index = {}
+
+
+def load_correlation_index(directory=COLUMNAR_DIRECTORY):
+    """
+    Load the stored neighbor index, once per directory.
+
+    Args:
+        directory (str): Root directory of the columnar store.
+
+    Returns:
+        index (CorrelationIndex): Loaded index.
+    """
+    if directory not in _loaded_index:
+        index_df = load_table(INDEX_TABLE, directory=directory)
+        _loaded_index[directory] = CorrelationIndex(index_df)
+    return _loaded_index[directory]
+
+
+def top_correlated(stat, method='pearson', k=10):
+    """
+    Return the statistics most correlated with `stat` from the stored index.
+
+    Args:
+        stat (str): Statistic to look up.
+        method (str): 'pearson' or 'spearman'.
+        k (int): Number of neighbors.
+
+    Returns:
+        neighbors_df (DataFrame): See CorrelationIndex.top_correlated.
+    """
+    return load_correlation_index().top_correlated(stat, method, k)
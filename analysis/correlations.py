@@ -3,10 +3,161 @@
 # Data Sources: Basketball-Reference
 # Last Updated: 9/10/2019
 
+import functools
+import json
+import os
+import re
+import sys
+
+import numpy as np
 import pandas as pd
 
+from correlation_engine import (METHODS, adjusted_correlation_matrices, correlation_frames,
+                                group_sums, grouped_adjusted_correlations, grouped_target_correlations,
+                                lag_pairs, lagged_cross_correlations, rank_columns, rebase_sums,
+                                sums_correlations, window_sums)
+from correlation_index import index_from_matrices, save_correlation_index
+from derived_metrics import compile_metrics, evaluate_metrics, required_metrics, unrepresentative_metrics
+from resampling import DEFAULT_WORKERS, RESAMPLES, resampled_correlations
+from statistic_clusters import CLUSTER_THRESHOLDS, cluster_table
+from storage import (COLUMNAR_DIRECTORY, DATA_DIRECTORY, fresh_schema, load_partitioned, load_table,
+                     map_partitions, partition_values, read_csv, save_table, write_table)
+
+# Instrumentation is shared with the scraper
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scraping'))
+from instrumentation import span, traced
+
+# Statistics each statistic is correlated against season by season
+TARGET_STATISTICS = ['NRTG']
+# Seasons per rolling window; None is the expanding window from 2004-2005
+SEASON_WINDOWS = [3, 5, None]
+# Per-season sufficient statistics kept between runs of window_correlations
+SEASON_SUMS_FILE = 'season_sums.npz'
+# Correlation threshold of the clusters whose representatives stand in for
+# every statistic in representatives-only mode
+REPRESENTATIVE_THRESHOLD = 0.95
+# Season lags k for which stat(t) x stat(t+k) correlations are precomputed
+SEASON_LAGS = [1, 2, 3]
+# Former team names mapped to the franchise's current name, so a relocated or
+# renamed team is still paired with its next season
+FRANCHISE_NAMES = {'Seattle SuperSonics': 'Oklahoma City Thunder',
+                   'New Jersey Nets': 'Brooklyn Nets',
+                   'Charlotte Bobcats': 'Charlotte Hornets',
+                   'New Orleans Hornets': 'New Orleans Pelicans',
+                   'New Orleans/Oklahoma City Hornets': 'New Orleans Pelicans'}
+
+
+def changed_seasons():
+    """
+    Read the seasons changed by the last incremental scrape from the scrape
+    manifest written by scraper.py.
+
+    Args:
+        None
+
+    Returns:
+        seasons (list): Changed season labels (e.g. '2018-2019'), or None if
+        there is no manifest and every season should be rebuilt.
+    """
+    path = os.path.join(DATA_DIRECTORY, 'scrape_manifest.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)['changed']
+
+def upsert_seasons(existing_df, new_df, seasons):
+    """
+    Replace the rows of `seasons` within a previously written output table.
+
+    Args:
+        existing_df (DataFrame): Output table previously written to .csv.
+        new_df (DataFrame): Recomputed rows for `seasons`.
+        seasons (list): Season labels that were recomputed.
+
+    Returns:
+        upserted_df (DataFrame): Combined table.
+    """
+    kept_df = existing_df[~existing_df['SEASON'].isin(seasons)]
+    return pd.concat([kept_df, new_df], sort=False).reindex(columns=existing_df.columns)
+
+def adjustment_suffix(partial=False, controls=None, representatives=None):
+    """
+    File name suffix of correlation outputs adjusted for confounders or
+    restricted to cluster representatives, so they are written next to, not
+    over, the full unadjusted outputs.
+
+    Args:
+        partial (bool): Partial correlations given all statistics.
+        controls (list): Names of the statistics controlled for.
+        representatives (float): Cluster threshold of representatives-only
+                                 outputs.
+
+    Returns:
+        suffix (str): e.g. '_controlling_PACE_SOS_partial' or
+        '_representatives_95', or '' for the full unadjusted outputs.
+    """
+    suffix = ''
+    if controls:
+        suffix += '_controlling_' + '_'.join(re.sub(r'\W+', '', control) for control in controls)
+    if partial:
+        suffix += '_partial'
+    if representatives:
+        suffix += '_representatives_{0:g}'.format(round(representatives * 100, 2))
+    return suffix
+
+def franchises(df):
+    """
+    Return the franchise of every row of a team table.
+
+    Args:
+        df (DataFrame): Table with a TEAM column.
+
+    Returns:
+        franchises (ndarray): Current franchise name per row.
+    """
+    return df['TEAM'].astype(str).replace(FRANCHISE_NAMES).values
+
+def team_stats_columns():
+    """Stored columns of Team_Stats, which derived metrics are compiled against."""
+    return [entry['name'] for entry in fresh_schema('Team_Stats')['columns']]
+
+def load_team_stats(seasons=None, columns=None):
+    """
+    Read Team_Stats with the derived metrics of derived_metrics.json
+    appended after the stored columns, so every analysis sees them as
+    ordinary statistics.
+
+    Args:
+        seasons (list): Season labels to read from their partitions.
+                        Defaults to None, which reads every season.
+        columns (list): Stored or derived columns to return. Only the stored
+                        columns they need are read. Defaults to None, which
+                        returns every column and derived metric.
+
+    Returns:
+        team_stats_df (DataFrame): Team rows with the derived columns.
+    """
+    metrics = compile_metrics(team_stats_columns())
+    stored, needed = (None, metrics) if columns is None else required_metrics(metrics, columns)
+    if seasons is not None:
+        df = load_partitioned('Team_Stats', seasons, stored)
+    else:
+        df = load_table('Team_Stats', stored)
+    if needed:
+        with span('correlations.derived_metrics', metrics=len(needed)):
+            df = pd.concat([df, evaluate_metrics(df, needed)], axis=1)
+    return df if columns is None else df[columns]
+
+def _derived_partition(df, function, stored_columns, columns=None):
+    """Apply `function` to a Team_Stats partition with its derived metrics appended."""
+    metrics = compile_metrics(stored_columns)
+    needed = metrics if columns is None else required_metrics(metrics, columns)[1]
+    if needed:
+        df = pd.concat([df, evaluate_metrics(df, needed)], axis=1)
+    return function(df if columns is None else df[columns])
 
-def season_lags(save=False):
+@traced('correlations.season_lags')
+def season_lags(save=False, seasons=None):
     """
     Create dataframe with an additional column containing lagged values from the
     previous season for each team.
@@ -14,21 +165,176 @@ def season_lags(save=False):
     Args:
         save (bool): Indicates whether to write resulting pandas DataFrame to
                      .csv file. Defaults to False.
+        seasons (list): Season labels whose values changed. Only rows that pair
+                        a changed season with its neighbor are recomputed and
+                        upserted into the existing .csv. Defaults to None, which
+                        rebuilds every row.
 
     Returns:
         season_lag_df (DataFrame): Table with additional column of lagged
         values from the previous season.
     """
-    df = pd.read_csv('../app/data/Team_Stats.csv')
-    shifted = df.groupby(['TEAM']).shift(-1)
-    season_lag_df = df.join(shifted.rename(columns=lambda x: x+"_lag"))
-    season_lag_df.dropna(inplace=True)
+    lags_path = os.path.join(DATA_DIRECTORY, 'Basketball_Reference_Season_Lags.csv')
+    if not os.path.exists(lags_path):
+        seasons = None
+    # Pair rows by franchise and position in the explicit season ordering
+    # rather than by row order, so a gap or a renamed team is never paired
+    # with the wrong season
+    ordered = partition_values('Team_Stats')
+    if seasons is not None:
+        # A changed season affects its own rows and the lag values of the
+        # season before it
+        positions = [ordered.index(season) for season in seasons if season in ordered]
+        affected = sorted({ordered[i] for p in positions for i in (p - 1, p) if i >= 0})
+        window = sorted({ordered[i] for p in positions for i in (p - 1, p, p + 1)
+                         if 0 <= i < len(ordered)})
+        df = load_team_stats(window)
+    else:
+        df = load_team_stats()
+    with span('correlations.pair_seasons'):
+        rows, lagged_rows = lag_pairs(franchises(df), df['SEASON'].astype(str).values, 1, ordered)
+        lagged = df.iloc[lagged_rows].drop('TEAM', axis=1).set_index(df.index[rows])
+        season_lag_df = df.iloc[rows].join(lagged.rename(columns=lambda x: x+"_lag"))
+        season_lag_df.dropna(inplace=True)
+    if seasons is not None:
+        season_lag_df = season_lag_df[season_lag_df['SEASON'].isin(affected)]
+        existing_df = read_csv(lags_path)
+        if list(existing_df.columns) != list(season_lag_df.columns):
+            # Columns were added or removed, e.g. a new derived metric
+            return season_lags(save)
+        season_lag_df = (upsert_seasons(existing_df, season_lag_df, affected)
+                            .sort_values(by='SEASON', kind='mergesort'))
     if save:
-        season_lag_df.to_csv('../app/data/Basketball_Reference_Season_Lags.csv',
-                                    index=False)
+        with span('correlations.write'):
+            save_table(season_lag_df, 'Basketball_Reference_Season_Lags')
     return season_lag_df
 
-def calculate_correlations(save=False):
+@traced('correlations.lag_correlations')
+def lag_correlations(save=False, lags=SEASON_LAGS):
+    """
+    Correlate every statistic in season t with every statistic in season
+    t + k for each lag k, under both pearson and spearman correlation, so the
+    app looks up season over season stability instead of computing it.
+
+    Args:
+        save (bool): Indicates whether to write the results. The full
+                     (method, lag, statistic, statistic) matrices are stored in
+                     the columnar store as 'lag_correlation' and the
+                     stat(t) x stat(t+k) diagonal is exported to .csv.
+                     Defaults to False.
+        lags (list): Season lags k. Defaults to SEASON_LAGS.
+
+    Returns:
+        lag_correlation_df (DataFrame): One row per method, lag and statistic
+        with the correlation of that statistic in season t against every
+        statistic in season t + k.
+        stability_df (DataFrame): Correlation of each statistic with itself k
+        seasons later, with columns STATISTIC, LAG, OBSERVATIONS,
+        PEARSON_CORRELATION and SPEARMAN_CORRELATION.
+    """
+    df = load_team_stats()
+    statistics_df = df.select_dtypes(include=[np.number])
+    statistics = list(statistics_df.columns)
+    with span('correlations.correlate', lags=len(lags)):
+        correlations, counts = lagged_cross_correlations(statistics_df.values, franchises(df),
+                                                         df['SEASON'].astype(str).values, lags,
+                                                         order=sorted(df['SEASON'].astype(str).unique()))
+
+    n_statistics = len(statistics)
+    frames = []
+    for method in METHODS:
+        frame = pd.DataFrame(correlations[method].reshape(len(lags) * n_statistics, n_statistics),
+                             columns=statistics)
+        frame.insert(0, 'METHOD', method)
+        frame.insert(1, 'LAG', np.repeat(lags, n_statistics))
+        frame.insert(2, 'STATISTIC', np.tile(statistics, len(lags)))
+        frames.append(frame)
+    lag_correlation_df = pd.concat(frames, ignore_index=True)
+
+    diagonal = np.arange(n_statistics)
+    stability_df = pd.DataFrame({'STATISTIC': np.tile(statistics, len(lags)),
+                                 'LAG': np.repeat(lags, n_statistics),
+                                 'OBSERVATIONS': np.repeat(counts, n_statistics)})
+    for method in METHODS:
+        stability_df[method.upper() + '_CORRELATION'] = correlations[method][:, diagonal, diagonal].ravel()
+
+    if save:
+        with span('correlations.write'):
+            write_table(lag_correlation_df, 'lag_correlation', decimals=None)
+            save_table(stability_df, 'Basketball_Reference_Lag_Correlations')
+    return lag_correlation_df, stability_df
+
+@traced('correlations.cluster_statistics')
+def cluster_statistics(save=False, thresholds=CLUSTER_THRESHOLDS, method='pearson', keep=TARGET_STATISTICS):
+    """
+    Group near-duplicate statistics (e.g. MOV, NRTG and SRS) by hierarchical
+    clustering of their correlation matrix, and pick one statistic to
+    represent each group. Derived metrics defined as not representative
+    only represent clusters made up of such metrics. The linkage is cached
+    on disk under a hash of the matrix, so only changed data is clustered
+    again.
+
+    Args:
+        save (bool): Indicates whether to write resulting pandas DataFrame to
+                     .csv file. Defaults to False.
+        thresholds (list): Absolute correlations at which statistics are
+                           clustered together; every pair within a cluster
+                           reaches the threshold. Defaults to
+                           CLUSTER_THRESHOLDS.
+        method (str): 'pearson' or 'spearman'. Defaults to 'pearson'.
+        keep (list): Statistics that always represent their cluster.
+                     Defaults to TARGET_STATISTICS.
+
+    Returns:
+        clusters_df (DataFrame): One row per threshold and statistic with
+        columns THRESHOLD, STATISTIC, CLUSTER, CLUSTER_SIZE, REPRESENTATIVE
+        and IS_REPRESENTATIVE.
+    """
+    statistics_df = load_team_stats().select_dtypes(include=[np.number]).drop('RANK', axis=1)
+    with span('correlations.correlate'):
+        corr = correlation_frames(statistics_df, methods=[method])[method]
+    with span('correlations.cluster', thresholds=len(thresholds)):
+        clusters_df = cluster_table(corr.values, list(corr.columns), thresholds, keep=keep,
+                                    exclude=unrepresentative_metrics(compile_metrics(team_stats_columns())))
+    if save:
+        with span('correlations.write'):
+            save_table(clusters_df, 'Statistic_Clusters')
+    return clusters_df
+
+def representative_statistics(threshold=REPRESENTATIVE_THRESHOLD, keep=TARGET_STATISTICS):
+    """
+    Statistics representing the clusters at `threshold`, read from the
+    stored clusters or clustered now if they were never stored at that
+    threshold. Derived metrics defined as not representative are left out
+    even where they represent a cluster.
+
+    Args:
+        threshold (float): Cluster threshold. Defaults to
+                           REPRESENTATIVE_THRESHOLD.
+        keep (list): Statistics that always represent their cluster, such as
+                     targets that must stay in the outputs. Defaults to
+                     TARGET_STATISTICS.
+
+    Returns:
+        statistics (list): Representatives in Team_Stats column order.
+    """
+    try:
+        clusters_df = load_table('Statistic_Clusters')
+        clusters_df = clusters_df[np.isclose(clusters_df['THRESHOLD'], threshold)]
+    except IOError:
+        clusters_df = pd.DataFrame()
+    if clusters_df.empty:
+        clusters_df = cluster_statistics(thresholds=[threshold], keep=keep)
+    chosen = dict(zip(clusters_df['CLUSTER'], clusters_df['REPRESENTATIVE'].astype(str)))
+    cluster_of = dict(zip(clusters_df['STATISTIC'].astype(str), clusters_df['CLUSTER']))
+    for stat in reversed(keep or []):
+        if stat in cluster_of:
+            chosen[cluster_of[stat]] = stat
+    representatives = set(chosen.values()) - set(unrepresentative_metrics(compile_metrics(team_stats_columns())))
+    return [stat for stat in clusters_df['STATISTIC'].astype(str) if stat in representatives]
+
+@traced('correlations.calculate_correlations')
+def calculate_correlations(save=False, partial=False, controls=None, representatives=None):
     """
     Create two dataframes each containing either the pearson or spearman
     correlation matrix for all metrics.
@@ -36,34 +342,147 @@ def calculate_correlations(save=False):
     Args:
         save (bool): Indicates whether to write resulting pandas DataFrame to
                      .csv file. Defaults to False.
+        partial (bool): Compute partial correlations, conditioning every pair
+                        on all other statistics. Defaults to False.
+        controls (list): Statistics (e.g. ['PACE', 'SOS']) to control for by
+                         residualizing every statistic on them first.
+                         Defaults to None.
+        representatives (float): Only correlate the statistics representing
+                                 the clusters at this threshold (e.g. 0.95),
+                                 reading just their columns. Defaults to
+                                 None, which correlates every statistic.
 
     Returns:
         pearson_corr (DataFrame): Table pearson correlation matrix
         spearman_corr (DataFrame): Table spearman correlation matrix
     """
     # Read in Basketball-Reference tables
-    bbref_team_data = pd.read_csv('../app/data/Team_Stats.csv')
+    if representatives:
+        statistics = representative_statistics(representatives)
+        bbref_team_data = load_team_stats(columns=statistics + [control for control in controls or []
+                                                                if control not in statistics])
+    else:
+        bbref_team_data = load_team_stats()
 
-    # Calculate pearson correlation
-    pearson_corr = (bbref_team_data.corr(method='pearson')
-                                   .reset_index())
+    # Calculate pearson and spearman correlation in one pass
+    with span('correlations.correlate'):
+        if partial or controls:
+            numeric_df = bbref_team_data.select_dtypes(include=[np.number, 'bool'])
+            statistics = list(numeric_df.columns)
+            matrices = adjusted_correlation_matrices(numeric_df.values, ['pearson', 'spearman'],
+                                                     [statistics.index(control) for control in controls or []],
+                                                     partial)
+            correlations = {method: pd.DataFrame(matrix, index=statistics, columns=statistics)
+                            for method, matrix in matrices.items()}
+        else:
+            correlations = correlation_frames(bbref_team_data, methods=['pearson', 'spearman'])
+    pearson_corr = correlations['pearson'].reset_index()
     pearson_corr.rename(columns={pearson_corr.columns[0]: "STATISTIC" },
                         inplace=True)
 
-    # Calculate spearman correlation
-    spearman_corr = (bbref_team_data.corr(method='spearman')
-                                    .reset_index())
+    spearman_corr = correlations['spearman'].reset_index()
     spearman_corr.rename(columns={spearman_corr.columns[0]: "STATISTIC" },
                         inplace=True)
 
     if save:
-        pearson_corr.to_csv('../app/data/pearson_correlation.csv',
-                            index=False)
-        spearman_corr.to_csv('../app/data/spearman_correlation.csv',
-                            index=False)
+        suffix = adjustment_suffix(partial, controls, representatives)
+        with span('correlations.write'):
+            save_table(pearson_corr, 'pearson_correlation' + suffix)
+            save_table(spearman_corr, 'spearman_correlation' + suffix)
+        if not suffix:
+            # Neighbors of each statistic sorted by |r| for O(k) lookups
+            with span('correlations.index'):
+                correlation_index = index_from_matrices(list(correlations['pearson'].columns),
+                                                        {method: correlations[method].values
+                                                         for method in ['pearson', 'spearman']})
+                save_correlation_index(correlation_index)
     return pearson_corr, spearman_corr
 
-def season_correlations(save=False):
+@traced('correlations.correlation_uncertainty')
+def correlation_uncertainty(save=False, resamples=RESAMPLES):
+    """
+    Bootstrap confidence intervals and permutation p-values for every pair of
+    statistics in the pearson and spearman correlation matrices.
+
+    Args:
+        save (bool): Indicates whether to store the result in the columnar
+                     store as 'correlation_uncertainty'. Defaults to False.
+        resamples (int): Bootstrap samples and permutations. Defaults to
+                         RESAMPLES.
+
+    Returns:
+        uncertainty_df (DataFrame): One row per method, measure (CI_LOWER,
+        CI_UPPER or P_VALUE) and statistic, with one column per statistic,
+        laid out like the correlation matrices.
+    """
+    bbref_team_data = load_team_stats()
+    statistics_df = bbref_team_data.select_dtypes(include=[np.number])
+    statistics = list(statistics_df.columns)
+    with span('correlations.resample', resamples=resamples):
+        _, intervals = resampled_correlations(statistics_df.values, resamples=resamples)
+
+    frames = []
+    for method in METHODS:
+        for measure, key in [('CI_LOWER', 'lower'), ('CI_UPPER', 'upper'), ('P_VALUE', 'p_value')]:
+            frame = pd.DataFrame(intervals[method][key][0], columns=statistics)
+            frame.insert(0, 'METHOD', method)
+            frame.insert(1, 'MEASURE', measure)
+            frame.insert(2, 'STATISTIC', statistics)
+            frames.append(frame)
+    uncertainty_df = pd.concat(frames, ignore_index=True)
+    if save:
+        with span('correlations.write'):
+            write_table(uncertainty_df, 'correlation_uncertainty', decimals=None)
+    return uncertainty_df
+
+def season_target_correlations(df, targets=TARGET_STATISTICS, resamples=RESAMPLES, partial=False, controls=None,
+                               workers=DEFAULT_WORKERS):
+    """
+    Correlate the targets against every statistic within each season of a
+    set of team rows, ranking and standardizing within each season once.
+
+    Args:
+        df (DataFrame): Team rows of one or more seasons.
+        targets (list): Statistics to correlate every other statistic against.
+        resamples (int): Bootstrap samples and permutations; 0 skips the
+                         intervals.
+        partial (bool): Partial correlations given all other statistics.
+        controls (list): Statistics to residualize every statistic on first.
+        workers (int): Worker processes for the resamples.
+
+    Returns:
+        statistics (list): Statistic names.
+        season_labels (ndarray): Sorted season labels.
+        correlations (dict): Method name to (seasons, targets, statistics)
+        array.
+        intervals (dict): Method name to 'lower', 'upper' and 'p_value'
+        arrays of the same shape, None without resamples.
+    """
+    statistics_df = df.select_dtypes(include=[np.number]).drop('RANK', axis=1, errors='ignore')
+    statistics = list(statistics_df.columns)
+    target_columns = [statistics.index(target) for target in targets]
+    seasons = df['SEASON'].astype(str).values
+    with span('correlations.correlate', seasons=len(np.unique(seasons))):
+        if partial or controls:
+            # One residualization and one factorization per season and method
+            season_labels, correlations = grouped_adjusted_correlations(statistics_df.values, seasons, target_columns,
+                                                                        controls=[statistics.index(control)
+                                                                                  for control in controls or []],
+                                                                        partial=partial)
+        else:
+            season_labels, correlations = grouped_target_correlations(statistics_df.values, seasons, target_columns)
+    intervals = None
+    if resamples:
+        # ~30 teams per season leave wide intervals, so report them with
+        # every estimate
+        with span('correlations.resample', seasons=len(season_labels), resamples=resamples):
+            _, intervals = resampled_correlations(statistics_df.values, target_columns, seasons,
+                                                  resamples=resamples, workers=workers)
+    return statistics, season_labels, correlations, intervals
+
+@traced('correlations.season_correlations')
+def season_correlations(save=False, seasons=None, targets=TARGET_STATISTICS, resamples=RESAMPLES,
+                        partial=False, controls=None, representatives=None, workers=1):
     """
     Create correlation matrix over time for each season between 2004-2005 and
     2018-2019.
@@ -71,56 +490,263 @@ def season_correlations(save=False):
     Args:
         save (bool): Indicates whether to write resulting pandas DataFrame to
                      .csv file. Defaults to False.
+        seasons (list): Season labels to recompute and upsert into the existing
+                        .csv. Defaults to None, which recomputes every season.
+        targets (list): Statistics to correlate every other statistic against.
+                        Defaults to TARGET_STATISTICS.
+        resamples (int): Bootstrap samples and permutations used for the
+                         confidence intervals and p-values of every
+                         correlation. Defaults to RESAMPLES; 0 skips them.
+                         Intervals are only computed for unadjusted
+                         correlations.
+        partial (bool): Compute partial correlations within each season,
+                        conditioning every pair on all other statistics.
+                        Defaults to False.
+        controls (list): Statistics (e.g. ['PACE', 'SOS']) to control for by
+                         residualizing every statistic on them within each
+                         season first. Defaults to None.
+        representatives (float): Only correlate the targets against the
+                                 statistics representing the clusters at
+                                 this threshold (e.g. 0.95), reading just
+                                 their columns. Defaults to None, which
+                                 uses every statistic.
+        workers (int): Seasons processed at once, each read from its own
+                       partition by a worker process. Results are the same
+                       for any number of workers. Defaults to 1, which reads
+                       the seasons together and resamples them on a pool.
 
     Returns:
         bbref_correlation_season_df (DataFrame): Correlation matrix for each
         season between 2004-2005 and 2018-2019
     """
-    # Read in Basketball-Reference tables
-    bbref_team_data = pd.read_csv('../app/data/Team_Stats.csv')
-
-    # Basketball-Reference Correlations by Season
-    bbref_correlation_season_df = pd.DataFrame()
-    # Loop through each season in basketball-reference tables replicating the same process as above
-    for season in bbref_team_data['SEASON'].unique():
-        pearson_corr_df = bbref_team_data[bbref_team_data['SEASON']==season].corr(method='pearson')
-        pearson_corr_df = pearson_corr_df['NRTG'].reset_index()
-        pearson_corr_df.columns = ['STATISTIC', 'PEARSON_CORRELATION']
-        pearson_corr_df['PEARSON_CORRELATION_ABS'] = abs(pearson_corr_df['PEARSON_CORRELATION'])
-
-        spearman_corr_df = bbref_team_data[bbref_team_data['SEASON']==season].corr(method='spearman')
-        spearman_corr_df = spearman_corr_df['NRTG'].reset_index()
-        spearman_corr_df.columns = ['STATISTIC', 'SPEARMAN_CORRELATION']
-        spearman_corr_df['SPEARMAN_CORRELATION_ABS'] = abs(spearman_corr_df['SPEARMAN_CORRELATION'])
-
-        correlation_df = pearson_corr_df.merge(spearman_corr_df, on=['STATISTIC'])
-        correlation_df['SEASON'] = season
-        correlation_df = correlation_df[~correlation_df['STATISTIC'].isin(['RANK'])]
-        correlation_df.sort_values(by='PEARSON_CORRELATION_ABS', ascending=False, inplace=True)
-        correlation_df['PEARSON_CORRELATION_RANK'] = range(1, 1+len(correlation_df))
-        correlation_df.sort_values(by='SPEARMAN_CORRELATION_ABS', ascending=False, inplace=True)
-        correlation_df['SPEARMAN_CORRELATION_RANK'] = range(1, 1+len(correlation_df))
-
-        correlation_df['AVERAGE_RANK'] = (correlation_df[['PEARSON_CORRELATION_RANK',
-                                                          'SPEARMAN_CORRELATION_RANK']]
-                                                .mean(axis=1)
-                                                .round(3))
-        correlation_df.sort_values(by='AVERAGE_RANK', inplace=True)
-        correlation_df = correlation_df[['SEASON', 'STATISTIC', 'PEARSON_CORRELATION',
-                                        'PEARSON_CORRELATION_ABS', 'SPEARMAN_CORRELATION',
-                                        'SPEARMAN_CORRELATION_ABS', 'PEARSON_CORRELATION_RANK',
-                                        'SPEARMAN_CORRELATION_RANK', 'AVERAGE_RANK']]
-
-        bbref_correlation_season_df = bbref_correlation_season_df.append(correlation_df, sort=False)
-    bbref_correlation_season_df = bbref_correlation_season_df.sort_values(by=['SEASON', 'AVERAGE_RANK'], ascending=[False, True])\
-                                                             .dropna()
+    columns = None
+    if representatives:
+        columns = ['SEASON'] + representative_statistics(representatives, keep=list(targets) + list(controls or []))
+    suffix = adjustment_suffix(partial, controls, representatives)
+    if partial or controls:
+        resamples = 0
+    output_path = os.path.join(DATA_DIRECTORY, 'Basketball_Reference_Season_Correlations{0}.csv'.format(suffix))
+    if not os.path.exists(output_path):
+        seasons = None
+    elif resamples and 'PEARSON_CORRELATION_P_VALUE' not in pd.read_csv(output_path, nrows=0).columns:
+        # Seasons written without intervals cannot be upserted into
+        seasons = None
+
+    correlate = functools.partial(season_target_correlations, targets=targets, resamples=resamples,
+                                  partial=partial, controls=controls)
+    if workers == 1:
+        # Read in Basketball-Reference tables, only the seasons to recompute
+        bbref_team_data = load_team_stats(seasons, columns)
+        statistics, season_labels, correlations, intervals = correlate(bbref_team_data)
+    else:
+        # Each worker reads, derives and correlates one season; its resamples
+        # run in the worker itself. Metrics are compiled again per worker,
+        # since compiled formulas do not pickle
+        stored_columns = team_stats_columns()
+        stored = None if columns is None else required_metrics(compile_metrics(stored_columns), columns)[0]
+        results = list(map_partitions(functools.partial(_derived_partition,
+                                                        function=functools.partial(correlate, workers=1),
+                                                        stored_columns=stored_columns, columns=columns),
+                                      'Team_Stats', seasons, stored, workers).values())
+        statistics = results[0][0]
+        season_labels = np.concatenate([result[1] for result in results])
+        correlations = {method: np.concatenate([result[2][method] for result in results]) for method in METHODS}
+        intervals = None if not resamples else {
+            method: {key: np.concatenate([result[3][method][key] for result in results])
+                     for key in ['lower', 'upper', 'p_value']} for method in METHODS}
+    n_seasons, n_targets, n_statistics = correlations['pearson'].shape
+
+    bbref_correlation_season_df = pd.DataFrame({
+        'SEASON': np.repeat(season_labels, n_targets * n_statistics),
+        'TARGET': np.tile(np.repeat(targets, n_statistics), n_seasons),
+        'STATISTIC': np.tile(statistics, n_seasons * n_targets)})
+    for method in ['pearson', 'spearman']:
+        column = method.upper() + '_CORRELATION'
+        correlation = correlations[method]
+        # Rank statistics by absolute correlation within each season and
+        # target; missing correlations sort last
+        order = np.argsort(-np.abs(correlation), axis=2, kind='mergesort')
+        ranks = np.empty(order.shape, dtype=int)
+        np.put_along_axis(ranks, order, np.broadcast_to(np.arange(1, n_statistics + 1), order.shape), axis=2)
+        bbref_correlation_season_df[column] = correlation.ravel()
+        bbref_correlation_season_df[column + '_ABS'] = np.abs(correlation.ravel())
+        bbref_correlation_season_df[column + '_RANK'] = ranks.ravel()
+
+    if resamples:
+        for method in ['pearson', 'spearman']:
+            column = method.upper() + '_CORRELATION'
+            bbref_correlation_season_df[column + '_CI_LOWER'] = intervals[method]['lower'].ravel()
+            bbref_correlation_season_df[column + '_CI_UPPER'] = intervals[method]['upper'].ravel()
+            bbref_correlation_season_df[column + '_P_VALUE'] = intervals[method]['p_value'].ravel()
+
+    bbref_correlation_season_df['AVERAGE_RANK'] = (bbref_correlation_season_df[['PEARSON_CORRELATION_RANK',
+                                                                                'SPEARMAN_CORRELATION_RANK']]
+                                                        .mean(axis=1)
+                                                        .round(3))
+    bbref_correlation_season_df = bbref_correlation_season_df[['SEASON', 'TARGET', 'STATISTIC', 'PEARSON_CORRELATION',
+                                                               'PEARSON_CORRELATION_ABS', 'SPEARMAN_CORRELATION',
+                                                               'SPEARMAN_CORRELATION_ABS', 'PEARSON_CORRELATION_RANK',
+                                                               'SPEARMAN_CORRELATION_RANK', 'AVERAGE_RANK']
+                                                              + [column for column in ['PEARSON_CORRELATION_CI_LOWER',
+                                                                                       'PEARSON_CORRELATION_CI_UPPER',
+                                                                                       'PEARSON_CORRELATION_P_VALUE',
+                                                                                       'SPEARMAN_CORRELATION_CI_LOWER',
+                                                                                       'SPEARMAN_CORRELATION_CI_UPPER',
+                                                                                       'SPEARMAN_CORRELATION_P_VALUE']
+                                                                 if column in bbref_correlation_season_df]]
+    bbref_correlation_season_df = bbref_correlation_season_df.sort_values(by=['SEASON', 'TARGET', 'AVERAGE_RANK'],
+                                                                          ascending=[False, True, True],
+                                                                          kind='mergesort')\
+                                                             .dropna(subset=['PEARSON_CORRELATION',
+                                                                             'SPEARMAN_CORRELATION'])
+    if seasons is not None:
+        existing_df = read_csv(output_path)
+        bbref_correlation_season_df = (upsert_seasons(existing_df, bbref_correlation_season_df, seasons)
+                                            .sort_values(by=['SEASON', 'TARGET', 'AVERAGE_RANK'],
+                                                         ascending=[False, True, True], kind='mergesort'))
     if save:
-        bbref_correlation_season_df.to_csv('../app/data/Basketball_Reference_Season_Correlations.csv',
-                                    index=False)
+        with span('correlations.write'):
+            save_table(bbref_correlation_season_df, 'Basketball_Reference_Season_Correlations' + suffix)
     return bbref_correlation_season_df
 
+def season_window_sums(df, statistics, targets):
+    """
+    Per-season sufficient statistics of every target against every
+    statistic, for pearson correlation on raw values and for spearman
+    correlation on ranks scaled to (0, 1) within each season. Each season's
+    sums depend on its own rows only, so sums stored for unchanged seasons
+    are exactly those a full rebuild would compute.
+
+    Args:
+        df (DataFrame): Team rows of the seasons to summarize.
+        statistics (list): Statistic columns.
+        targets (list): Target statistics.
+
+    Returns:
+        labels (ndarray): Sorted season labels.
+        sums (dict): Method name to (seasons, targets, statistics, 6) array.
+        references (dict): Method name to the (seasons, statistics)
+        reference values the sums were taken about.
+    """
+    values = df[statistics].values.astype(np.float64)
+    seasons = df['SEASON'].astype(str).values
+    _, codes = np.unique(seasons, return_inverse=True)
+    observed = ~np.isnan(values)
+    season_counts = np.stack([observed[codes == k].sum(axis=0) for k in range(codes.max() + 1)])
+    # Within-season ranks are comparable across seasons once scaled by the
+    # season's number of teams, which makes them additive over windows
+    scaled_ranks = (rank_columns(values, codes) - 0.5) / season_counts[codes]
+    target_columns = [statistics.index(target) for target in targets]
+    # Raw values are summed about each season's means, scaled ranks about 0.5
+    references = {'pearson': None, 'spearman': np.full(len(statistics), 0.5)}
+    sums = {}
+    for method, data in [('pearson', values), ('spearman', scaled_ranks)]:
+        labels, sums[method], references[method] = group_sums(data, seasons, target_columns, references[method])
+    return labels, sums, references
+
+@traced('correlations.window_correlations')
+def window_correlations(save=False, seasons=None, targets=TARGET_STATISTICS, windows=SEASON_WINDOWS):
+    """
+    Correlate every statistic against the target statistics over rolling and
+    expanding multi-season windows. Each window is built from per-season
+    sufficient statistics, which are stored between runs; only `seasons`
+    are summarized from team rows again and every window is then an
+    addition and subtraction of season sums. Spearman correlations use ranks
+    within each season, so a window is not dominated by league-wide trends.
+
+    Args:
+        save (bool): Indicates whether to write resulting pandas DataFrame to
+                     .csv file and store the per-season sums. Defaults to
+                     False.
+        seasons (list): Season labels whose values changed. Defaults to None,
+                        which summarizes every season again.
+        targets (list): Statistics to correlate every other statistic against.
+                        Defaults to TARGET_STATISTICS.
+        windows (list): Seasons per rolling window; None adds the expanding
+                        window. Defaults to SEASON_WINDOWS.
+
+    Returns:
+        window_correlation_df (DataFrame): One row per window, last season of
+        the window, target and statistic.
+    """
+    sums_path = os.path.join(COLUMNAR_DIRECTORY, SEASON_SUMS_FILE)
+    stored = None
+    if seasons is not None and os.path.exists(sums_path):
+        with np.load(sums_path) as data:
+            stored = {key: data[key] for key in data.files}
+        if list(stored['targets']) != list(targets) or stored['pearson_reference'].ndim != 2:
+            # Other targets, or sums of every season about one shared reference
+            stored = None
+    bbref_team_data = load_team_stats(None if stored is None else seasons)
+    statistics = list(bbref_team_data.select_dtypes(include=[np.number]).drop('RANK', axis=1).columns)
+    if stored is not None and list(stored['statistics']) != statistics:
+        # Statistics were added or removed, e.g. a new derived metric, so
+        # every season is summarized again
+        stored = None
+        bbref_team_data = load_team_stats()
+    if stored is None:
+        seasons = None
+
+    with span('correlations.season_sums', seasons=bbref_team_data['SEASON'].nunique()):
+        labels, sums, references = season_window_sums(bbref_team_data, statistics, targets)
+    if stored is not None:
+        # Replace the sums of changed seasons and keep every other season's
+        kept = ~np.isin(stored['seasons'], labels)
+        merged_labels = np.concatenate([stored['seasons'][kept], labels])
+        order = np.argsort(merged_labels, kind='mergesort')
+        sums = {method: np.concatenate([stored[method + '_sums'][kept], sums[method]])[order]
+                for method in METHODS}
+        references = {method: np.concatenate([stored[method + '_reference'][kept], references[method]])[order]
+                      for method in METHODS}
+        labels = merged_labels[order]
+    # Seasons removed from Team_Stats drop out of every window
+    present = np.isin(labels, partition_values('Team_Stats'))
+    labels = labels[present]
+    sums = {method: sums[method][present] for method in METHODS}
+    references = {method: references[method][present] for method in METHODS}
+    # Windows add seasons' sums about one reference, the mean of the seasons'
+    target_columns = [statistics.index(target) for target in targets]
+    combined = {method: rebase_sums(sums[method], references[method], target_columns,
+                                    references[method].mean(axis=0))
+                for method in METHODS}
+
+    frames = []
+    for window in windows:
+        matrices = {method: sums_correlations(window_sums(combined[method], window)) for method in METHODS}
+        counts = window_sums(combined['pearson'], window)[..., 0]
+        n_windows = len(counts)
+        last_seasons = labels[len(labels) - n_windows:]
+        first_seasons = labels[:n_windows] if window is not None else np.repeat(labels[:1], n_windows)
+        frame = pd.DataFrame({
+            'WINDOW': 'expanding' if window is None else 'rolling_{0}'.format(window),
+            'FIRST_SEASON': np.repeat(first_seasons, len(targets) * len(statistics)),
+            'SEASON': np.repeat(last_seasons, len(targets) * len(statistics)),
+            'TARGET': np.tile(np.repeat(targets, len(statistics)), n_windows),
+            'STATISTIC': np.tile(statistics, n_windows * len(targets)),
+            'OBSERVATIONS': counts.ravel().astype(int)})
+        for method in METHODS:
+            frame[method.upper() + '_CORRELATION'] = matrices[method].ravel()
+        frames.append(frame)
+    window_correlation_df = (pd.concat(frames, ignore_index=True)
+                               .dropna(subset=['PEARSON_CORRELATION', 'SPEARMAN_CORRELATION']))
+
+    if save:
+        with span('correlations.write'):
+            save_table(window_correlation_df, 'Basketball_Reference_Window_Correlations')
+        np.savez(sums_path, seasons=np.asarray(labels, dtype=str), targets=np.asarray(targets, dtype=str),
+                 statistics=np.asarray(statistics, dtype=str),
+                 pearson_sums=sums['pearson'], spearman_sums=sums['spearman'],
+                 pearson_reference=references['pearson'], spearman_reference=references['spearman'])
+    return window_correlation_df
 
 if __name__=='__main__':
-    season_lags(save=True)
+    # Pooled correlations span every season and are always recomputed; the
+    # per-season outputs only rebuild seasons changed by the last scrape
+    seasons = changed_seasons()
+    season_lags(save=True, seasons=seasons)
+    lag_correlations(save=True)
+    cluster_statistics(save=True)
     calculate_correlations(save=True)
-    season_correlations(save=True)
+    correlation_uncertainty(save=True)
+    season_correlations(save=True, seasons=seasons)
+    window_correlations(save=True, seasons=seasons)
@@ -0,0 +1,341 @@
+# Project: NBA Correlations App
+# Description: Derived metrics compiled from declarative formulas over the team stats
+# Data Sources: Basketball-Reference
+
+import ast
+import collections
+import functools
+import glob
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from storage import COLUMNAR_DIRECTORY, temporary_path
+
+# Analysts add composite statistics here rather than in the join
+DEFINITIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'derived_metrics.json')
+DERIVED_DIRECTORY = os.path.join(COLUMNAR_DIRECTORY, 'derived')
+# Evaluated metrics kept in memory and on disk, most recently used first
+MEMO_SIZE = 1024
+# Functions a formula may call, applied elementwise
+FUNCTIONS = {'abs': np.abs, 'sqrt': np.sqrt, 'log': np.log, 'exp': np.exp,
+             'minimum': np.minimum, 'maximum': np.maximum, 'where': np.where}
+ALLOWED_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call, ast.Name, ast.Load,
+                 ast.Constant, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.USub, ast.UAdd,
+                 ast.Gt, ast.GtE, ast.Lt, ast.LtE, ast.Eq, ast.NotEq)
+# Column names that are not identifiers (e.g. `OFFENSIVE_EFG%`) are quoted
+# with backticks, as in DataFrame.eval
+QUOTED_NAME = re.compile(r'`([^`]+)`')
+
+_memo = collections.OrderedDict()
+# Memoized files per directory, counted once and then kept up to date
+_entries = {}
+
+
+class DerivedMetric(object):
+    """
+    A formula compiled once into a vectorized expression over columns.
+
+    Args:
+        name (str): Name of the derived column.
+        formula (str): Arithmetic over column names, numbers and FUNCTIONS,
+                       e.g. 'PER100_AST / PER100_FG'.
+        description (str): What the metric measures.
+        representative (bool): Whether the metric may represent a cluster
+                               of statistics. False for metrics that
+                               restate others, such as per-statistic
+                               differentials.
+
+    Raises:
+        ValueError: If the formula is not a valid expression.
+    """
+    def __init__(self, name, formula, description='', representative=True):
+        self.name = name
+        self.formula = formula
+        self.description = description
+        self.representative = representative
+        quoted = []
+
+        def placeholder(match):
+            quoted.append(match.group(1))
+            return '_column_{0}'.format(len(quoted) - 1)
+
+        try:
+            tree = ast.parse(QUOTED_NAME.sub(placeholder, formula).strip(), mode='eval')
+        except SyntaxError as error:
+            raise ValueError('Invalid formula for {0}: {1}'.format(name, error))
+        self.variables = {}
+        for node in ast.walk(tree):
+            if not isinstance(node, ALLOWED_NODES):
+                raise ValueError('{0} is not allowed in the formula for {1}'.format(type(node).__name__, name))
+            if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS):
+                raise ValueError('Only {0} may be called in the formula for {1}'.format(sorted(FUNCTIONS), name))
+            if isinstance(node, ast.Name) and node.id not in FUNCTIONS:
+                match = re.match(r'_column_(\d+)$', node.id)
+                self.variables[node.id] = quoted[int(match.group(1))] if match else node.id
+        self.inputs = list(dict.fromkeys(self.variables.values()))
+        # The canonical tree identifies the formula however it is spaced
+        self.canonical = ast.dump(tree)
+        self.code = compile(tree, '<derived metric {0}>'.format(name), 'eval')
+
+    def evaluate(self, columns):
+        """
+        Evaluate the formula over whole columns at once.
+
+        Args:
+            columns (dict): Column name to float64 array for every input.
+
+        Returns:
+            values (ndarray): float64 array; divisions by zero give NaN.
+        """
+        variables = {variable: columns[column] for variable, column in self.variables.items()}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.asarray(eval(self.code, {'__builtins__': {}}, dict(FUNCTIONS, **variables)),
+                                dtype=np.float64)
+        values = np.broadcast_to(values, next(iter(columns.values())).shape).copy() if columns else values
+        values[~np.isfinite(values)] = np.nan
+        return values
+
+
+def load_definitions(path=DEFINITIONS_FILE):
+    """
+    Read metric definitions: a JSON list of objects with 'name', 'formula'
+    and optionally 'description', 'representative' and 'match'. A
+    definition with 'match' (a regular expression) is expanded once per
+    column it fully matches, its groups filling the {0}, {1}, ...
+    placeholders of the other fields.
+
+    Args:
+        path (str): Definitions file. Missing means no derived metrics.
+
+    Returns:
+        definitions (list): Definition dicts.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+@functools.lru_cache(maxsize=32)
+def _compile(definitions_json, columns):
+    definitions = json.loads(definitions_json)
+    columns = list(columns)
+    metrics = {}
+    for definition in definitions:
+        if 'match' in definition:
+            expansions = [match.groups() for match in map(re.compile(definition['match']).fullmatch, columns)
+                          if match]
+        else:
+            expansions = [()]
+        for groups in expansions:
+            metric = DerivedMetric(definition['name'].format(*groups), definition['formula'].format(*groups),
+                                   definition.get('description', '').format(*groups),
+                                   definition.get('representative', True))
+            if 'match' in definition and not set(metric.inputs) <= set(columns):
+                # A pattern only applies where all its inputs exist
+                continue
+            if metric.name in columns or metric.name in metrics:
+                raise ValueError('Derived metric {0} is defined twice or shadows a column'.format(metric.name))
+            metrics[metric.name] = metric
+
+    # Order metrics so each follows the derived metrics it uses
+    ordered, visited, visiting = [], set(), set()
+
+    def visit(name):
+        if name in visiting:
+            raise ValueError('Derived metric {0} is part of a dependency cycle'.format(name))
+        if name in visited:
+            return
+        visiting.add(name)
+        for column in metrics[name].inputs:
+            if column in metrics:
+                visit(column)
+            elif column not in columns:
+                raise ValueError('Derived metric {0} uses unknown column {1}'.format(name, column))
+        visiting.remove(name)
+        visited.add(name)
+        ordered.append(metrics[name])
+
+    for name in metrics:
+        visit(name)
+    return ordered
+
+
+def compile_metrics(columns, definitions=None):
+    """
+    Compile metric definitions for a table with `columns`. Compilation is
+    cached, so repeated calls for the same table are free.
+
+    Args:
+        columns (list): Columns of the table the metrics derive from.
+        definitions (list): Definition dicts. Defaults to load_definitions().
+
+    Returns:
+        metrics (list): DerivedMetric objects in evaluation order.
+
+    Raises:
+        ValueError: If a definition is invalid, uses an unknown column, is
+                    circular or shadows a column.
+    """
+    definitions = load_definitions() if definitions is None else definitions
+    return _compile(json.dumps(definitions, sort_keys=True), tuple(columns))
+
+
+def required_metrics(metrics, names):
+    """
+    Split the columns `names` into stored columns and the derived metrics
+    needed to compute them.
+
+    Args:
+        metrics (list): Compiled metrics in evaluation order.
+        names (list): Requested column names.
+
+    Returns:
+        stored (list): Stored columns to read: requested ones first, then
+        inputs of the derived metrics.
+        needed (list): Metrics to evaluate, in evaluation order.
+    """
+    by_name = {metric.name: metric for metric in metrics}
+    wanted = set()
+    pending = [name for name in names if name in by_name]
+    while pending:
+        name = pending.pop()
+        if name not in wanted:
+            wanted.add(name)
+            pending += [column for column in by_name[name].inputs if column in by_name]
+    needed = [metric for metric in metrics if metric.name in wanted]
+    stored = [name for name in names if name not in by_name]
+    for metric in needed:
+        stored += [column for column in metric.inputs if column not in by_name and column not in stored]
+    return stored, needed
+
+
+def unrepresentative_metrics(metrics):
+    """
+    Names of the metrics that should not represent a cluster of statistics.
+
+    Args:
+        metrics (list): Compiled metrics.
+
+    Returns:
+        names (list): Names of the metrics defined with 'representative'
+        false.
+    """
+    return [metric.name for metric in metrics if not metric.representative]
+
+
+def _hash(values):
+    return hashlib.sha256(np.ascontiguousarray(values).tobytes()).hexdigest()
+
+
+def _memoized(key, directory):
+    """Memoized values of `key`, from memory or disk, or None."""
+    if key in _memo:
+        _memo.move_to_end(key)
+        return _memo[key]
+    if directory is None:
+        return None
+    path = os.path.join(directory, key + '.npy')
+    try:
+        values = np.load(path)
+        os.utime(path)
+    except OSError:
+        # Never written, or pruned by another process
+        return None
+    _memo[key] = values
+    return values
+
+
+def _modified(path):
+    """Modification time of a memoized file; 0 if another process removed it."""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+
+def _memoize(key, values, directory):
+    _memo[key] = values
+    while len(_memo) > MEMO_SIZE:
+        _memo.popitem(last=False)
+    if directory is None:
+        return
+    os.makedirs(directory, exist_ok=True)
+    if directory not in _entries:
+        _entries[directory] = len(glob.glob(os.path.join(directory, '*.npy')))
+    path = os.path.join(directory, key + '.npy')
+    _entries[directory] += not os.path.exists(path)
+    # Parallel stages memoize the same metrics; each writes its own file and
+    # the last rename wins, all with the same values
+    temporary = temporary_path(path)
+    with open(temporary, 'wb') as f:
+        np.save(f, values)
+    os.replace(temporary, path)
+    if _entries[directory] <= MEMO_SIZE:
+        return
+    # Other processes may have written too, so prune from a fresh listing
+    paths = sorted(glob.glob(os.path.join(directory, '*.npy')), key=_modified, reverse=True)
+    for stale_path in paths[MEMO_SIZE:]:
+        try:
+            os.remove(stale_path)
+        except OSError:
+            pass
+    _entries[directory] = min(len(paths), MEMO_SIZE)
+
+
+def evaluate_metrics(df, metrics, directory=DERIVED_DIRECTORY):
+    """
+    Evaluate derived metrics in one pass over a table. Each result is
+    memoized under a hash of its formula and its input columns' values, so
+    unchanged metrics are reused across runs and pipeline stages.
+
+    Args:
+        df (DataFrame): Table holding the metrics' stored inputs.
+        metrics (list): Compiled metrics in evaluation order.
+        directory (str): Directory of memoized results; None memoizes in
+                         memory only.
+
+    Returns:
+        derived_df (DataFrame): One column per metric, aligned with `df`.
+    """
+    columns, hashes = {}, {}
+    for metric in metrics:
+        for column in metric.inputs:
+            if column not in columns:
+                columns[column] = np.asarray(df[column], dtype=np.float64)
+            if column not in hashes:
+                hashes[column] = _hash(columns[column])
+        key = hashlib.sha256('\0'.join([metric.canonical] + [hashes[column] for column in metric.inputs])
+                             .encode('utf-8')).hexdigest()
+        values = _memoized(key, directory)
+        if values is None:
+            values = metric.evaluate({column: columns[column] for column in metric.inputs})
+            _memoize(key, values, directory)
+        columns[metric.name], hashes[metric.name] = values, _hash(values)
+    return pd.DataFrame({metric.name: columns[metric.name] for metric in metrics}, index=df.index)
+
+
+def add_derived_metrics(df, names=None, definitions=None, directory=DERIVED_DIRECTORY):
+    """
+    Append derived metrics to a table.
+
+    Args:
+        df (DataFrame): Table holding the metrics' stored inputs.
+        names (list): Metrics to add, with the derived metrics they use.
+                      Defaults to every metric whose inputs are in `df`.
+        definitions (list): Definition dicts. Defaults to load_definitions().
+        directory (str): Directory of memoized results.
+
+    Returns:
+        df (DataFrame): `df` followed by the derived columns.
+    """
+    metrics = compile_metrics(list(df.columns), definitions) if names is None else \
+        required_metrics(compile_metrics(list(df.columns), definitions), names)[1]
+    if not metrics:
+        return df
+    return pd.concat([df, evaluate_metrics(df, metrics, directory)], axis=1)
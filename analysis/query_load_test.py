@@ -0,0 +1,181 @@
+# Project: NBA Correlations App
+# Description: Load test of the correlation query service with concurrent keep-alive clients
+# Data Sources: Basketball-Reference
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+import numpy as np
+
+from correlation_engine import METHODS
+from query_service import DEFAULT_HOST, DEFAULT_PORT, SEASON_TABLE
+from storage import load_table
+
+CLIENTS = 32
+DURATION = 10.0
+PERCENTILES = [50, 90, 99]
+SEED = 2019
+
+
+def query_mix(count, seed=SEED):
+    """
+    Random queries of every kind over the statistics in the outputs.
+
+    Args:
+        count (int): Number of queries.
+        seed (int): Random seed.
+
+    Returns:
+        paths (list): Request paths with their query strings.
+    """
+    rng = random.Random(seed)
+    season_df = load_table(SEASON_TABLE, columns=['TARGET', 'STATISTIC'])
+    statistics = sorted(season_df['STATISTIC'].unique())
+    targets = sorted(season_df['TARGET'].unique())
+    paths = []
+    for _ in range(count):
+        kind = rng.choice(['/correlations', '/history', '/stability', '/neighbors'])
+        params = {'stat': rng.choice(statistics)}
+        if kind in ('/correlations', '/neighbors'):
+            params['method'] = rng.choice(METHODS)
+        if kind == '/neighbors':
+            params['k'] = rng.choice([5, 10, 25])
+        if kind == '/history':
+            params['target'] = rng.choice(targets)
+        paths.append(kind + '?' + urlencode(params))
+    return paths
+
+
+async def _request(reader, writer, path):
+    """Send one GET on a keep-alive connection and read the response."""
+    writer.write('GET {0} HTTP/1.1\r\nHost: localhost\r\n\r\n'.format(path).encode('latin-1'))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def _client(connect, paths, deadline, latencies, errors):
+    """Issue queries back to back on one connection until `deadline`."""
+    reader, writer = await connect()
+    try:
+        position = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status = await _request(reader, writer, paths[position % len(paths)])
+            latencies.append(time.perf_counter() - start)
+            if status >= 500:
+                errors.append(status)
+            position += 1
+    finally:
+        writer.close()
+
+
+async def load_test(host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, clients=CLIENTS, duration=DURATION,
+                    queries=1000, seed=SEED):
+    """
+    Run `clients` concurrent clients against a running service for `duration`
+    seconds. Each client cycles through its own slice of a random query mix,
+    so repeated queries exercise the response cache.
+
+    Args:
+        host (str): Service host.
+        port (int): Service port.
+        socket_path (str): Connect to this Unix socket instead of TCP.
+        clients (int): Concurrent connections.
+        duration (float): Seconds to run.
+        queries (int): Distinct queries in the mix.
+        seed (int): Random seed.
+
+    Returns:
+        results (dict): Request count, throughput, errors and latency
+        percentiles in milliseconds.
+    """
+    if socket_path is not None:
+        connect = lambda: asyncio.open_unix_connection(socket_path)
+    else:
+        connect = lambda: asyncio.open_connection(host, port)
+    paths = query_mix(queries, seed)
+    latencies, errors = [], []
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*[_client(connect, paths[i::clients] or paths, deadline, latencies, errors)
+                           for i in range(clients)])
+    elapsed = time.perf_counter() - start
+    latencies_ms = np.array(latencies) * 1000
+    results = {'clients': clients, 'requests': len(latencies), 'errors': len(errors),
+               'requests_per_second': round(len(latencies) / elapsed, 1)}
+    for percentile in PERCENTILES:
+        results['p{0}_ms'.format(percentile)] = round(float(np.percentile(latencies_ms, percentile)), 3) \
+            if len(latencies) else None
+    results['max_ms'] = round(float(latencies_ms.max()), 3) if len(latencies) else None
+    return results
+
+
+def _drain(stream):
+    """Read a stream to its end, discarding it."""
+    for _ in stream:
+        pass
+
+
+def spawn_service(port, socket_path=None):
+    """
+    Start query_service.py in a subprocess and wait until it accepts
+    connections.
+
+    Args:
+        port (int): TCP port for the service.
+        socket_path (str): Unix socket for the service instead of TCP.
+
+    Returns:
+        process (Popen): The running service.
+    """
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'query_service.py'),
+               '--port', str(port)]
+    if socket_path is not None:
+        command += ['--socket', socket_path]
+    process = subprocess.Popen(command, stderr=subprocess.PIPE, universal_newlines=True)
+    for line in process.stderr:
+        if 'Serving data version' in line:
+            # Keep draining the service's log, so it never blocks on a full
+            # pipe under load
+            threading.Thread(target=_drain, args=(process.stderr,), daemon=True).start()
+            return process
+    raise RuntimeError('query service exited with code {0}'.format(process.wait()))
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='Measure latency of the correlation query service under '
+                                                 'concurrent clients.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--socket', help='Connect over this Unix socket instead of TCP.')
+    parser.add_argument('--clients', type=int, default=CLIENTS, help='Concurrent connections.')
+    parser.add_argument('--duration', type=float, default=DURATION, help='Seconds to run.')
+    parser.add_argument('--queries', type=int, default=1000, help='Distinct queries in the mix.')
+    parser.add_argument('--spawn', action='store_true', help='Start the service for the duration of the test.')
+    arguments = parser.parse_args()
+    service = spawn_service(arguments.port, arguments.socket) if arguments.spawn else None
+    try:
+        print(json.dumps(asyncio.run(load_test(arguments.host, arguments.port, arguments.socket, arguments.clients,
+                                               arguments.duration, arguments.queries)), indent=2))
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
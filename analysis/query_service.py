@@ -0,0 +1,409 @@
+# Project: NBA Correlations App
+# Description: Local HTTP/JSON service answering correlation queries from the memory-mapped outputs
+# Data Sources: Basketball-Reference
+
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from correlation_engine import METHODS
+from correlation_index import INDEX_TABLE, CorrelationIndex, index_from_matrices
+from storage import (COLUMNAR_DIRECTORY, DATA_DIRECTORY, load_table, map_columns, read_publication, read_schema,
+                     table_version)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# Encoded responses kept per loaded publication
+CACHE_SIZE = 4096
+# Seconds between checks for newly published data
+RELOAD_INTERVAL = 2.0
+SEASON_TABLE = 'Basketball_Reference_Season_Correlations'
+STABILITY_TABLE = 'Basketball_Reference_Lag_Correlations'
+# Tables whose schemas identify the loaded data when nothing was published
+SERVED_TABLES = [method + '_correlation' for method in METHODS] + [SEASON_TABLE, STABILITY_TABLE]
+MAX_REQUEST_LINE = 8192
+
+logger = logging.getLogger(__name__)
+
+
+class QueryError(Exception):
+    """Raised for a query that cannot be answered; carries the HTTP status."""
+    def __init__(self, message, status=400):
+        super(QueryError, self).__init__(message)
+        self.status = status
+
+
+def _number(value):
+    """JSON-friendly float: None for NaN, rounded like the .csv exports."""
+    value = float(value)
+    return None if np.isnan(value) else round(value, 6)
+
+
+def data_version(directory=COLUMNAR_DIRECTORY):
+    """
+    Identify the data in the store: the version of the last publication, or
+    the current versions of the served tables if nothing was published.
+
+    Args:
+        directory (str): Root directory of the columnar store.
+
+    Returns:
+        version (str): Opaque version string.
+    """
+    publication = read_publication(directory)
+    if publication is not None:
+        return publication['version']
+    versions = [table_version(name, directory) for name in SERVED_TABLES]
+    return 'tables-' + '-'.join('-' if version is None else version for version in versions)
+
+
+class CorrelationData(object):
+    """
+    One loaded, immutable version of the correlation outputs. Matrices and
+    per-season tables stay memory-mapped; only small lookup dictionaries are
+    built at load time.
+
+    Args:
+        directory (str): Root directory of the columnar store.
+        csv_directory (str): Directory holding the .csv exports.
+    """
+    def __init__(self, directory=COLUMNAR_DIRECTORY, csv_directory=DATA_DIRECTORY):
+        self.version = data_version(directory)
+        self.loaded_at = time.time()
+
+        # Correlation matrices: the column of a statistic is one contiguous
+        # stored row holding its correlation with every statistic
+        self.matrices = {}
+        for method in METHODS:
+            _, columns = map_columns(method + '_correlation', directory=directory, csv_directory=csv_directory)
+            self.matrices[method] = columns
+        self.statistics = [str(stat) for stat in self.matrices['pearson']['STATISTIC']]
+        self.statistic_set = set(self.statistics)
+
+        # Per-season correlations, grouped by (target, statistic) once
+        _, self.seasons = map_columns(SEASON_TABLE, directory=directory, csv_directory=csv_directory)
+        target_codes = self.seasons['TARGET'].codes.astype(np.int64)
+        statistic_codes = self.seasons['STATISTIC'].codes.astype(np.int64)
+        season_codes = self.seasons['SEASON'].codes
+        order = np.lexsort((season_codes, statistic_codes, target_codes))
+        keys = target_codes[order] * len(self.seasons['STATISTIC'].categories) + statistic_codes[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        stops = np.r_[starts[1:], len(order)]
+        targets, statistics = self.seasons['TARGET'].categories, self.seasons['STATISTIC'].categories
+        self.season_rows = {(str(targets[target_codes[order[start]]]), str(statistics[statistic_codes[order[start]]])):
+                            order[start:stop] for start, stop in zip(starts, stops)}
+        self.targets = sorted({target for target, _ in self.season_rows})
+
+        # Season-over-season stability by statistic
+        _, self.stability = map_columns(STABILITY_TABLE, directory=directory, csv_directory=csv_directory)
+        stability_codes = self.stability['STATISTIC'].codes
+        categories = self.stability['STATISTIC'].categories
+        self.stability_rows = collections.defaultdict(list)
+        for row in np.argsort(np.asarray(self.stability['LAG']), kind='mergesort'):
+            self.stability_rows[str(categories[stability_codes[row]])].append(row)
+
+        # Neighbor index, derived from the matrices if it was never stored
+        if read_schema(INDEX_TABLE, directory) is not None:
+            self.index = CorrelationIndex(load_table(INDEX_TABLE, directory=directory, csv_directory=csv_directory))
+        else:
+            self.index = CorrelationIndex(index_from_matrices(
+                self.statistics, {method: np.vstack([self.matrices[method][stat] for stat in self.statistics])
+                                  for method in METHODS}))
+        if read_publication(directory) is None:
+            # Loading converts missing tables from their .csv exports, which
+            # changes the schema stamps; record them as loaded
+            self.version = data_version(directory)
+
+    def _statistic(self, params, name='stat'):
+        stat = params.get(name)
+        if stat is None:
+            raise QueryError('missing parameter {0!r}'.format(name))
+        if stat not in self.statistic_set:
+            raise QueryError('unknown statistic {0!r}'.format(stat), 404)
+        return stat
+
+    def _method(self, params):
+        method = params.get('method', 'pearson')
+        if method not in METHODS:
+            raise QueryError('method must be one of {0}'.format(METHODS))
+        return method
+
+    def correlations(self, params):
+        """Correlation of `stat` with every statistic, by descending strength."""
+        stat, method = self._statistic(params), self._method(params)
+        row = np.asarray(self.matrices[method][stat], dtype=np.float64)
+        order = np.argsort(-np.abs(np.nan_to_num(row, nan=-1.0)), kind='mergesort')
+        position = self.statistics.index(stat)
+        return {'stat': stat, 'method': method,
+                'correlations': [{'statistic': self.statistics[i], 'correlation': _number(row[i])}
+                                 for i in order if i != position]}
+
+    def history(self, params):
+        """Per-season correlations of `stat` against a target statistic."""
+        stat = self._statistic(params)
+        target = params.get('target', self.targets[0] if self.targets else None)
+        rows = self.season_rows.get((target, stat))
+        if rows is None:
+            raise QueryError('no season correlations of {0!r} against {1!r}'.format(stat, target), 404)
+        columns = [column for column in self.seasons if column not in ('TARGET', 'STATISTIC')]
+        history = []
+        for row in rows:
+            record = {'season': str(self.seasons['SEASON'][row])}
+            for column in columns[1:]:
+                record[column.lower()] = _number(self.seasons[column][row])
+            history.append(record)
+        return {'stat': stat, 'target': target, 'history': history}
+
+    def stability(self, params):
+        """Correlation of `stat` with itself one or more seasons later."""
+        stat = self._statistic(params)
+        return {'stat': stat,
+                'lags': [{'lag': int(self.stability['LAG'][row]),
+                          'observations': int(self.stability['OBSERVATIONS'][row]),
+                          'pearson_correlation': _number(self.stability['PEARSON_CORRELATION'][row]),
+                          'spearman_correlation': _number(self.stability['SPEARMAN_CORRELATION'][row])}
+                         for row in self.stability_rows.get(stat, [])]}
+
+    def neighbors(self, params):
+        """The k statistics most correlated with `stat`."""
+        stat, method = self._statistic(params), self._method(params)
+        try:
+            k = int(params.get('k', 10))
+        except ValueError:
+            raise QueryError('k must be an integer')
+        neighbors_df = self.index.top_correlated(stat, method, max(k, 0))
+        return {'stat': stat, 'method': method,
+                'neighbors': [{'statistic': statistic, 'correlation': _number(correlation), 'rank': int(rank)}
+                              for statistic, correlation, rank in zip(neighbors_df['STATISTIC'],
+                                                                      neighbors_df['CORRELATION'],
+                                                                      neighbors_df['RANK'])]}
+
+
+QUERIES = {'/correlations': CorrelationData.correlations,
+           '/history': CorrelationData.history,
+           '/stability': CorrelationData.stability,
+           '/neighbors': CorrelationData.neighbors}
+
+
+class LRUCache(object):
+    """
+    Bounded mapping that evicts the least recently used entry.
+
+    Args:
+        maxsize (int): Maximum number of entries.
+    """
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                value = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        return {'size': len(self.entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+class QueryService(object):
+    """
+    Answers queries against the current CorrelationData. The data and its
+    response cache are swapped together in a single assignment when new data
+    is published, so a query never mixes two versions and in-flight queries
+    finish on the version they started with.
+
+    Args:
+        directory (str): Root directory of the columnar store.
+        csv_directory (str): Directory holding the .csv exports.
+        cache_size (int): Encoded responses kept per version.
+    """
+    def __init__(self, directory=COLUMNAR_DIRECTORY, csv_directory=DATA_DIRECTORY, cache_size=CACHE_SIZE):
+        self.directory = directory
+        self.csv_directory = csv_directory
+        self.cache_size = cache_size
+        self.current = (CorrelationData(directory, csv_directory), LRUCache(cache_size))
+
+    def answer(self, path, params):
+        """
+        Answer a query.
+
+        Args:
+            path (str): Query path, a key of QUERIES or '/health'.
+            params (dict): Query parameters.
+
+        Returns:
+            status (int): HTTP status.
+            body (bytes): JSON response.
+        """
+        data, cache = self.current
+        if path == '/health':
+            return 200, json.dumps({'version': data.version, 'loaded_at': data.loaded_at,
+                                    'statistics': len(data.statistics), 'cache': cache.stats()}).encode('utf-8')
+        if path not in QUERIES:
+            return 404, json.dumps({'error': 'unknown query {0!r}'.format(path)}).encode('utf-8')
+        key = (path, tuple(sorted(params.items())))
+        body = cache.get(key)
+        if body is None:
+            try:
+                body = json.dumps(QUERIES[path](data, params)).encode('utf-8')
+            except QueryError as error:
+                return error.status, json.dumps({'error': str(error)}).encode('utf-8')
+            cache.put(key, body)
+        return 200, body
+
+    def reload_if_published(self):
+        """
+        Load the store again if its version changed.
+
+        Returns:
+            reloaded (bool): Whether new data is now being served.
+        """
+        if data_version(self.directory) == self.current[0].version:
+            return False
+        data = CorrelationData(self.directory, self.csv_directory)
+        self.current = (data, LRUCache(self.cache_size))
+        logger.info('Serving data version %s', data.version)
+        return True
+
+
+async def _watch(service, interval):
+    """Reload published data in a worker thread, so queries keep being answered meanwhile."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(None, service.reload_if_published)
+        except Exception:
+            # A table may be mid-replacement; keep serving and retry
+            logger.exception('Reload failed; still serving version %s', service.current[0].version)
+
+
+def _response(status, body, keep_alive):
+    reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+              500: 'Internal Server Error'}.get(status, 'Error')
+    head = ('HTTP/1.1 {0} {1}\r\nContent-Type: application/json\r\nContent-Length: {2}\r\n'
+            'Connection: {3}\r\n\r\n').format(status, reason, len(body), 'keep-alive' if keep_alive else 'close')
+    return head.encode('latin-1') + body
+
+
+async def _handle(service, reader, writer):
+    """Serve GET requests on one connection, keeping it open between requests."""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line or len(request_line) > MAX_REQUEST_LINE:
+                break
+            keep_alive = False
+            try:
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                parts = request_line.decode('latin-1').split()
+                keep_alive = len(parts) == 3 and ((parts[2] == 'HTTP/1.1')
+                                                  != (headers.get('connection', '').lower() == 'close'))
+                if len(parts) != 3 or parts[0] != 'GET':
+                    status, body = 405, json.dumps({'error': 'only GET is supported'}).encode('utf-8')
+                else:
+                    url = urlsplit(parts[1])
+                    params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+                    status, body = service.answer(url.path, params)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                raise
+            except Exception:
+                # A malformed request or a failing query still gets an
+                # answer; the connection is closed as its state is unknown
+                logger.exception('Failed to answer %r', request_line[:MAX_REQUEST_LINE])
+                status, body = 500, json.dumps({'error': 'internal error'}).encode('utf-8')
+                keep_alive = False
+            writer.write(_response(status, body, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, reload_interval=RELOAD_INTERVAL,
+                ready=None):
+    """
+    Serve queries over HTTP until cancelled.
+
+    Args:
+        service (QueryService): Service answering the queries.
+        host (str): Interface to listen on.
+        port (int): TCP port; 0 picks a free one.
+        socket_path (str): Listen on this Unix socket instead of TCP.
+        reload_interval (float): Seconds between checks for published data;
+                                 None disables hot reloading.
+        ready (callable): Called with the listening address once serving.
+
+    Returns:
+        None
+    """
+    handler = lambda reader, writer: _handle(service, reader, writer)
+    if socket_path is not None:
+        server = await asyncio.start_unix_server(handler, path=socket_path)
+        address = socket_path
+    else:
+        server = await asyncio.start_server(handler, host, port)
+        address = server.sockets[0].getsockname()[:2]
+    watcher = asyncio.ensure_future(_watch(service, reload_interval)) if reload_interval else None
+    logger.info('Serving data version %s on %s', service.current[0].version, address)
+    if ready is not None:
+        ready(address)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='Answer correlation queries over HTTP/JSON from the '
+                                                 'memory-mapped analysis outputs.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--socket', help='Listen on this Unix socket instead of TCP.')
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help='Responses cached per data version.')
+    parser.add_argument('--reload-interval', type=float, default=RELOAD_INTERVAL,
+                        help='Seconds between checks for newly published data; 0 disables reloading.')
+    arguments = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    query_service = QueryService(cache_size=arguments.cache_size)
+    try:
+        asyncio.run(serve(query_service, arguments.host, arguments.port, arguments.socket,
+                          arguments.reload_interval or None))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,231 @@
+# Project: NBA Correlations App
+# Description: Bootstrap confidence intervals and permutation p-values for correlations
+# Data Sources: Basketball-Reference
+
+import warnings
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from correlation_engine import METHODS, rank_columns
+
+RESAMPLES = 1000
+CONFIDENCE = 0.95
+SEED = 2019
+# Resamples drawn and reduced together; each batch has its own seed so
+# results do not depend on how batches are spread over workers
+BATCH_SIZE = 100
+DEFAULT_WORKERS = None
+
+
+def _batch_seed(seed, group, kind, batch):
+    """Seed of one batch, stable across runs, processes and group subsets."""
+    return np.random.SeedSequence([seed, zlib.crc32(str(group).encode('utf-8')),
+                                   zlib.crc32(kind.encode('utf-8')), batch])
+
+
+def _standardize(values):
+    """Center and scale columns of a (batch, observations, statistics) array, ignoring NaN."""
+    if np.isnan(values).any():
+        with np.errstate(invalid='ignore', divide='ignore'):
+            center = np.nanmean(values, axis=1, keepdims=True)
+            scale = np.nanstd(values, axis=1, keepdims=True)
+    else:
+        center = values.mean(axis=1, keepdims=True)
+        scale = values.std(axis=1, keepdims=True)
+    scale[~(scale > 0)] = 1.0
+    return (values - center) / scale
+
+
+def paired_correlations(x, y, min_periods=1):
+    """
+    Pairwise-complete Pearson correlation of every column of `x` with every
+    column of `y`, for a batch of samples at once.
+
+    Args:
+        x (ndarray): Array of shape (batch, observations, q).
+        y (ndarray): Array of shape (batch, observations, p). A batch of one
+                     is broadcast against every sample of `x`.
+        min_periods (int): Minimum pairwise observations for a valid result.
+
+    Returns:
+        corr (ndarray): float64 array of shape (batch, q, p).
+    """
+    x, y = _standardize(x), _standardize(y)
+    x_mask, y_mask = ~np.isnan(x), ~np.isnan(y)
+    if x_mask.all() and y_mask.all():
+        n = x.shape[1]
+        x_sums, y_sums = x.sum(axis=1)[:, :, None], y.sum(axis=1)[:, None, :]
+        x_squares = (x * x).sum(axis=1)[:, :, None] - x_sums * x_sums / n
+        y_squares = (y * y).sum(axis=1)[:, None, :] - y_sums * y_sums / n
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = (np.matmul(x.transpose(0, 2, 1), y) - x_sums * y_sums / n) / np.sqrt(x_squares * y_squares)
+        counts = np.full(corr.shape, n)
+    else:
+        x, y = np.where(x_mask, x, 0.0), np.where(y_mask, y, 0.0)
+        xm, ym = x_mask.astype(np.float64), y_mask.astype(np.float64)
+        xt, xmt = x.transpose(0, 2, 1), xm.transpose(0, 2, 1)
+        counts = np.matmul(xmt, ym)
+        x_sums, y_sums = np.matmul(xt, ym), np.matmul(xmt, y)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = np.matmul(xt, y) - x_sums * y_sums / counts
+            x_var = np.matmul(xt * xt, ym) - x_sums * x_sums / counts
+            y_var = np.matmul(xmt, y * y) - y_sums * y_sums / counts
+            corr = cov / np.sqrt(x_var * y_var)
+    corr[counts < max(min_periods, 2)] = np.nan
+    np.clip(corr, -1, 1, out=corr)
+    return corr
+
+
+def _bootstrap_ranks(values, indices):
+    """
+    Average ranks of every column of every bootstrap sample. A sample only
+    repeats original observations, so its ranks follow from how many times
+    each observation was drawn and the order of the original columns,
+    without sorting each sample.
+    """
+    n, p = values.shape
+    size = len(indices)
+    draws = np.bincount((indices + n * np.arange(size)[:, None]).ravel(),
+                        minlength=size * n).reshape(size, n)
+    # Sort each statistic once; NaNs sort last and are never ranked
+    columns = np.ascontiguousarray(values.T)
+    order = np.argsort(columns, axis=1)
+    sorted_columns = np.take_along_axis(columns, order, axis=1)
+    positions = np.arange(n)[None, :]
+    starts = np.ones((p, n), dtype=bool)
+    starts[:, 1:] = sorted_columns[:, 1:] != sorted_columns[:, :-1]
+    ends = np.ones((p, n), dtype=bool)
+    ends[:, :-1] = starts[:, 1:]
+    first = np.maximum.accumulate(np.where(starts, positions, 0), axis=1)
+    last = np.minimum.accumulate(np.where(ends, positions, n - 1)[:, ::-1], axis=1)[:, ::-1]
+
+    # Draws of each statistic's observations in sorted order; a run of ties
+    # drawn `total` times after `below` smaller draws has average rank
+    # below + (total + 1) / 2
+    sorted_draws = draws[:, order]
+    through = np.cumsum(sorted_draws, axis=2)
+    below = np.take_along_axis(through - sorted_draws, np.broadcast_to(first, through.shape), axis=2)
+    total = np.take_along_axis(through, np.broadcast_to(last, through.shape), axis=2) - below
+    ranks = np.empty(through.shape)
+    np.put_along_axis(ranks, np.broadcast_to(order, through.shape), below + (total + 1) / 2.0, axis=2)
+    ranks[:, np.isnan(columns)] = np.nan
+    # Look up the rank of every drawn observation
+    return np.take_along_axis(ranks, np.broadcast_to(indices[:, None, :], (size, p, n)), axis=2).transpose(0, 2, 1)
+
+
+def _bootstrap_batch(values, targets, methods, seed, size, min_periods):
+    """Correlations of `targets` against every statistic in `size` bootstrap samples."""
+    rng = np.random.default_rng(seed)
+    # One row of resampled observation indices per bootstrap sample
+    indices = rng.integers(0, len(values), size=(size, len(values)))
+    estimates = {}
+    for method in methods:
+        resampled = _bootstrap_ranks(values, indices) if method == 'spearman' else values[indices]
+        estimates[method] = paired_correlations(resampled[:, :, targets], resampled, min_periods).astype(np.float32)
+    return estimates
+
+
+def _permutation_batch(values, targets, methods, seed, size, min_periods):
+    """Count permuted correlations at least as strong as the observed ones."""
+    rng = np.random.default_rng(seed)
+    # One row per permutation: shuffling the targets against the other
+    # statistics breaks any association while keeping both distributions
+    indices = np.argsort(rng.random((size, len(values))), axis=1)
+    exceedances = {}
+    for method in methods:
+        # Ranks are invariant to reordering rows, so they are computed once
+        observed_values = rank_columns(values) if method == 'spearman' else values
+        observed = paired_correlations(observed_values[None, :, targets], observed_values[None], min_periods)
+        permuted = paired_correlations(observed_values[:, targets][indices], observed_values[None], min_periods)
+        # Tolerance keeps exact ties with the observed value from being missed
+        counts = (np.abs(permuted) >= np.abs(observed) - 1e-12).sum(axis=0)
+        exceedances[method] = np.where(np.isnan(observed[0]), np.nan, counts)
+    return exceedances
+
+
+def _run_batch(task):
+    """Run one batch; module level so it can be sent to a worker process."""
+    kind, values, targets, methods, seed, size, min_periods = task
+    function = _bootstrap_batch if kind == 'bootstrap' else _permutation_batch
+    return function(values, targets, methods, seed, size, min_periods)
+
+
+def resampled_correlations(values, targets=None, groups=None, methods=METHODS, resamples=RESAMPLES,
+                           confidence=CONFIDENCE, seed=SEED, workers=DEFAULT_WORKERS,
+                           batch_size=BATCH_SIZE, min_periods=1):
+    """
+    Bootstrap percentile confidence intervals and two-sided permutation
+    p-values for the correlations of target statistics against every
+    statistic, optionally within each group (e.g. season).
+
+    Resamples are drawn as batched index matrices and reduced with batched
+    matrix products. Batches run on a process pool, each with a seed derived
+    from `seed`, the group label and the batch number, so results are the
+    same for any number of workers and for any subset of groups.
+
+    Args:
+        values (ndarray): Array of shape (observations, statistics).
+        targets (list): Column indices of the target statistics. Defaults to
+                        every statistic, giving full matrices.
+        groups (array-like): Group label per observation. Defaults to a
+                             single group.
+        methods (list): Any of 'pearson' and 'spearman'.
+        resamples (int): Bootstrap samples and permutations per group.
+        confidence (float): Coverage of the confidence intervals.
+        seed (int): Base seed.
+        workers (int): Worker processes. 1 runs in this process; None uses
+                       one per CPU.
+        batch_size (int): Resamples per batch.
+        min_periods (int): Minimum pairwise observations for a valid result.
+
+    Returns:
+        labels (ndarray): Sorted unique group labels.
+        intervals (dict): Method name to a dict with float64 arrays 'lower',
+        'upper' and 'p_value', each of shape (groups, targets, statistics).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    for method in methods:
+        if method not in METHODS:
+            raise ValueError('method must be one of {0}, got {1!r}'.format(METHODS, method))
+    targets = list(range(values.shape[1])) if targets is None else list(targets)
+    if groups is None:
+        labels, codes = np.array(['all']), np.zeros(len(values), dtype=int)
+    else:
+        labels, codes = np.unique(np.asarray(groups), return_inverse=True)
+
+    starts = range(0, resamples, batch_size)
+    tasks = []
+    for g, label in enumerate(labels):
+        group_values = values[codes == g]
+        for kind in ['bootstrap', 'permutation']:
+            for batch, start in enumerate(starts):
+                tasks.append((kind, group_values, targets, methods, _batch_seed(seed, label, kind, batch),
+                              min(batch_size, resamples - start), min_periods))
+    if workers == 1:
+        results = [_run_batch(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_run_batch, tasks))
+
+    shape = (len(labels), len(targets), values.shape[1])
+    intervals = {method: {'lower': np.empty(shape), 'upper': np.empty(shape), 'p_value': np.empty(shape)}
+                 for method in methods}
+    tail = (1 - confidence) / 2 * 100
+    for g in range(len(labels)):
+        # Tasks were queued per group as bootstrap then permutation batches
+        position = 2 * len(starts) * g
+        bootstrap = results[position:position + len(starts)]
+        permutation = results[position + len(starts):position + 2 * len(starts)]
+        for method in methods:
+            estimates = np.concatenate([result[method] for result in bootstrap])
+            with warnings.catch_warnings():
+                # Constant statistics have no correlation in any sample
+                warnings.simplefilter('ignore', RuntimeWarning)
+                lower, upper = np.nanpercentile(estimates, [tail, 100 - tail], axis=0)
+            exceedances = sum(result[method] for result in permutation)
+            intervals[method]['lower'][g] = lower
+            intervals[method]['upper'][g] = upper
+            intervals[method]['p_value'][g] = (exceedances + 1.0) / (resamples + 1.0)
+    return labels, intervals
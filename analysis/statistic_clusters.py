@@ -0,0 +1,251 @@
+# Project: NBA Correlations App
+# Description: Hierarchical clustering of near-duplicate statistics by correlation
+# Data Sources: Basketball-Reference
+
+import glob
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from storage import COLUMNAR_DIRECTORY, temporary_path
+
+# Absolute correlations at which statistics are grouped as redundant
+CLUSTER_THRESHOLDS = [0.9, 0.95, 0.98]
+# Complete linkage guarantees every pair within a cluster reaches the threshold
+LINKAGE_METHODS = ['complete', 'average', 'single']
+LINKAGE_DIRECTORY = os.path.join(COLUMNAR_DIRECTORY, 'linkage')
+# Linkages kept on disk, most recently used first
+LINKAGE_CACHE_SIZE = 8
+
+
+def correlation_distance(corr):
+    """
+    Distance between statistics from their correlation matrix: 1 - |r|, so
+    statistics that move together or in exact opposition are close.
+    Missing correlations, e.g. of a constant statistic, are as far apart as
+    possible.
+
+    Args:
+        corr (ndarray): (statistics, statistics) correlation matrix.
+
+    Returns:
+        distance (ndarray): (statistics, statistics) distance matrix with a
+        zero diagonal.
+    """
+    distance = 1 - np.abs(np.asarray(corr, dtype=np.float64))
+    distance[np.isnan(distance)] = 1
+    np.fill_diagonal(distance, 0)
+    return np.clip(distance, 0, 1)
+
+
+def linkage(distance, method='complete'):
+    """
+    Agglomerative hierarchical clustering of a distance matrix, merging the
+    two closest clusters at every step and updating distances with the
+    Lance-Williams formula. The closest cluster of every row is cached and
+    only rows whose closest cluster was merged are searched again, so a merge
+    costs O(statistics) in the common case.
+
+    Args:
+        distance (ndarray): Symmetric (n, n) distance matrix.
+        method (str): One of LINKAGE_METHODS.
+
+    Returns:
+        merges (ndarray): (n - 1, 4) array in the layout of
+        scipy.cluster.hierarchy.linkage: the two cluster ids merged (ids of
+        n and above are earlier merges), their distance and the size of the
+        new cluster.
+    """
+    if method not in LINKAGE_METHODS:
+        raise ValueError('method must be one of {0}'.format(LINKAGE_METHODS))
+    n = len(distance)
+    merges = np.empty((max(n - 1, 0), 4))
+    if n < 2:
+        return merges
+    distance = np.array(distance, dtype=np.float64)
+    np.fill_diagonal(distance, np.inf)
+    ids = np.arange(n)
+    sizes = np.ones(n)
+    nearest = distance.argmin(axis=1)
+    nearest_distance = distance[np.arange(n), nearest]
+    for step in range(n - 1):
+        i = int(nearest_distance.argmin())
+        j = int(nearest[i])
+        merges[step] = [min(ids[i], ids[j]), max(ids[i], ids[j]), distance[i, j], sizes[i] + sizes[j]]
+
+        # The merged cluster takes slot i; slot j is retired
+        if method == 'complete':
+            merged = np.maximum(distance[i], distance[j])
+        elif method == 'single':
+            merged = np.minimum(distance[i], distance[j])
+        else:
+            merged = (sizes[i] * distance[i] + sizes[j] * distance[j]) / (sizes[i] + sizes[j])
+        merged[[i, j]] = np.inf
+        distance[i], distance[:, i] = merged, merged
+        distance[j], distance[:, j] = np.inf, np.inf
+        ids[i], sizes[i] = n + step, sizes[i] + sizes[j]
+        nearest_distance[j] = np.inf
+
+        stale = np.flatnonzero((nearest == i) | (nearest == j))
+        stale = stale[np.isfinite(nearest_distance[stale])]
+        stale = np.union1d(stale, [i])
+        nearest[stale] = distance[stale].argmin(axis=1)
+        nearest_distance[stale] = distance[stale, nearest[stale]]
+        closer = merged < nearest_distance
+        nearest[closer], nearest_distance[closer] = i, merged[closer]
+    return merges
+
+
+def cut_linkage(merges, threshold):
+    """
+    Flat clusters of every merge at a distance of at most `threshold`.
+
+    Args:
+        merges (ndarray): Linkage returned by `linkage`.
+        threshold (float): Largest distance joined into one cluster.
+
+    Returns:
+        labels (ndarray): Cluster number per statistic, numbered from 1 in
+        order of each cluster's first statistic.
+    """
+    n = len(merges) + 1
+    members = {i: [i] for i in range(n)}
+    for step, (a, b, merge_distance, _) in enumerate(merges):
+        if merge_distance <= threshold:
+            members[n + step] = members.pop(int(a)) + members.pop(int(b))
+    labels = np.empty(n, dtype=int)
+    for number, group in enumerate(sorted(members.values(), key=min), start=1):
+        labels[group] = number
+    return labels
+
+
+def matrix_hash(corr, statistics, method):
+    """Key of a linkage: the correlation matrix, its statistics and the method."""
+    digest = hashlib.sha256(np.ascontiguousarray(corr, dtype=np.float64).tobytes())
+    digest.update('\0'.join(statistics).encode('utf-8'))
+    digest.update(method.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _modified(path):
+    """Modification time of a cached linkage; 0 if another process removed it."""
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return 0
+
+
+def cached_linkage(corr, statistics, method='complete', directory=LINKAGE_DIRECTORY):
+    """
+    Linkage of a correlation matrix, reused from disk when the same matrix
+    was clustered before and computed and stored otherwise.
+
+    Args:
+        corr (ndarray): (statistics, statistics) correlation matrix.
+        statistics (list): Statistic names, in matrix column order.
+        method (str): One of LINKAGE_METHODS.
+        directory (str): Directory holding cached linkages.
+
+    Returns:
+        merges (ndarray): Linkage returned by `linkage`.
+    """
+    path = os.path.join(directory, matrix_hash(corr, statistics, method) + '.npy')
+    try:
+        merges = np.load(path)
+    except FileNotFoundError:
+        # Never stored, or pruned by another process
+        merges = None
+    if merges is not None:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return merges
+    merges = linkage(correlation_distance(corr), method)
+    os.makedirs(directory, exist_ok=True)
+    temporary = temporary_path(path)
+    with open(temporary, 'wb') as f:
+        np.save(f, merges)
+    os.replace(temporary, path)
+    for stale_path in sorted(glob.glob(os.path.join(directory, '*.npy')), key=_modified,
+                             reverse=True)[LINKAGE_CACHE_SIZE:]:
+        try:
+            os.remove(stale_path)
+        except FileNotFoundError:
+            pass
+    return merges
+
+
+def representatives(corr, labels, keep=None, exclude=None):
+    """
+    Pick the statistic representing each cluster: a statistic of `keep`
+    when the cluster has one, otherwise the member with the highest mean
+    absolute correlation with the rest of its cluster.
+
+    Args:
+        corr (ndarray): (statistics, statistics) correlation matrix.
+        labels (ndarray): Cluster number per statistic.
+        keep (list): Positions of statistics that always represent their
+                     cluster, in order of preference.
+        exclude (list): Positions of statistics that only represent a
+                        cluster with no other members to choose from.
+
+    Returns:
+        chosen (ndarray): Position of the representative of every
+        statistic's cluster.
+    """
+    strength = np.nan_to_num(np.abs(np.asarray(corr, dtype=np.float64)))
+    chosen = np.empty(len(labels), dtype=int)
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        kept = [position for position in keep or [] if position in members]
+        if kept:
+            chosen[members] = kept[0]
+        else:
+            centrality = strength[np.ix_(members, members)].sum(axis=1)
+            eligible = ~np.isin(members, list(exclude or []))
+            if eligible.any():
+                centrality[~eligible] = -1
+            chosen[members] = members[centrality.argmax()]
+    return chosen
+
+
+def cluster_table(corr, statistics, thresholds=CLUSTER_THRESHOLDS, method='complete', keep=None,
+                  exclude=None, directory=LINKAGE_DIRECTORY):
+    """
+    Cluster statistics at several correlation thresholds from one linkage.
+
+    Args:
+        corr (ndarray): (statistics, statistics) correlation matrix.
+        statistics (list): Statistic names, in matrix column order.
+        thresholds (list): Absolute correlations at which statistics are
+                           clustered together.
+        method (str): One of LINKAGE_METHODS.
+        keep (list): Statistics that always represent their cluster.
+        exclude (list): Statistics that only represent a cluster with no
+                        other members, e.g. near-duplicate derived metrics.
+        directory (str): Directory holding cached linkages.
+
+    Returns:
+        clusters_df (DataFrame): One row per threshold and statistic with
+        columns THRESHOLD, STATISTIC, CLUSTER, CLUSTER_SIZE, REPRESENTATIVE
+        and IS_REPRESENTATIVE.
+    """
+    statistics = list(statistics)
+    merges = cached_linkage(corr, statistics, method, directory)
+    keep = [statistics.index(stat) for stat in keep or [] if stat in statistics]
+    exclude = [statistics.index(stat) for stat in exclude or [] if stat in statistics]
+    names = np.asarray(statistics, dtype=object)
+    frames = []
+    for threshold in thresholds:
+        labels = cut_linkage(merges, 1 - threshold)
+        chosen = representatives(corr, labels, keep, exclude)
+        frames.append(pd.DataFrame({'THRESHOLD': threshold,
+                                    'STATISTIC': names,
+                                    'CLUSTER': labels,
+                                    'CLUSTER_SIZE': np.bincount(labels)[labels],
+                                    'REPRESENTATIVE': names[chosen],
+                                    'IS_REPRESENTATIVE': (chosen == np.arange(len(statistics))).astype(int)}))
+    return pd.concat(frames, ignore_index=True)
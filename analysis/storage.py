@@ -0,0 +1,638 @@
+# Project: NBA Correlations App
+# Description: Columnar storage of team stats and correlation outputs
+# Data Sources: Basketball-Reference
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; catalog updates are then not serialized
+    fcntl = None
+
+# Outputs live with the Shiny app, wherever the scripts are run from
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'correlation_app', 'data', '')
+COLUMNAR_DIRECTORY = os.path.join(DATA_DIRECTORY, 'columnar', '')
+SCHEMA_FILE = 'schema.json'
+# A table directory holds immutable versions and a pointer file naming the
+# current one, replaced atomically by every write
+CURRENT_FILE = 'CURRENT'
+# Seconds a superseded version is kept for readers that resolved it just
+# before it was replaced
+VERSION_GRACE = 60
+# Written once a pipeline run has replaced all its tables, so readers can
+# reload a consistent set
+PUBLICATION_FILE = 'publication.json'
+# Partitioned datasets hold one columnar table per season of a table, listed
+# in a catalog, so readers load only the seasons they need
+PARTITIONED_DIRECTORY = os.path.join(COLUMNAR_DIRECTORY, 'partitioned', '')
+CATALOG_FILE = 'catalog.json'
+# Held while the catalog is read, changed and rewritten
+CATALOG_LOCK = 'catalog.lock'
+PARTITION_COLUMN = 'SEASON'
+CATEGORICAL_COLUMNS = ['TEAM', 'SEASON', 'CONFERENCE', 'DIVISION', 'ARENA',
+                       'STATISTIC', 'TARGET']
+# Input float columns are stored as float32 only where float32 holds every
+# value exactly, so tables load back unchanged. A table may instead pass a
+# number of decimals its values are known to be rounded to
+INPUT_DECIMALS = 'exact'
+# Correlation outputs are displayed to three decimals, so float32 is always
+# precise enough for them
+OUTPUT_DECIMALS = None
+
+
+def temporary_path(path):
+    """
+    Temporary path next to `path` that is unique to this process and thread.
+    Files are written there and renamed over `path` with os.replace, so
+    readers never see a partial file and concurrent writers never share one.
+    """
+    return '{0}.{1}.{2}.tmp'.format(path, os.getpid(), threading.get_ident())
+
+
+def _column_schema(series, decimals):
+    """Pick the storage type of a column and return (schema entry, values)."""
+    if series.name in CATEGORICAL_COLUMNS or series.dtype == object or str(series.dtype) == 'category':
+        categorical = series.astype('category')
+        codes = categorical.cat.codes.values
+        dtype = np.int8 if len(categorical.cat.categories) < 127 else np.int32
+        return ({'kind': 'category', 'dtype': np.dtype(dtype).name,
+                 'categories': [str(c) for c in categorical.cat.categories]},
+                codes.astype(dtype))
+    values = series.values
+    if np.issubdtype(values.dtype, np.integer) or values.dtype == bool:
+        dtype = np.result_type(np.min_scalar_type(values.min()), np.min_scalar_type(values.max())) if len(values) else np.int8
+        return {'kind': 'integer', 'dtype': np.dtype(dtype).name}, values.astype(dtype)
+    values = values.astype(np.float64)
+    narrowed = values.astype(np.float32)
+    if decimals is None:
+        return {'kind': 'float', 'dtype': 'float32', 'decimals': None}, narrowed
+    widened = narrowed.astype(np.float64)
+    if decimals == 'exact':
+        if np.array_equal(widened, values, equal_nan=True):
+            return {'kind': 'float', 'dtype': 'float32', 'decimals': None}, narrowed
+        return {'kind': 'float', 'dtype': 'float64'}, values
+    # Rounding the float32 values on load restores the column only if every
+    # value already had at most `decimals` places
+    with np.errstate(invalid='ignore'):
+        lossless = np.array_equal(np.round(widened, decimals), values, equal_nan=True)
+    if lossless:
+        return {'kind': 'float', 'dtype': 'float32', 'decimals': decimals}, narrowed
+    return {'kind': 'float', 'dtype': 'float64'}, values
+
+
+def write_table(df, name, directory=COLUMNAR_DIRECTORY, decimals=INPUT_DECIMALS, source=None):
+    """
+    Write a DataFrame as memory-mappable .npy blocks plus a JSON schema. Each
+    block holds every column of one storage type, one column per contiguous
+    row, so a table is a handful of files however wide it is. Text columns
+    are stored as categorical codes, integers in the smallest type that
+    holds them, and floats as float32 where that loses nothing (see
+    `decimals`).
+
+    The table is written to a new version directory and published by
+    atomically replacing the table's pointer file, so readers see either the
+    previous or the new table, never a partial or missing one, and
+    concurrent writers never collide.
+
+    Args:
+        df (DataFrame): Table to store.
+        name (str): Table name, e.g. 'Team_Stats'.
+        directory (str): Root directory of the columnar store.
+        decimals (int or str): 'exact' stores a float column as float32
+                               only if float32 holds its values exactly. A
+                               number of decimals also allows float32 for
+                               columns whose values all have at most that
+                               many places; they are rounded back on load.
+                               None stores every float column as float32,
+                               for outputs that tolerate it.
+        source (dict): Optional fingerprint of the .csv the table was built
+                       from, used by load_table to detect stale tables.
+
+    Returns:
+        schema (dict): Schema written alongside the columns.
+    """
+    table_directory = os.path.join(directory, name)
+    # Versions sort by creation time; the suffix keeps concurrent writers apart
+    version = '{0:016x}-{1}'.format(time.time_ns(), uuid.uuid4().hex[:8])
+    staging = os.path.join(table_directory, version)
+    os.makedirs(staging)
+
+    schema = {'name': name, 'rows': len(df), 'columns': [], 'source': source}
+    blocks = {}
+    for column in df.columns:
+        entry, values = _column_schema(df[column], decimals)
+        block = blocks.setdefault(entry['dtype'], [])
+        entry['name'] = column
+        entry['file'] = entry['dtype'] + '.npy'
+        entry['index'] = len(block)
+        block.append(values)
+        schema['columns'].append(entry)
+    for dtype, block in blocks.items():
+        np.save(os.path.join(staging, dtype + '.npy'), np.array(block, dtype=dtype).reshape(len(block), len(df)))
+    with open(os.path.join(staging, SCHEMA_FILE), 'w') as f:
+        json.dump(schema, f, indent=2)
+
+    pointer = os.path.join(table_directory, CURRENT_FILE)
+    with open('{0}.{1}.tmp'.format(pointer, version), 'w') as f:
+        f.write(version)
+    os.replace('{0}.{1}.tmp'.format(pointer, version), pointer)
+    _prune_versions(table_directory, version)
+    schema['version'] = version
+    return schema
+
+
+def _version_time(version):
+    """Creation time in nanoseconds encoded in a version name, None if it has none."""
+    try:
+        return int(version.split('-')[0], 16)
+    except ValueError:
+        return None
+
+
+def _prune_versions(table_directory, current):
+    """
+    Remove versions older than `current` that were superseded more than
+    VERSION_GRACE seconds ago, and files of the unversioned layout. Newer
+    versions may belong to a writer still in progress and are left alone.
+    """
+    versions = sorted(entry for entry in os.listdir(table_directory)
+                      if _version_time(entry) is not None and os.path.isdir(os.path.join(table_directory, entry)))
+    cutoff = time.time_ns() - VERSION_GRACE * 10 ** 9
+    for stale, successor in zip(versions, versions[1:]):
+        # A version was superseded about when its successor was created
+        if stale < current and _version_time(successor) < cutoff:
+            shutil.rmtree(os.path.join(table_directory, stale), ignore_errors=True)
+    for entry in os.listdir(table_directory):
+        if entry == SCHEMA_FILE or entry.endswith('.npy'):
+            os.remove(os.path.join(table_directory, entry))
+
+
+def table_version(name, directory=COLUMNAR_DIRECTORY):
+    """
+    Current version of a stored table.
+
+    Args:
+        name (str): Table name.
+        directory (str): Root directory of the columnar store.
+
+    Returns:
+        version (str): Version directory name; '' for a table stored before
+        tables were versioned, None if the table does not exist.
+    """
+    try:
+        with open(os.path.join(directory, name, CURRENT_FILE)) as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return '' if os.path.exists(os.path.join(directory, name, SCHEMA_FILE)) else None
+
+
+def read_schema(name, directory=COLUMNAR_DIRECTORY):
+    """
+    Read the schema of the current version of a stored table.
+
+    Args:
+        name (str): Table name.
+        directory (str): Root directory of the columnar store.
+
+    Returns:
+        schema (dict): Table schema, with the 'version' it was read from;
+        None if the table does not exist.
+    """
+    version = table_version(name, directory)
+    if version is None:
+        return None
+    with open(os.path.join(directory, name, version, SCHEMA_FILE)) as f:
+        schema = json.load(f)
+    schema['version'] = version
+    return schema
+
+
+def read_csv(path):
+    """
+    Read a .csv export, parsing floats exactly so a table stored from it
+    holds the values the .csv was written from.
+
+    Args:
+        path (str): Path to the .csv file.
+
+    Returns:
+        df (DataFrame): Table as written.
+    """
+    return pd.read_csv(path, float_precision='round_trip')
+
+
+def csv_fingerprint(path):
+    """
+    Cheap fingerprint of a .csv file used to detect when a stored table is
+    out of date.
+
+    Args:
+        path (str): Path to the .csv file.
+
+    Returns:
+        fingerprint (dict): File size and modification time.
+    """
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def fresh_schema(name, directory=COLUMNAR_DIRECTORY, csv_directory=DATA_DIRECTORY):
+    """
+    Read the schema of a stored table, first rebuilding the table from
+    `<name>.csv` if it is missing or older than the .csv.
+
+    Args:
+        name (str): Table name, e.g. 'Team_Stats'.
+        directory (str): Root directory of the columnar store.
+        csv_directory (str): Directory holding the .csv exports.
+
+    Returns:
+        schema (dict): Table schema.
+
+    Raises:
+        IOError: If there is neither a stored table nor a .csv.
+    """
+    schema = read_schema(name, directory)
+    csv_path = os.path.join(csv_directory, name + '.csv')
+    if os.path.exists(csv_path):
+        fingerprint = csv_fingerprint(csv_path)
+        if schema is None or schema.get('source') not in (None, fingerprint):
+            schema = write_table(read_csv(csv_path), name, directory, source=fingerprint)
+    if schema is None:
+        raise IOError('No columnar table or .csv named {0!r}'.format(name))
+    return schema
+
+
+def map_columns(name, columns=None, directory=COLUMNAR_DIRECTORY, csv_directory=DATA_DIRECTORY):
+    """
+    Memory-map the columns of a stored table without copying them into a
+    DataFrame. Numeric columns are read-only views of the stored blocks and
+    text columns are categoricals over the stored codes.
+
+    Args:
+        name (str): Table name, e.g. 'pearson_correlation'.
+        columns (list): Subset of columns to map. Defaults to all columns.
+        directory (str): Root directory of the columnar store.
+        csv_directory (str): Directory holding the .csv exports.
+
+    Returns:
+        schema (dict): Table schema.
+        data (dict): Column name to ndarray or Categorical, in column order.
+    """
+    schema = fresh_schema(name, directory, csv_directory)
+    entries = schema['columns']
+    if columns is not None:
+        by_name = {entry['name']: entry for entry in entries}
+        entries = [by_name[column] for column in columns]
+    blocks = {}
+    data = {}
+    for entry in entries:
+        if entry['file'] not in blocks:
+            blocks[entry['file']] = np.load(os.path.join(directory, name, schema['version'], entry['file']),
+                                            mmap_mode='r')
+        values = blocks[entry['file']][entry['index']]
+        if entry['kind'] == 'category':
+            data[entry['name']] = pd.Categorical.from_codes(values, entry['categories'])
+        else:
+            data[entry['name']] = values
+    return schema, data
+
+
+def load_table(name, columns=None, float64=True, directory=COLUMNAR_DIRECTORY,
+               csv_directory=DATA_DIRECTORY):
+    """
+    Load a table from the columnar store with explicit dtypes: categoricals
+    for text columns, compact integers, and float32 where lossless. If the
+    stored table is missing or older than `<name>.csv`, it is rebuilt from
+    the .csv first.
+
+    Args:
+        name (str): Table name, e.g. 'Team_Stats'.
+        columns (list): Subset of columns to load. Defaults to all columns.
+        float64 (bool): Widen float32 columns back to float64, rounded
+                        only in tables written with a number of decimals,
+                        so input tables load exactly as written. Set False
+                        to keep the smaller float32 memory-mapped columns.
+        directory (str): Root directory of the columnar store.
+        csv_directory (str): Directory holding the .csv exports.
+
+    Returns:
+        df (DataFrame): Loaded table.
+    """
+    schema, data = map_columns(name, columns, directory, csv_directory)
+    if float64:
+        for entry in schema['columns']:
+            if entry['name'] in data and entry['kind'] == 'float' and entry['dtype'] == 'float32':
+                values = data[entry['name']].astype(np.float64)
+                data[entry['name']] = values if entry['decimals'] is None else np.round(values, entry['decimals'])
+    return pd.DataFrame(data, columns=list(data))
+
+
+def save_table(df, name, decimals=OUTPUT_DECIMALS, directory=COLUMNAR_DIRECTORY,
+               csv_directory=DATA_DIRECTORY):
+    """
+    Store an output table in the columnar store and export it as .csv for
+    the Shiny app.
+
+    Args:
+        df (DataFrame): Table to store.
+        name (str): Table name, also the .csv file name without extension.
+        decimals (int): Float storage of the columns, see write_table.
+        directory (str): Root directory of the columnar store.
+        csv_directory (str): Directory holding the .csv exports.
+
+    Returns:
+        None
+    """
+    csv_path = os.path.join(csv_directory, name + '.csv')
+    df.to_csv(csv_path, index=False)
+    write_table(df, name, directory, decimals, source=csv_fingerprint(csv_path))
+
+
+def publish(tables=None, directory=COLUMNAR_DIRECTORY):
+    """
+    Mark the tables currently in the store as a consistent publication, for
+    readers that reload when new data is published.
+
+    Args:
+        tables (list): Names of the tables that changed. Defaults to None.
+        directory (str): Root directory of the columnar store.
+
+    Returns:
+        publication (dict): 'version', 'published_at' and 'tables'.
+    """
+    publication = {'version': uuid.uuid4().hex, 'published_at': time.time(), 'tables': tables}
+    path = os.path.join(directory, PUBLICATION_FILE)
+    os.makedirs(directory, exist_ok=True)
+    # Each publisher writes its own file, so concurrent publishers and the
+    # service's reload watcher only ever see a whole marker
+    temporary = temporary_path(path)
+    with open(temporary, 'w') as f:
+        json.dump(publication, f, indent=2)
+    os.replace(temporary, path)
+    return publication
+
+
+def read_publication(directory=COLUMNAR_DIRECTORY):
+    """
+    Read the last publication marker.
+
+    Args:
+        directory (str): Root directory of the columnar store.
+
+    Returns:
+        publication (dict): Marker written by publish, None if there is none.
+    """
+    path = os.path.join(directory, PUBLICATION_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def read_catalog(directory=PARTITIONED_DIRECTORY):
+    """
+    Read the catalog of partitioned tables.
+
+    Args:
+        directory (str): Root directory of the partitioned datasets.
+
+    Returns:
+        catalog (dict): 'tables' mapping each table name to its entry, with
+        'partition_column', 'columns', 'source' and 'partitions' (partition
+        value to 'path', 'rows' and 'columns').
+    """
+    path = os.path.join(directory, CATALOG_FILE)
+    if not os.path.exists(path):
+        return {'tables': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+@contextmanager
+def _catalog_lock(directory):
+    """
+    Hold an exclusive lock on the catalog of `directory`, so processes
+    partitioning tables at once do not drop each other's catalog changes.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, CATALOG_LOCK), 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def write_partitioned(df, name, partitions=None, partition_column=PARTITION_COLUMN,
+                      directory=PARTITIONED_DIRECTORY, decimals=INPUT_DECIMALS, source=None):
+    """
+    Write a DataFrame as one columnar table per value of `partition_column`
+    and record them in the catalog. Partitions may have different columns,
+    so seasons that lack some statistics can sit alongside later ones.
+
+    Args:
+        df (DataFrame): Table to store.
+        name (str): Table name, e.g. 'Team_Stats'.
+        partitions (list): Partition values to rewrite; a value with no rows
+                           in `df` is removed and every other partition is
+                           kept as stored. Defaults to None, which rewrites
+                           the whole table.
+        partition_column (str): Column whose values partition the table.
+        directory (str): Root directory of the partitioned datasets.
+        decimals (int): Float storage of the columns, see write_table.
+        source (dict): Fingerprint of the .csv the table was built from.
+
+    Returns:
+        entry (dict): Catalog entry of the table.
+    """
+    with _catalog_lock(directory):
+        return _write_partitioned(df, name, partitions, partition_column, directory, decimals, source)
+
+
+def _write_partitioned(df, name, partitions, partition_column, directory, decimals, source):
+    """write_partitioned for a caller holding the catalog lock."""
+    catalog = read_catalog(directory)
+    entry = catalog['tables'].get(name)
+    if entry is None or entry['partition_column'] != partition_column:
+        entry, partitions = {'partition_column': partition_column, 'partitions': {}}, None
+    keys = df[partition_column].astype(str)
+    rows = keys.groupby(keys, sort=False).indices
+    values = set(rows) if partitions is None else {str(value) for value in partitions}
+    if partitions is None:
+        values |= set(entry['partitions'])
+    for value in sorted(values):
+        path = '{0}/{1}={2}'.format(name, partition_column, value)
+        if value in rows:
+            schema = write_table(df.iloc[rows[value]], path, directory, decimals)
+            entry['partitions'][value] = {'path': path, 'rows': schema['rows'],
+                                          'columns': [column['name'] for column in schema['columns']]}
+        else:
+            shutil.rmtree(os.path.join(directory, path), ignore_errors=True)
+            entry['partitions'].pop(value, None)
+    entry['partitions'] = dict(sorted(entry['partitions'].items()))
+    columns = []
+    for partition in entry['partitions'].values():
+        columns += [column for column in partition['columns'] if column not in columns]
+    entry['columns'] = columns
+    entry['source'] = source
+    catalog['tables'][name] = entry
+    path = os.path.join(directory, CATALOG_FILE)
+    temporary = temporary_path(path)
+    with open(temporary, 'w') as f:
+        json.dump(catalog, f, indent=2)
+    os.replace(temporary, path)
+    return entry
+
+
+def partitioned_entry(name, directory=PARTITIONED_DIRECTORY, csv_directory=DATA_DIRECTORY):
+    """
+    Catalog entry of a partitioned table, first partitioning `<name>.csv`
+    if the table is missing or older than the .csv.
+
+    Args:
+        name (str): Table name, e.g. 'Team_Stats'.
+        directory (str): Root directory of the partitioned datasets.
+        csv_directory (str): Directory holding the .csv exports.
+
+    Returns:
+        entry (dict): Catalog entry, see read_catalog.
+
+    Raises:
+        IOError: If there is neither a partitioned table nor a .csv.
+    """
+    entry = read_catalog(directory)['tables'].get(name)
+    csv_path = os.path.join(csv_directory, name + '.csv')
+    if os.path.exists(csv_path):
+        fingerprint = csv_fingerprint(csv_path)
+        if entry is None or entry.get('source') not in (None, fingerprint):
+            with _catalog_lock(directory):
+                # Parallel stages find the table stale at once; only the
+                # first one to take the lock repartitions it
+                entry = read_catalog(directory)['tables'].get(name)
+                if entry is None or entry.get('source') not in (None, fingerprint):
+                    entry = _write_partitioned(read_csv(csv_path), name, None, PARTITION_COLUMN, directory,
+                                               INPUT_DECIMALS, fingerprint)
+    if entry is None:
+        raise IOError('No partitioned table or .csv named {0!r}'.format(name))
+    return entry
+
+
+def _load_partitions(entry, values, columns, float64, directory):
+    """Load and stack the partitions `values` of a catalog entry."""
+    columns = list(entry['columns'] if columns is None else columns)
+    frames = []
+    for value in values:
+        partition = entry['partitions'][value]
+        frames.append(load_table(partition['path'], [column for column in columns if column in partition['columns']],
+                                 float64, directory, csv_directory=directory))
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat(frames, ignore_index=True, sort=False).reindex(columns=columns)
+    for column in columns:
+        # Keep text columns categorical across partitions
+        parts = [frame[column] for frame in frames if column in frame]
+        if len(parts) == len(frames) and all(pd.api.types.is_categorical_dtype(part) for part in parts):
+            df[column] = pd.api.types.union_categoricals(parts)
+    return df
+
+
+def partition_values(name, partitions=None, directory=PARTITIONED_DIRECTORY, csv_directory=DATA_DIRECTORY):
+    """
+    Sorted partition values of a partitioned table, e.g. its season labels.
+
+    Args:
+        name (str): Table name.
+        partitions (list): Only return these values, where they exist.
+        directory (str): Root directory of the partitioned datasets.
+        csv_directory (str): Directory holding the .csv exports.
+
+    Returns:
+        values (list): Partition values as strings.
+    """
+    values = list(partitioned_entry(name, directory, csv_directory)['partitions'])
+    if partitions is None:
+        return values
+    wanted = {str(value) for value in partitions}
+    return [value for value in values if value in wanted]
+
+
+def load_partitioned(name, partitions=None, columns=None, float64=True, directory=PARTITIONED_DIRECTORY,
+                     csv_directory=DATA_DIRECTORY):
+    """
+    Load only the requested partitions and columns of a partitioned table,
+    so memory and I/O scale with the query rather than the table.
+
+    Args:
+        name (str): Table name, e.g. 'Team_Stats'.
+        partitions (list): Partition values (e.g. season labels) to load.
+                           Defaults to all of them.
+        columns (list): Columns to load; a column missing from a partition
+                        is filled with NaN. Defaults to all columns.
+        float64 (bool): See load_table.
+        directory (str): Root directory of the partitioned datasets.
+        csv_directory (str): Directory holding the .csv exports.
+
+    Returns:
+        df (DataFrame): Rows of the partitions in partition order.
+    """
+    entry = partitioned_entry(name, directory, csv_directory)
+    values = partition_values(name, partitions, directory, csv_directory)
+    return _load_partitions(entry, values, columns, float64, directory)
+
+
+def _apply_partition(task):
+    """Load one partition and apply a function to it; runs in a worker process."""
+    function, entry, value, columns, float64, directory = task
+    return function(_load_partitions(entry, [value], columns, float64, directory))
+
+
+def map_partitions(function, name, partitions=None, columns=None, workers=1, float64=True,
+                   directory=PARTITIONED_DIRECTORY, csv_directory=DATA_DIRECTORY):
+    """
+    Apply a function to every partition of a partitioned table, in parallel.
+    Each partition is loaded by the process that handles it, so only the
+    partitions in flight are held in memory.
+
+    Args:
+        function (callable): function(df) of one partition's rows. Must be
+                             picklable (a module-level function or a
+                             functools.partial of one) when workers > 1.
+        name (str): Table name.
+        partitions (list): Partition values to process. Defaults to all.
+        columns (list): Columns to load; see load_partitioned. Every
+                        partition gets these columns, in this order.
+        workers (int): Worker processes. 1 runs in this process; None uses
+                       one per CPU.
+        float64 (bool): See load_table.
+        directory (str): Root directory of the partitioned datasets.
+        csv_directory (str): Directory holding the .csv exports.
+
+    Returns:
+        results (dict): Partition value to the function's result, in
+        partition order.
+    """
+    entry = partitioned_entry(name, directory, csv_directory)
+    values = partition_values(name, partitions, directory, csv_directory)
+    columns = list(entry['columns'] if columns is None else columns)
+    tasks = [(function, entry, value, columns, float64, directory) for value in values]
+    if workers == 1:
+        results = [_apply_partition(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_apply_partition, tasks))
+    return dict(zip(values, results))
@@ -0,0 +1,381 @@
+# Project: NBA Correlations App
+# Description: Streaming, mergeable correlation accumulators for data too large for one DataFrame
+# Data Sources: Basketball-Reference
+
+import numpy as np
+import pandas as pd
+
+from correlation_engine import METHODS
+
+CHUNK_SIZE = 100000
+RANK_MODES = ['exact', 'approximate']
+# Values kept per statistic by the approximate rank sketch
+SKETCH_SIZE = 10000
+
+
+def read_chunks(paths, columns=None, chunksize=CHUNK_SIZE):
+    """
+    Read .csv and .parquet files as a stream of DataFrames of at most
+    `chunksize` rows, so memory is bounded by the chunk size rather than the
+    size of the data.
+
+    Args:
+        paths (list): Paths to .csv or .parquet files, or a single path.
+        columns (list): Columns to read. Defaults to all columns.
+        chunksize (int): Rows per chunk.
+
+    Yields:
+        chunk (DataFrame): Next chunk of rows.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    for path in paths:
+        if path.endswith('.parquet'):
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError('Reading .parquet files in chunks requires pyarrow')
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+                yield batch.to_pandas()
+        else:
+            for chunk in pd.read_csv(path, usecols=columns, chunksize=chunksize):
+                yield chunk
+
+
+class CovarianceAccumulator(object):
+    """
+    Online pairwise-complete co-moments of a fixed set of statistics.
+
+    For every pair (i, j) the accumulator keeps the number of rows where
+    both are observed, the mean and sum of squared deviations of i over
+    those rows, and the co-moment of i and j. Each chunk is reduced with a
+    few matrix products and folded in with the parallel form of Welford's
+    update, so chunks, files or processes can be accumulated separately and
+    merged in any order.
+
+    Args:
+        statistics (list): Statistic names, in column order.
+    """
+    def __init__(self, statistics):
+        self.statistics = list(statistics)
+        p = len(self.statistics)
+        self.counts = np.zeros((p, p))
+        # [i, j] holds the statistic of i over the rows where j is observed
+        self.means = np.zeros((p, p))
+        self.squares = np.zeros((p, p))
+        self.comoments = np.zeros((p, p))
+
+    @classmethod
+    def from_values(cls, values, statistics):
+        """
+        Build an accumulator holding the co-moments of one block of rows.
+
+        Args:
+            values (ndarray): Array of shape (observations, statistics).
+            statistics (list): Statistic names, in column order.
+
+        Returns:
+            accumulator (CovarianceAccumulator): Accumulated block.
+        """
+        accumulator = cls(statistics)
+        values = np.asarray(values, dtype=np.float64)
+        mask = ~np.isnan(values)
+        # Shift by the block means so the sums below stay well conditioned
+        with np.errstate(invalid='ignore'):
+            shift = np.nanmean(values, axis=0) if len(values) else np.zeros(values.shape[1])
+        shift[np.isnan(shift)] = 0.0
+        x = np.where(mask, values - shift, 0.0)
+        p = values.shape[1]
+        if mask.all():
+            # Every pair is observed on every row
+            counts = np.full((p, p), float(len(values)))
+            sums = np.repeat(x.sum(axis=0)[:, None], p, axis=1)
+            squares = np.repeat((x * x).sum(axis=0)[:, None], p, axis=1)
+        else:
+            m = mask.astype(np.float64)
+            counts = np.dot(m.T, m)
+            sums = np.dot(x.T, m)
+            squares = np.dot((x * x).T, m)
+        cross = np.dot(x.T, x)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(counts > 0, sums / counts, 0.0)
+        accumulator.counts = counts
+        accumulator.means = means + shift[:, None]
+        accumulator.squares = squares - means * sums
+        accumulator.comoments = cross - means * sums.T
+        return accumulator
+
+    def merge(self, other):
+        """
+        Fold another accumulator over the same statistics into this one.
+
+        Args:
+            other (CovarianceAccumulator): Accumulator to merge.
+
+        Returns:
+            self (CovarianceAccumulator): The merged accumulator.
+        """
+        if other.statistics != self.statistics:
+            raise ValueError('Cannot merge accumulators over different statistics')
+        counts = self.counts + other.counts
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.where(counts > 0, self.counts * other.counts / counts, 0.0)
+            share = np.where(counts > 0, other.counts / counts, 0.0)
+        delta = other.means - self.means
+        self.comoments = self.comoments + other.comoments + weight * delta * delta.T
+        self.squares = self.squares + other.squares + weight * delta * delta
+        self.means = self.means + share * delta
+        self.counts = counts
+        return self
+
+    def update(self, values):
+        """
+        Accumulate a chunk of rows.
+
+        Args:
+            values (ndarray): Array of shape (observations, statistics).
+
+        Returns:
+            self (CovarianceAccumulator): The updated accumulator.
+        """
+        return self.merge(CovarianceAccumulator.from_values(values, self.statistics))
+
+    def correlation(self, min_periods=1):
+        """
+        Pairwise-complete Pearson correlation matrix, matching DataFrame.corr.
+
+        Args:
+            min_periods (int): Minimum pairwise observations for a valid result.
+
+        Returns:
+            corr (ndarray): float64 array of shape (statistics, statistics).
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = self.comoments / np.sqrt(self.squares * self.squares.T)
+        corr[self.counts < max(min_periods, 2)] = np.nan
+        np.clip(corr, -1, 1, out=corr)
+        return corr
+
+    def covariance(self, min_periods=1):
+        """
+        Pairwise-complete sample covariance matrix, matching DataFrame.cov.
+
+        Args:
+            min_periods (int): Minimum pairwise observations for a valid result.
+
+        Returns:
+            cov (ndarray): float64 array of shape (statistics, statistics).
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = self.comoments / (self.counts - 1)
+        cov[self.counts < max(min_periods, 2)] = np.nan
+        return cov
+
+    def save(self, path):
+        """
+        Write the accumulator to a .npz file so partial results from
+        separate processes can be merged later.
+
+        Args:
+            path (str): Destination .npz path.
+
+        Returns:
+            None
+        """
+        np.savez(path, statistics=np.asarray(self.statistics, dtype=str), counts=self.counts,
+                 means=self.means, squares=self.squares, comoments=self.comoments)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read an accumulator written by save.
+
+        Args:
+            path (str): .npz path.
+
+        Returns:
+            accumulator (CovarianceAccumulator): Loaded accumulator.
+        """
+        with np.load(path) as data:
+            accumulator = cls([str(stat) for stat in data['statistics']])
+            accumulator.counts = data['counts']
+            accumulator.means = data['means']
+            accumulator.squares = data['squares']
+            accumulator.comoments = data['comoments']
+        return accumulator
+
+
+class RankTable(object):
+    """
+    Maps values of each statistic to their average rank over the whole
+    stream, built in a first pass so a second pass can accumulate Spearman
+    correlations as Pearson correlations of ranks.
+
+    In 'exact' mode every distinct value and its count is kept, so ranks
+    equal the column-level average ranks used by DataFrame.rank; memory grows
+    with the number of distinct values, not rows. In 'approximate' mode a
+    uniform reservoir sample of `sketch_size` values per statistic is kept and
+    ranks are interpolated from its empirical distribution, bounding memory
+    regardless of the data.
+
+    Args:
+        n_statistics (int): Number of statistics.
+        mode (str): One of RANK_MODES.
+        sketch_size (int): Sample size per statistic in 'approximate' mode.
+        seed (int): Seed of the reservoir sampler.
+    """
+    def __init__(self, n_statistics, mode='exact', sketch_size=SKETCH_SIZE, seed=0):
+        if mode not in RANK_MODES:
+            raise ValueError('mode must be one of {0}, got {1!r}'.format(RANK_MODES, mode))
+        self.mode = mode
+        self.sketch_size = sketch_size
+        self.random = np.random.RandomState(seed)
+        self.observed = np.zeros(n_statistics, dtype=np.int64)
+        self.values = [np.array([]) for _ in range(n_statistics)]
+        self.counts = [np.array([], dtype=np.int64) for _ in range(n_statistics)]
+        self._lookup = None
+
+    def update(self, values):
+        """
+        Record a chunk of rows.
+
+        Args:
+            values (ndarray): Array of shape (observations, statistics).
+
+        Returns:
+            None
+        """
+        # One contiguous row per statistic
+        columns = np.ascontiguousarray(np.asarray(values, dtype=np.float64).T)
+        for j, column in enumerate(columns):
+            column = column[~np.isnan(column)]
+            if self.mode == 'exact':
+                self._count(j, column)
+            else:
+                self._sample(j, column)
+            self.observed[j] += len(column)
+        self._lookup = None
+
+    def _count(self, j, column):
+        """Merge the distinct values of a chunk of one statistic into its counts."""
+        chunk_values, chunk_counts = np.unique(column, return_counts=True)
+        values = np.concatenate([self.values[j], chunk_values])
+        counts = np.concatenate([self.counts[j], chunk_counts])
+        if not len(values):
+            return
+        # Both runs are already sorted, so a stable sort merges them in linear time
+        order = np.argsort(values, kind='mergesort')
+        values, counts = values[order], counts[order]
+        starts = np.nonzero(np.concatenate([[True], values[1:] != values[:-1]]))[0]
+        self.values[j], self.counts[j] = values[starts], np.add.reduceat(counts, starts)
+
+    def _sample(self, j, column):
+        """Reservoir-sample a chunk of one statistic."""
+        sample = self.values[j]
+        seen = self.observed[j]
+        room = max(self.sketch_size - len(sample), 0)
+        sample = np.concatenate([sample, column[:room]])
+        rest = column[room:]
+        if len(rest):
+            # Item number t (1-based) replaces a random slot with probability size / t
+            slots = self.random.randint(0, seen + room + np.arange(1, len(rest) + 1))
+            keep = slots < self.sketch_size
+            # Later items win when several land on the same slot
+            sample[slots[keep]] = rest[keep]
+        self.values[j] = sample
+
+    def ranks(self, values):
+        """
+        Replace a chunk of values by their ranks over the whole stream.
+
+        Args:
+            values (ndarray): Array of shape (observations, statistics).
+
+        Returns:
+            ranks (ndarray): float64 array of the same shape, NaN where
+            values are missing.
+        """
+        if self._lookup is None:
+            self._lookup = [self._rank_lookup(j) for j in range(len(self.values))]
+        columns = np.ascontiguousarray(np.asarray(values, dtype=np.float64).T)
+        ranks = np.full(columns.shape, np.nan)
+        for j, column in enumerate(columns):
+            observed = ~np.isnan(column)
+            keys, average = self._lookup[j]
+            if not len(keys):
+                continue
+            if self.mode == 'exact':
+                ranks[j, observed] = average[np.searchsorted(keys, column[observed])]
+            else:
+                # Midpoint empirical CDF of the sample scaled to the full stream
+                below = np.searchsorted(keys, column[observed], side='left')
+                through = np.searchsorted(keys, column[observed], side='right')
+                ranks[j, observed] = (below + through) * average + 0.5
+        return ranks.T
+
+    def _rank_lookup(self, j):
+        """Sorted keys of one statistic and what ranks() needs to rank against them."""
+        if self.mode == 'exact':
+            # Average rank of a value: values strictly below it plus the
+            # middle of its own run of ties
+            below = np.concatenate([[0], np.cumsum(self.counts[j])])
+            return self.values[j], below[:-1] + (self.counts[j] + 1) / 2.0
+        sample = np.sort(self.values[j])
+        return sample, self.observed[j] / (2.0 * max(len(sample), 1))
+
+
+def _numeric_chunks(chunks, statistics):
+    """Yield the numeric columns of each chunk as a float64 array."""
+    for chunk in chunks:
+        yield chunk[statistics].values.astype(np.float64)
+
+
+def streaming_correlations(paths, methods=METHODS, columns=None, rank_mode='exact',
+                           chunksize=CHUNK_SIZE, min_periods=1):
+    """
+    Correlation matrices of the numeric columns of .csv or .parquet files,
+    computed in bounded memory. Pearson needs one pass over the files;
+    Spearman needs a second pass to convert values to ranks. Spearman ranks
+    are column-level, so a pair of statistics with different missing rows is
+    not re-ranked on its common rows as DataFrame.corr does.
+
+    Args:
+        paths (list): Paths to .csv or .parquet files, or a single path.
+        methods (list): Any of 'pearson' and 'spearman'.
+        columns (list): Statistics to correlate. Defaults to the numeric
+                        columns of the first chunk.
+        rank_mode (str): 'exact' or 'approximate' ranks for Spearman. See
+                         RankTable.
+        chunksize (int): Rows per chunk.
+        min_periods (int): Minimum pairwise observations for a valid result.
+
+    Returns:
+        frames (dict): Method name to correlation matrix DataFrame indexed by
+        statistic on both axes, as returned by correlation_frames.
+    """
+    for method in methods:
+        if method not in METHODS:
+            raise ValueError('method must be one of {0}, got {1!r}'.format(METHODS, method))
+    chunks = read_chunks(paths, columns, chunksize)
+    first = next(chunks)
+    statistics = list(first.select_dtypes(include=[np.number, 'bool']).columns)
+
+    accumulator = CovarianceAccumulator(statistics)
+    rank_table = RankTable(len(statistics), rank_mode) if 'spearman' in methods else None
+    for values in _numeric_chunks([first], statistics):
+        accumulator.update(values)
+        if rank_table is not None:
+            rank_table.update(values)
+    for values in _numeric_chunks(chunks, statistics):
+        accumulator.update(values)
+        if rank_table is not None:
+            rank_table.update(values)
+
+    matrices = {'pearson': accumulator.correlation(min_periods)}
+    if rank_table is not None:
+        rank_accumulator = CovarianceAccumulator(statistics)
+        for values in _numeric_chunks(read_chunks(paths, statistics, chunksize), statistics):
+            rank_accumulator.update(rank_table.ranks(values))
+        matrices['spearman'] = rank_accumulator.correlation(min_periods)
+    return {method: pd.DataFrame(matrices[method], index=statistics, columns=statistics)
+            for method in methods}
@@ -0,0 +1,255 @@
+# Project: NBA Correlations App
+# Description: Basketball-Reference fixture pages for the scraper benchmarks
+# Data Sources: Basketball-Reference
+
+import html
+import os
+import sys
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIRECTORY = os.path.dirname(BENCHMARK_DIRECTORY)
+sys.path[:0] = [os.path.join(ROOT_DIRECTORY, 'scraping'), os.path.join(ROOT_DIRECTORY, 'analysis')]
+
+import numpy as np
+import pandas as pd
+
+import scraper
+from cache import ResponseCache
+from storage import DATA_DIRECTORY
+from tables import compare_extraction
+
+# Pages are stored in the scraper's response cache layout, so a cache
+# recorded from the live site can be benchmarked instead
+FIXTURE_DIRECTORY = os.path.join(BENCHMARK_DIRECTORY, 'fixtures')
+FIXTURE_SEASONS = [2005, 2012, 2019]
+
+# Header of each table as laid out on the site, as (over-header, column
+# names) groups; the scrapers rename page columns by position
+PER_100_HEADER = [('', ['Rk', 'Team', 'G', 'MP', 'FG', 'FGA', 'FG%', '3P', '3PA', '3P%', '2P', '2PA',
+                        '2P%', 'FT', 'FTA', 'FT%', 'ORB', 'DRB', 'TRB', 'AST', 'STL', 'BLK', 'TOV',
+                        'PF', 'PTS'])]
+SHOOTING_HEADER = [('', ['Rk', 'Team', 'G', 'MP', 'FG%', 'Dist.']),
+                   ('% of FGA by Distance', ['2P', '0-3', '3-10', '10-16', '16-3P', '3P']),
+                   ('FG% by Distance', ['2P', '0-3', '3-10', '10-16', '16-3P', '3P']),
+                   ("% Ast'd", ['2P']),
+                   ('Dunks', ['%FGA', '#']),
+                   ('Layups', ['%FGA', '#']),
+                   ("% Ast'd", ['3P']),
+                   ('Corner 3s', ['%3PA', '3P%'])]
+HEAVES_HEADER = [('Heaves', ['Att.', '#'])]
+MISC_HEADER = [('', ['Rk', 'Team', 'Age', 'W', 'L', 'PW', 'PL', 'MOV', 'SOS', 'SRS', 'ORtg', 'DRtg',
+                     'NRtg', 'Pace', 'FTr', '3PAr', 'TS%']),
+               ('Offense Four Factors', ['eFG%', 'TOV%', 'ORB%', 'FT/FGA']),
+               ('Defense Four Factors', ['eFG%', 'TOV%', 'DRB%', 'FT/FGA']),
+               ('', ['Arena', 'Attend.', 'Attend./G'])]
+RATINGS_HEADER = [('', ['Rk', 'Team', 'Conf', 'Div', 'W', 'L', 'W/L%']),
+                  ('Unadjusted', ['MOV', 'ORtg', 'DRtg', 'NRtg']),
+                  ('Adjusted', ['MOV/A', 'ORtg/A', 'DRtg/A', 'NRtg/A'])]
+
+# Table id -> (source .csv, columns in page order after RANK and TEAM,
+# header, whether the page has a League Average row)
+SUMMARY_TABLES = {
+    'team-stats-per_poss': ('Per_100_Poss.csv', scraper.PER_100_COLUMNS[4:], PER_100_HEADER, False),
+    'opponent-stats-per_poss': ('Opponent_Per_100_Poss.csv', scraper.OPPONENT_PER_100_COLUMNS[4:],
+                                PER_100_HEADER, False),
+    'team_shooting': ('Team_Shooting.csv', scraper.TEAM_SHOOTING_COLUMNS[4:],
+                      SHOOTING_HEADER + HEAVES_HEADER, True),
+    'opponent_shooting': ('Opponent_Shooting.csv', scraper.OPPONENT_SHOOTING_COLUMNS[4:],
+                          SHOOTING_HEADER, True),
+    'misc_stats': ('Miscellaneous_Stats.csv', [column for column in scraper.MISC_STATS_COLUMNS[4:]
+                                               if column != 'W/L%'], MISC_HEADER, True)}
+RATINGS_COLUMNS = ['CONFERENCE', 'DIVISION', 'W', 'L', 'W/L%', 'MOV', 'ORTG', 'DRTG', 'NRTG',
+                   'ADJUSTED_MOV', 'ADJUSTED_ORTG', 'ADJUSTED_DRTG', 'ADJUSTED_NRTG']
+
+
+def _cell(value, tag='td'):
+    """Render one table cell; missing values are left empty as on the site."""
+    if isinstance(value, float):
+        text = '' if np.isnan(value) else repr(value)
+    else:
+        text = html.escape(str(value))
+    return '<{0}>{1}</{0}>'.format(tag, text)
+
+
+def render_table(table_id, df, columns, header, league_average=False):
+    """
+    Render rows of a scraped table back into a Basketball-Reference table,
+    including over-headers and the asterisk marking playoff teams.
+
+    Args:
+        table_id (str): id attribute of the table.
+        df (DataFrame): Rows of one season of a scraped .csv.
+        columns (list): Columns rendered after Rk and Team, in page order.
+        header (list): (over-header, column names) groups.
+        league_average (bool): Append a League Average row.
+
+    Returns:
+        table (str): HTML of the table.
+    """
+    rows = ['<thead>']
+    if len(header) > 1:
+        rows.append('<tr class="over_header">' + ''.join(
+            '<th colspan="{0}">{1}</th>'.format(len(names), html.escape(group)) for group, names in header) + '</tr>')
+    rows.append('<tr>' + ''.join(_cell(name, 'th') for _, names in header for name in names) + '</tr>')
+    rows.append('</thead><tbody>')
+    playoff = df['PLAYOFF_TEAM'].values if 'PLAYOFF_TEAM' in df else np.zeros(len(df))
+    for i, (_, row) in enumerate(df.iterrows()):
+        team = row['TEAM'] + ('*' if playoff[i] == 1 else '')
+        rows.append('<tr>' + _cell(int(row['RANK'])) + _cell(team) +
+                    ''.join(_cell(row[column]) for column in columns) + '</tr>')
+    if league_average:
+        averages = df[columns].mean(numeric_only=True)
+        rows.append('<tr>' + _cell('') + _cell('League Average') +
+                    ''.join(_cell(round(float(averages[column]), 3) if column in averages else '')
+                            for column in columns) + '</tr>')
+    rows.append('</tbody>')
+    return '<table class="stats_table" id="{0}">{1}</table>'.format(table_id, '\n'.join(rows))
+
+
+def render_season_summary(season, directory=DATA_DIRECTORY):
+    """
+    Render a stand-in NBA Season Summary page for one season from the scraped
+    .csv files. As on the site, the tables are shipped inside HTML comments
+    following placeholder divs and unhidden by JavaScript.
+
+    Args:
+        season (int): Year in which the season ends (e.g. 2019 for 2018-2019).
+        directory (str): Directory holding the scraped .csv files.
+
+    Returns:
+        page (str): HTML of the page.
+    """
+    label = '{0}-{1}'.format(season - 1, season)
+    blocks = []
+    for table_id, (file_name, columns, header, league_average) in SUMMARY_TABLES.items():
+        df = pd.read_csv(os.path.join(directory, file_name))
+        table = render_table(table_id, df[df['SEASON'] == label], columns, header, league_average)
+        blocks.append('<div class="table_wrapper" id="all_{0}"><div class="placeholder"></div>\n'
+                      '<!--\n<div class="table_container" id="div_{0}">{1}</div>\n-->\n</div>'
+                      .format(table_id, table))
+    return ('<!DOCTYPE html><html><head><title>{0} NBA Season Summary</title></head><body>'
+            '<div id="content">{1}</div></body></html>').format(label, '\n'.join(blocks))
+
+
+def render_season_ratings(season, directory=DATA_DIRECTORY):
+    """
+    Render a stand-in Team Ratings page for one season from Team_Ratings.csv.
+
+    Args:
+        season (int): Year in which the season ends (e.g. 2019 for 2018-2019).
+        directory (str): Directory holding the scraped .csv files.
+
+    Returns:
+        page (str): HTML of the page.
+    """
+    label = '{0}-{1}'.format(season - 1, season)
+    df = pd.read_csv(os.path.join(directory, 'Team_Ratings.csv'))
+    table = render_table('ratings', df[df['SEASON'] == label], RATINGS_COLUMNS, RATINGS_HEADER)
+    return ('<!DOCTYPE html><html><head><title>{0} NBA Team Ratings</title></head><body>'
+            '<div id="content">{1}</div></body></html>').format(label, table)
+
+
+class _RenderedResponse(object):
+    """Minimal stand-in for a requests.Response carrying a rendered page."""
+    def __init__(self, text):
+        self.text = text
+        self.status_code = 200
+        self.headers = {}
+
+    def raise_for_status(self):
+        pass
+
+
+def _render(url, headers=None):
+    """Fetch function for ResponseCache that renders pages instead of downloading them."""
+    season = int(url.rsplit('NBA_', 1)[1][:4])
+    if url.endswith('_ratings.html'):
+        return _RenderedResponse(render_season_ratings(season))
+    return _RenderedResponse(render_season_summary(season))
+
+
+def fixture_urls(seasons=FIXTURE_SEASONS):
+    """Season Summary and Team Ratings URLs of `seasons`, in that order."""
+    return ([scraper.SEASON_SUMMARY_URL.format(season) for season in seasons] +
+            [scraper.SEASON_RATINGS_URL.format(season) for season in seasons])
+
+
+def fixture_cache(seasons=FIXTURE_SEASONS, directory=FIXTURE_DIRECTORY):
+    """
+    Response cache holding the fixture pages of `seasons`. Pages missing from
+    `directory` are rendered and recorded once, so a directory recorded from
+    the live site by the scraper (its cache directory) is used as-is.
+
+    Args:
+        seasons (list): Years in which the seasons end.
+        directory (str): Response cache directory.
+
+    Returns:
+        cache (ResponseCache): Cache in replay mode over `directory`.
+    """
+    recorder = ResponseCache(_render, directory=directory, mode='record')
+    for url in fixture_urls(seasons):
+        recorder.get(url)
+    return ResponseCache(_render, directory=directory, mode='replay')
+
+
+def verify_fixture_pages(seasons=FIXTURE_SEASONS, directory=FIXTURE_DIRECTORY):
+    """
+    Scrape the fixture pages with the scraper and compare the result with the
+    scraped .csv files they were rendered from.
+
+    Args:
+        seasons (list): Years in which the seasons end.
+        directory (str): Response cache directory.
+
+    Returns:
+        mismatches (dict): Source file name to a description of how its
+        scraped rows differ; empty when every table round-trips.
+    """
+    http_cache, scraper.http_cache = scraper.http_cache, fixture_cache(seasons, directory)
+    scraper.scrape_season_summary.cache_clear()
+    scraper.scrape_season_ratings.cache_clear()
+    mismatches = {}
+    try:
+        for file_name, scrape in scraper.TABLE_SCRAPERS.items():
+            scraped_df = scrape(seasons=seasons).reset_index(drop=True)
+            expected_df = pd.read_csv(os.path.join(DATA_DIRECTORY, file_name))
+            labels = ['{0}-{1}'.format(season - 1, season) for season in seasons]
+            expected_df = expected_df[expected_df['SEASON'].isin(labels)].reset_index(drop=True)
+            try:
+                pd.testing.assert_frame_equal(scraped_df, expected_df, check_dtype=False)
+            except AssertionError as error:
+                mismatches[file_name] = str(error)
+    finally:
+        scraper.http_cache = http_cache
+        scraper.scrape_season_summary.cache_clear()
+        scraper.scrape_season_ratings.cache_clear()
+    return mismatches
+
+
+def verify_table_extraction(seasons=FIXTURE_SEASONS, directory=FIXTURE_DIRECTORY):
+    """
+    Compare the lxml table extractor with the BeautifulSoup and pd.read_html
+    path it replaced on every fixture page.
+
+    Args:
+        seasons (list): Years in which the seasons end.
+        directory (str): Response cache directory.
+
+    Returns:
+        mismatches (dict): URL to the mismatches of tables.compare_extraction;
+        empty when both read the same values.
+    """
+    cache = fixture_cache(seasons, directory)
+    mismatches = {}
+    for url in fixture_urls(seasons):
+        table_ids = [scraper.SEASON_RATINGS_TABLE] if url.endswith('_ratings.html') else scraper.SEASON_SUMMARY_TABLES
+        url_mismatches = compare_extraction(cache.get(url), table_ids)
+        if url_mismatches:
+            mismatches[url] = url_mismatches
+    return mismatches
+
+
+if __name__=='__main__':
+    print(verify_table_extraction() or 'The table extractor matches pd.read_html on the fixture pages')
+    print(verify_fixture_pages() or 'Fixture pages round-trip through the scraper')
@@ -0,0 +1,149 @@
+# Project: NBA Correlations App
+# Description: Synthetic team tables of any size for the benchmarks
+# Data Sources: Basketball-Reference (column layout only)
+
+import os
+import sys
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT_DIRECTORY, 'scraping'), os.path.join(ROOT_DIRECTORY, 'analysis')]
+
+import numpy as np
+import pandas as pd
+
+from scraper import SOURCE_COLUMNS
+from storage import DATA_DIRECTORY
+
+SEED = 2019
+TEAMS = 30
+FIRST_SEASON = 2005
+# Latent factors shared by the synthetic statistics, so their correlations
+# have structure like the real ones rather than all being near zero
+FACTORS = 8
+TEXT_COLUMNS = ['TEAM', 'SEASON', 'CONFERENCE', 'DIVISION', 'ARENA']
+# Columns generated per block, bounding the temporary memory of wide tables
+BLOCK_SIZE = 64
+
+
+def synthetic_keys(rows, teams=TEAMS):
+    """
+    TEAM and SEASON labels of `rows` synthetic team seasons, `teams` per
+    season, in season order. Seasons past 2019 continue the same labelling
+    (e.g. '2030-2031').
+
+    Args:
+        rows (int): Number of team seasons.
+        teams (int): Teams per season.
+
+    Returns:
+        team (ndarray): Team name of every row.
+        season (ndarray): Season label of every row.
+    """
+    positions = np.arange(rows)
+    team_names = np.array(['Team {0:02d}'.format(team) for team in range(teams)], dtype=object)
+    ends = np.arange(FIRST_SEASON, FIRST_SEASON + (rows + teams - 1) // teams)
+    season_labels = np.array(['{0}-{1}'.format(end - 1, end) for end in ends], dtype=object)
+    return team_names[positions % teams], season_labels[positions // teams]
+
+
+def _real_statistics():
+    """Numeric column names of the real Team_Stats.csv, or [] without it."""
+    path = os.path.join(DATA_DIRECTORY, 'Team_Stats.csv')
+    if not os.path.exists(path):
+        return []
+    return [column for column in pd.read_csv(path, nrows=5).select_dtypes(include=[np.number]).columns]
+
+
+def synthetic_values(rows, columns, seed=SEED, missing=0.0):
+    """
+    Matrix of statistics driven by a few shared latent factors, with a level
+    that drifts from season to season, rounded to three decimals like
+    Basketball-Reference.
+
+    Args:
+        rows (int): Number of observations.
+        columns (int): Number of statistics.
+        seed (int): Random seed.
+        missing (float): Fraction of values replaced by NaN.
+
+    Returns:
+        values (ndarray): float64 array of shape (rows, columns).
+    """
+    rng = np.random.default_rng(seed)
+    factors = rng.standard_normal((rows, FACTORS))
+    drift = np.repeat(rng.standard_normal(((rows + TEAMS - 1) // TEAMS, FACTORS)), TEAMS, axis=0)[:rows]
+    factors += 0.3 * drift
+    values = np.empty((rows, columns))
+    for start in range(0, columns, BLOCK_SIZE):
+        stop = min(start + BLOCK_SIZE, columns)
+        loadings = rng.standard_normal((FACTORS, stop - start)) * rng.uniform(0, 1, FACTORS)[:, None]
+        block = np.matmul(factors, loadings) + rng.standard_normal((rows, stop - start))
+        scale, center = rng.uniform(0.01, 10, stop - start), rng.uniform(-5, 100, stop - start)
+        values[:, start:stop] = np.round(block * scale + center, 3)
+    if missing:
+        values[rng.random(values.shape) < missing] = np.nan
+    return values
+
+
+def synthetic_team_stats(rows=450, columns=122, seed=SEED, missing=0.0):
+    """
+    Synthetic stand-in for Team_Stats.csv with `rows` team seasons and
+    `columns` numeric statistics. The real statistic names are used first,
+    so targets such as NRTG and controls such as PACE exist, followed by
+    STAT_<n> columns.
+
+    Args:
+        rows (int): Number of team seasons (450 in the real table).
+        columns (int): Number of numeric statistics (122 in the real table).
+        seed (int): Random seed.
+        missing (float): Fraction of values replaced by NaN.
+
+    Returns:
+        team_stats_df (DataFrame): RANK, TEAM and SEASON followed by the
+        statistics.
+    """
+    statistics = [stat for stat in _real_statistics() if stat != 'RANK'][:columns - 1]
+    statistics += ['STAT_{0}'.format(i) for i in range(columns - 1 - len(statistics))]
+    team, season = synthetic_keys(rows)
+    values = synthetic_values(rows, len(statistics), seed, missing)
+    team_stats_df = pd.DataFrame(values, columns=statistics, copy=False)
+    team_stats_df.insert(0, 'SEASON', season)
+    team_stats_df.insert(0, 'TEAM', team)
+    team_stats_df.insert(0, 'RANK', np.arange(rows) % TEAMS + 1)
+    return team_stats_df
+
+
+def synthetic_source_tables(rows=450, seed=SEED):
+    """
+    Synthetic stand-ins for the six scraped tables, with the columns of
+    SOURCE_COLUMNS, for benchmarking the join. A column shared by several
+    tables has the same values in each, and every table but the first lists
+    its rows in a different order, as the scraped pages do.
+
+    Args:
+        rows (int): Number of team seasons.
+        seed (int): Random seed.
+
+    Returns:
+        source_dfs (list): (file name, DataFrame) pairs in the join order of
+        create_team_base_table.
+    """
+    rng = np.random.default_rng(seed)
+    team, season = synthetic_keys(rows)
+    file_names = ['Team_Ratings.csv', 'Miscellaneous_Stats.csv', 'Per_100_Poss.csv',
+                  'Opponent_Per_100_Poss.csv', 'Team_Shooting.csv', 'Opponent_Shooting.csv']
+    shared = {'TEAM': team, 'SEASON': season}
+    numeric = sorted({column for name in file_names for column in SOURCE_COLUMNS[name]} - set(shared))
+    values = synthetic_values(rows, len(numeric), seed)
+    for i, column in enumerate(numeric):
+        if column in TEXT_COLUMNS:
+            shared[column] = np.array(['{0} {1}'.format(column.title(), code)
+                                       for code in rng.integers(0, 30, rows)], dtype=object)
+        else:
+            shared[column] = values[:, i]
+    source_dfs = []
+    for position, file_name in enumerate(file_names):
+        order = np.arange(rows) if position == 0 else rng.permutation(rows)
+        source_dfs.append((file_name, pd.DataFrame({column: shared[column][order]
+                                                    for column in SOURCE_COLUMNS[file_name]})))
+    return source_dfs
@@ -0,0 +1,336 @@
+# Project: NBA Correlations App
+# Description: Benchmarks of the scraping, joining and correlation hot paths with stored baselines
+# Data Sources: Basketball-Reference
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+from contextlib import contextmanager
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIRECTORY = os.path.dirname(BENCHMARK_DIRECTORY)
+sys.path[:0] = [BENCHMARK_DIRECTORY, os.path.join(ROOT_DIRECTORY, 'scraping'),
+                os.path.join(ROOT_DIRECTORY, 'analysis')]
+
+import numpy as np
+import pandas as pd
+
+import correlations
+import scraper
+from fixtures import FIXTURE_DIRECTORY, FIXTURE_SEASONS, fixture_cache, fixture_urls
+from generators import synthetic_source_tables, synthetic_team_stats
+from tables import extract_tables, read_html_tables
+
+BASELINE_FILE = os.path.join(BENCHMARK_DIRECTORY, 'baseline.json')
+# A benchmark regresses when its best time exceeds the baseline's by more
+# than this fraction
+REGRESSION_THRESHOLD = 0.25
+# Each benchmark repeats until it has run this long or MAX_ROUNDS times
+MIN_TIME = 1.0
+MAX_ROUNDS = 10
+# Table sizes swept at each scale: rows at the real 122 statistics, then
+# statistics at the real 450 rows. A million rows needs about 16GB of memory
+SCALES = {'small': {'rows': [450], 'columns': [122]},
+          'medium': {'rows': [450, 10000, 100000], 'columns': [122, 500, 2000]},
+          'full': {'rows': [450, 10000, 100000, 1000000], 'columns': [122, 500, 2000]}}
+# Rows above which the per-season bootstrap is not benchmarked
+RESAMPLED_ROWS = 450
+
+
+class Benchmark(object):
+    """
+    One timed operation.
+
+    Args:
+        name (str): Unique name, including its parameters.
+        setup (callable): setup() returning the state passed to `run`; not
+                          timed.
+        run (callable): run(state) performing the timed operation.
+        params (dict): Parameters recorded with the results.
+        teardown (callable): Optional teardown(state) run after timing.
+    """
+    def __init__(self, name, setup, run, params=None, teardown=None):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.params = params or {}
+        self.teardown = teardown
+
+
+def measure(benchmark, min_time=MIN_TIME, max_rounds=MAX_ROUNDS):
+    """
+    Time a benchmark, repeating it until it has run `min_time` seconds or
+    `max_rounds` times. Setup runs once and is not timed.
+
+    Args:
+        benchmark (Benchmark): Benchmark to time.
+        min_time (float): Seconds of timed runs to collect.
+        max_rounds (int): Maximum number of timed runs.
+
+    Returns:
+        result (dict): 'params', 'rounds' and the 'min', 'median' and 'max'
+        time of a run in seconds.
+    """
+    state = benchmark.setup()
+    timings = []
+    try:
+        while len(timings) < max_rounds and sum(timings) < min_time:
+            start = time.perf_counter()
+            benchmark.run(state)
+            timings.append(time.perf_counter() - start)
+    finally:
+        if benchmark.teardown is not None:
+            benchmark.teardown(state)
+    return {'params': benchmark.params, 'rounds': len(timings), 'min': min(timings),
+            'median': float(np.median(timings)), 'max': max(timings)}
+
+
+@contextmanager
+def team_stats_table(team_stats_df):
+    """Serve `team_stats_df` to the correlation functions in place of the stored Team_Stats table."""
+    load_table = correlations.load_table
+    correlations.load_table = lambda name, *args, **kwargs: team_stats_df.copy()
+    try:
+        yield
+    finally:
+        correlations.load_table = load_table
+
+
+def parsing_benchmarks(seasons=FIXTURE_SEASONS, directory=FIXTURE_DIRECTORY):
+    """
+    Benchmarks of extracting the tables of the fixture season summary pages,
+    with the lxml extractor and with the BeautifulSoup and pd.read_html path
+    it replaced, and of the whole of scrape_season_summary, per page.
+    """
+    def pages():
+        cache = fixture_cache(seasons, directory)
+        return [cache.get(url) for url in fixture_urls(seasons)[:len(seasons)]]
+
+    def season_summary(state):
+        for season in seasons:
+            scraper.scrape_season_summary.__wrapped__(season)
+
+    def use_fixture_cache():
+        http_cache, scraper.http_cache = scraper.http_cache, fixture_cache(seasons, directory)
+        return http_cache
+
+    def restore_cache(http_cache):
+        scraper.http_cache = http_cache
+
+    params = {'pages': len(seasons)}
+    return [
+        Benchmark('parse.extract_tables', pages,
+                  lambda state: [extract_tables(page, scraper.SEASON_SUMMARY_TABLES) for page in state], params),
+        Benchmark('parse.read_html_tables', pages,
+                  lambda state: [read_html_tables(page, scraper.SEASON_SUMMARY_TABLES) for page in state], params),
+        Benchmark('parse.season_summary', use_fixture_cache, season_summary, params, teardown=restore_cache)]
+
+
+def join_benchmarks(rows):
+    """Benchmarks of join_team_tables and create_team_base_table on synthetic source tables."""
+    def write_sources():
+        directory = tempfile.mkdtemp(prefix='benchmark_sources_')
+        for file_name, df in synthetic_source_tables(rows):
+            df.to_csv(os.path.join(directory, file_name), index=False)
+        return directory
+
+    def create_team_base_table(directory):
+        parent_directory, scraper.PARENT_DIRECTORY = scraper.PARENT_DIRECTORY, directory + os.sep
+        try:
+            scraper.create_team_base_table()
+        finally:
+            scraper.PARENT_DIRECTORY = parent_directory
+
+    params = {'rows': rows}
+    return [
+        Benchmark('join.join_team_tables[rows={0}]'.format(rows), lambda: synthetic_source_tables(rows),
+                  scraper.join_team_tables, params),
+        Benchmark('join.create_team_base_table[rows={0}]'.format(rows), write_sources,
+                  create_team_base_table, params, teardown=shutil.rmtree)]
+
+
+def correlation_benchmarks(rows, columns, resamples=0):
+    """Benchmarks of calculate_correlations and season_correlations on a synthetic Team_Stats table."""
+    def run(function, **kwargs):
+        def timed(team_stats_df):
+            with team_stats_table(team_stats_df):
+                function(**kwargs)
+        return timed
+
+    setup = lambda: synthetic_team_stats(rows, columns)
+    suffix = '[rows={0},columns={1}]'.format(rows, columns)
+    params = {'rows': rows, 'columns': columns}
+    benchmarks = [Benchmark('correlate.calculate_correlations' + suffix, setup,
+                            run(correlations.calculate_correlations), params),
+                  Benchmark('correlate.season_correlations' + suffix, setup,
+                            run(correlations.season_correlations, resamples=0), params)]
+    if resamples:
+        benchmarks.append(Benchmark('correlate.season_correlations{0}[resamples={1}]'.format(suffix, resamples),
+                                    setup, run(correlations.season_correlations, resamples=resamples),
+                                    dict(params, resamples=resamples)))
+    return benchmarks
+
+
+def benchmark_suite(scale='small', resamples=100):
+    """
+    Every benchmark at a scale of SCALES.
+
+    Args:
+        scale (str): Key of SCALES.
+        resamples (int): Bootstrap samples of the resampled season
+                         correlations benchmark; 0 skips it.
+
+    Returns:
+        benchmarks (list): Benchmarks in run order.
+    """
+    sizes = SCALES[scale]
+    benchmarks = parsing_benchmarks()
+    for rows in sizes['rows']:
+        benchmarks += join_benchmarks(rows)
+    for rows in sizes['rows']:
+        benchmarks += correlation_benchmarks(rows, sizes['columns'][0], resamples if rows <= RESAMPLED_ROWS else 0)
+    for columns in sizes['columns'][1:]:
+        benchmarks += correlation_benchmarks(sizes['rows'][0], columns)
+    return benchmarks
+
+
+def environment():
+    """Machine and library versions the timings were taken with."""
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'machine': platform.machine(), 'processor': platform.processor(), 'cpus': os.cpu_count(),
+            'platform': platform.platform()}
+
+
+def load_baseline(path=BASELINE_FILE):
+    """Read stored baseline results, or None if there are none."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(report, path=BASELINE_FILE):
+    """
+    Store the results of a run as the baseline, keeping stored results of
+    benchmarks that were not run.
+
+    Args:
+        report (dict): Report returned by run_benchmarks.
+        path (str): Baseline file.
+
+    Returns:
+        None
+    """
+    results = (load_baseline(path) or {'results': {}})['results']
+    results.update(report['results'])
+    baseline = {'environment': report['environment'], 'created': report['created'],
+                'results': dict(sorted(results.items()))}
+    with open(path + '.tmp', 'w') as f:
+        json.dump(baseline, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare best times against a baseline. The best of several runs is the
+    least affected by other load on the machine, so it is what is compared.
+
+    Args:
+        results (dict): Benchmark name to result, as returned by measure.
+        baseline (dict): Stored baseline.
+        threshold (float): Allowed fractional slowdown.
+
+    Returns:
+        comparison (dict): Benchmark name to {'baseline', 'ratio',
+        'regression'} for every benchmark with a baseline result.
+    """
+    comparison = {}
+    for name, result in results.items():
+        if name in baseline['results']:
+            reference = baseline['results'][name]['min']
+            ratio = result['min'] / reference
+            comparison[name] = {'baseline': reference, 'ratio': ratio, 'regression': ratio > 1 + threshold}
+    return comparison
+
+
+def run_benchmarks(scale='small', pattern=None, baseline_path=BASELINE_FILE, threshold=REGRESSION_THRESHOLD,
+                   resamples=100, min_time=MIN_TIME, max_rounds=MAX_ROUNDS):
+    """
+    Run the benchmark suite and compare it against the stored baseline.
+
+    Args:
+        scale (str): Key of SCALES.
+        pattern (str): Only run benchmarks whose name contains it.
+        baseline_path (str): Baseline file.
+        threshold (float): Allowed fractional slowdown.
+        resamples (int): Bootstrap samples of the resampled benchmark.
+        min_time (float): Seconds of timed runs per benchmark.
+        max_rounds (int): Maximum timed runs per benchmark.
+
+    Returns:
+        report (dict): 'environment', 'created', 'scale', 'threshold',
+        'results' by benchmark name and their 'comparison' with the baseline.
+    """
+    results = {}
+    for benchmark in benchmark_suite(scale, resamples):
+        if pattern and pattern not in benchmark.name:
+            continue
+        with warnings.catch_warnings():
+            # DataFrame.append in the scrapers is deprecated in newer pandas
+            warnings.simplefilter('ignore', FutureWarning)
+            results[benchmark.name] = measure(benchmark, min_time, max_rounds)
+        print('{0:<70} {1:>10.4f}s'.format(benchmark.name, results[benchmark.name]['min']), flush=True)
+    baseline = load_baseline(baseline_path)
+    return {'environment': environment(),
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'scale': scale,
+            'threshold': threshold,
+            'results': results,
+            'comparison': compare(results, baseline, threshold) if baseline else {}}
+
+
+def format_comparison(report):
+    """Lines describing every benchmark's change against the baseline."""
+    lines = []
+    for name, change in sorted(report['comparison'].items()):
+        lines.append('{0:<70} {1:>10.4f}s -> {2:>10.4f}s  x{3:.2f}{4}'.format(
+            name, change['baseline'], report['results'][name]['min'], change['ratio'],
+            '  REGRESSION' if change['regression'] else ''))
+    return lines
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='Benchmark parsing, joining and correlating at scaled data sizes '
+                                                 'and compare the timings with a stored baseline.')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small', help='Table sizes to sweep.')
+    parser.add_argument('--filter', help='Only run benchmarks whose name contains this text.')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='Baseline file to compare with.')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='Allowed fractional slowdown before a benchmark counts as a regression.')
+    parser.add_argument('--resamples', type=int, default=100,
+                        help='Bootstrap samples of the resampled season correlations benchmark; 0 skips it.')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the timings as the new baseline.')
+    parser.add_argument('--output', help='Also write the full report to this JSON file.')
+    arguments = parser.parse_args()
+
+    report = run_benchmarks(arguments.scale, arguments.filter, arguments.baseline, arguments.threshold,
+                            arguments.resamples)
+    baseline = load_baseline(arguments.baseline)
+    if baseline and baseline['environment'] != report['environment']:
+        print('Baseline was recorded with {0}; timings may not be comparable'.format(baseline['environment']))
+    for line in format_comparison(report):
+        print(line)
+    if arguments.output:
+        with open(arguments.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if arguments.save_baseline:
+        save_baseline(report, arguments.baseline)
+    elif any(change['regression'] for change in report['comparison'].values()):
+        sys.exit(1)
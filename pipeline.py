@@ -0,0 +1,402 @@
+# Project: NBA Correlations App
+# Description: Incremental pipeline from scraping to the correlation outputs of the app
+# Data Sources: Basketball-Reference
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+ROOT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+# The scraping and analysis scripts import their siblings by module name
+sys.path[:0] = [os.path.join(ROOT_DIRECTORY, 'scraping'), os.path.join(ROOT_DIRECTORY, 'analysis')]
+
+import pandas as pd
+
+import correlations
+import instrumentation
+import scraper
+from instrumentation import span
+from resampling import RESAMPLES
+from storage import DATA_DIRECTORY, csv_fingerprint, load_table, publish, temporary_path, write_partitioned
+
+STATE_FILE = 'pipeline_state.json'
+REPORT_FILE = 'pipeline_report.json'
+DEFAULT_WORKERS = 4
+
+logger = logging.getLogger(__name__)
+
+
+class Stage(object):
+    """
+    One step of the pipeline.
+
+    Args:
+        name (str): Stage name used on the command line.
+        run (callable): run(seasons, params) rebuilding the outputs. `seasons`
+                        lists the season labels whose inputs changed, or is
+                        None to rebuild everything.
+        inputs (list): Files in DATA_DIRECTORY read by the stage. Each must
+                       have a SEASON column so changed seasons can be found.
+        outputs (list): Files in DATA_DIRECTORY or the columnar store written
+                        by the stage; a missing output forces a full rebuild.
+        depends (list): Names of the stages producing the inputs.
+        code (list): Source files whose changes invalidate the outputs.
+        params (dict): Parameters passed to `run`, part of the stage hash.
+        seasonal (bool): Whether `run` can rebuild only the changed seasons.
+        always_run (bool): Run even when the inputs are unchanged, for stages
+                           whose real input is remote.
+    """
+    def __init__(self, name, run, inputs, outputs, depends, code, params=None,
+                 seasonal=False, always_run=False):
+        self.name = name
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        self.depends = depends
+        self.code = code
+        self.params = params or {}
+        self.seasonal = seasonal
+        self.always_run = always_run
+
+
+def run_scrape(seasons, params):
+    """Scrape missing or stale seasons of the source tables."""
+    return scraper.scrape_tables(params['seasons'])
+
+def run_join(seasons, params):
+    """Join the source tables into Team_Stats.csv."""
+    team_stats_df = scraper.create_team_base_table(save=True, seasons=seasons)
+    # Refresh the columnar copy and the partitions of changed seasons once,
+    # before stages read them in parallel
+    load_table('Team_Stats')
+    write_partitioned(team_stats_df, 'Team_Stats', partitions=seasons,
+                      source=csv_fingerprint(os.path.join(DATA_DIRECTORY, 'Team_Stats.csv')))
+
+def run_lags(seasons, params):
+    """Pair every team season with the next one."""
+    correlations.season_lags(save=True, seasons=seasons)
+
+def run_lag_correlations(seasons, params):
+    """Correlate statistics across seasons."""
+    correlations.lag_correlations(save=True, lags=params['lags'])
+
+def run_clusters(seasons, params):
+    """Clusters of near-duplicate statistics and their representatives."""
+    correlations.cluster_statistics(save=True, thresholds=params['thresholds'])
+
+def run_correlations(seasons, params):
+    """Pooled correlation matrices and their neighbor index."""
+    correlations.calculate_correlations(save=True)
+
+def run_uncertainty(seasons, params):
+    """Confidence intervals and p-values of the pooled correlations."""
+    correlations.correlation_uncertainty(save=True, resamples=params['resamples'])
+
+def run_season_correlations(seasons, params):
+    """Per-season correlations against the target statistics."""
+    correlations.season_correlations(save=True, seasons=seasons, targets=params['targets'],
+                                     resamples=params['resamples'])
+
+def run_window_correlations(seasons, params):
+    """Rolling and expanding window correlations."""
+    correlations.window_correlations(save=True, seasons=seasons, targets=params['targets'],
+                                     windows=params['windows'])
+
+
+SCRAPING_CODE = ['scraping/scraper.py', 'scraping/cache.py', 'scraping/fetcher.py', 'scraping/tables.py',
+                 'scraping/instrumentation.py']
+ANALYSIS_CODE = ['analysis/correlations.py', 'analysis/correlation_engine.py', 'analysis/storage.py',
+                 'analysis/derived_metrics.py', 'analysis/derived_metrics.json']
+SOURCE_TABLES = list(scraper.TABLE_SCRAPERS)
+
+STAGES = [
+    Stage('scrape', run_scrape, [], SOURCE_TABLES, [], SCRAPING_CODE,
+          {'seasons': [int(season) for season in scraper.SEASONS]}, always_run=True),
+    Stage('join', run_join, SOURCE_TABLES, ['Team_Stats.csv'], ['scrape'], SCRAPING_CODE,
+          seasonal=True),
+    Stage('lags', run_lags, ['Team_Stats.csv'], ['Basketball_Reference_Season_Lags.csv'], ['join'],
+          ANALYSIS_CODE, seasonal=True),
+    Stage('lag-correlations', run_lag_correlations, ['Team_Stats.csv'],
+          ['Basketball_Reference_Lag_Correlations.csv', 'columnar/lag_correlation'], ['join'],
+          ANALYSIS_CODE, {'lags': correlations.SEASON_LAGS}),
+    Stage('clusters', run_clusters, ['Team_Stats.csv'], ['Statistic_Clusters.csv'], ['join'],
+          ANALYSIS_CODE + ['analysis/statistic_clusters.py'], {'thresholds': correlations.CLUSTER_THRESHOLDS}),
+    Stage('correlations', run_correlations, ['Team_Stats.csv'],
+          ['pearson_correlation.csv', 'spearman_correlation.csv', 'columnar/correlation_index'], ['join'],
+          ANALYSIS_CODE + ['analysis/correlation_index.py']),
+    Stage('uncertainty', run_uncertainty, ['Team_Stats.csv'], ['columnar/correlation_uncertainty'], ['join'],
+          ANALYSIS_CODE + ['analysis/resampling.py'], {'resamples': RESAMPLES}),
+    Stage('season-correlations', run_season_correlations, ['Team_Stats.csv'],
+          ['Basketball_Reference_Season_Correlations.csv'], ['join'],
+          ANALYSIS_CODE + ['analysis/resampling.py'],
+          {'targets': correlations.TARGET_STATISTICS, 'resamples': RESAMPLES}, seasonal=True),
+    Stage('window-correlations', run_window_correlations, ['Team_Stats.csv'],
+          ['Basketball_Reference_Window_Correlations.csv', 'columnar/' + correlations.SEASON_SUMS_FILE], ['join'],
+          ANALYSIS_CODE, {'targets': correlations.TARGET_STATISTICS, 'windows': correlations.SEASON_WINDOWS},
+          seasonal=True),
+]
+STAGES_BY_NAME = {stage.name: stage for stage in STAGES}
+
+
+def load_state(directory=DATA_DIRECTORY):
+    """
+    Read the hashes recorded by the last successful run of every stage.
+
+    Args:
+        directory (str): Directory holding the state file.
+
+    Returns:
+        state (dict): Stage name to its recorded hashes.
+    """
+    path = os.path.join(directory, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_state(state, directory=DATA_DIRECTORY):
+    """
+    Write the state file atomically.
+
+    Args:
+        state (dict): Stage name to its recorded hashes.
+        directory (str): Directory holding the state file.
+
+    Returns:
+        None
+    """
+    path = os.path.join(directory, STATE_FILE)
+    temporary = temporary_path(path)
+    with open(temporary, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(temporary, path)
+
+def file_hash(path):
+    """
+    SHA-256 of a file's contents.
+
+    Args:
+        path (str): File path.
+
+    Returns:
+        digest (str): Hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def stage_hashes(stage, directory=DATA_DIRECTORY):
+    """
+    Fingerprint what a stage depends on: its code and parameters, the
+    contents of its inputs, and the rows of every season of its inputs.
+
+    Args:
+        stage (Stage): Stage to fingerprint.
+        directory (str): Directory holding the inputs.
+
+    Returns:
+        hashes (dict): 'definition' (code and parameters), 'inputs' (input
+        contents) and 'seasons' (input file to season label to checksum).
+        Missing inputs have no entry.
+    """
+    definition = hashlib.sha256(json.dumps(stage.params, sort_keys=True).encode('utf-8'))
+    for path in stage.code:
+        definition.update(file_hash(os.path.join(ROOT_DIRECTORY, path)).encode('utf-8'))
+    inputs = hashlib.sha256()
+    seasons = {}
+    for name in stage.inputs:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            inputs.update(file_hash(path).encode('utf-8'))
+            if stage.seasonal:
+                seasons[name] = scraper.table_checksums(pd.read_csv(path))
+    return {'definition': definition.hexdigest(), 'inputs': inputs.hexdigest(), 'seasons': seasons}
+
+def plan_stage(stage, state, force=False, directory=DATA_DIRECTORY):
+    """
+    Decide whether a stage must run and which seasons it must rebuild.
+
+    Args:
+        stage (Stage): Stage to plan.
+        state (dict): State recorded by previous runs.
+        force (bool): Rebuild regardless of the recorded state.
+        directory (str): Directory holding inputs and outputs.
+
+    Returns:
+        run (bool): Whether the stage must run.
+        seasons (list): Seasons to rebuild, None for a full rebuild.
+        hashes (dict): Current stage_hashes, recorded once the stage succeeds.
+    """
+    hashes = stage_hashes(stage, directory)
+    previous = state.get(stage.name)
+    outputs_exist = all(os.path.exists(os.path.join(directory, output)) for output in stage.outputs)
+    if force or previous is None or not outputs_exist or previous['definition'] != hashes['definition']:
+        return True, None, hashes
+    if previous['inputs'] == hashes['inputs']:
+        return stage.always_run, None, hashes
+    if not stage.seasonal:
+        return True, None, hashes
+    changed = set()
+    for name, checksums in hashes['seasons'].items():
+        recorded = previous['seasons'].get(name, {})
+        if set(recorded) - set(checksums):
+            # A season was removed; rebuild everything rather than upsert
+            return True, None, hashes
+        changed.update(label for label, checksum in checksums.items() if recorded.get(label) != checksum)
+    return True, sorted(changed), hashes
+
+def _run_stage(name, seasons, instrument=None):
+    """
+    Run a stage by name; module level so it can run in a worker process.
+
+    Args:
+        name (str): Stage name.
+        seasons (list): Seasons to rebuild, None for a full rebuild.
+        instrument (dict): Options of instrumentation.enable to record the
+                           stage in a worker process. Defaults to None,
+                           which records into the current recorder, if any.
+
+    Returns:
+        report (dict): Instrumentation report of the stage when `instrument`
+        is given, else None.
+    """
+    stage = STAGES_BY_NAME[name]
+    if instrument is None:
+        with span('stage', stage=name, seasons='all' if seasons is None else len(seasons)):
+            stage.run(seasons, stage.params)
+        return None
+    recorder = instrumentation.enable(**instrument)
+    try:
+        with span('stage', stage=name, seasons='all' if seasons is None else len(seasons)):
+            stage.run(seasons, stage.params)
+    finally:
+        instrumentation.disable()
+    return recorder.report()
+
+def run_pipeline(stages=None, force=False, workers=DEFAULT_WORKERS, dry_run=False,
+                 directory=DATA_DIRECTORY):
+    """
+    Run the pipeline, skipping stages whose inputs, code and parameters are
+    unchanged since their last successful run and rebuilding only changed
+    seasons where a stage supports it. Each stage starts once the stages it
+    depends on are done, so independent stages run in parallel.
+
+    Args:
+        stages (list): Names of the stages to consider. Defaults to all.
+                       Unselected dependencies are assumed up to date.
+        force (bool): Rebuild every selected stage in full.
+        workers (int): Stages run at once. 1 runs them in this process.
+        dry_run (bool): Only log what would run.
+        directory (str): Directory holding inputs and outputs.
+
+    Returns:
+        ran (dict): Name of every stage that ran to the seasons it rebuilt
+        (None for a full rebuild). When any stage ran, the outputs are
+        published once every stage is done.
+    """
+    selected = [stage for stage in STAGES if stages is None or stage.name in stages]
+    selected_names = {stage.name for stage in selected}
+    state = load_state(directory)
+    pending = list(selected)
+    done = set()
+    running = {}
+    ran = {}
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and not dry_run else None
+    recorder = instrumentation.active_recorder()
+    try:
+        while pending or running:
+            # Start every stage whose selected dependencies are done
+            for stage in list(pending):
+                if any(dependency in selected_names and dependency not in done for dependency in stage.depends):
+                    continue
+                pending.remove(stage)
+                run, seasons, hashes = plan_stage(stage, state, force, directory)
+                if dry_run and any(dependency in ran for dependency in stage.depends):
+                    # Inputs would change once the dependencies had run
+                    run, seasons = True, None
+                if not run:
+                    logger.info('%s: up to date, skipped', stage.name)
+                    done.add(stage.name)
+                    continue
+                logger.info('%s: rebuilding %s', stage.name,
+                            'all seasons' if seasons is None else 'seasons {0}'.format(seasons))
+                if dry_run:
+                    ran[stage.name] = seasons
+                    done.add(stage.name)
+                elif executor is None:
+                    _run_stage(stage.name, seasons)
+                    running[stage.name] = (None, seasons, hashes)
+                else:
+                    # Worker processes record their own stage and report back
+                    instrument = None if recorder is None else {
+                        'memory': recorder.memory,
+                        'profile': recorder.profile and '{0}.{1}'.format(recorder.profile, stage.name)}
+                    running[stage.name] = (executor.submit(_run_stage, stage.name, seasons, instrument),
+                                           seasons, hashes)
+            if not running:
+                continue
+            futures = [future for future, _, _ in running.values() if future is not None]
+            if futures:
+                wait(futures, return_when=FIRST_COMPLETED)
+            for name, (future, seasons, hashes) in list(running.items()):
+                if future is not None and not future.done():
+                    continue
+                if future is not None:
+                    report = future.result()
+                    if report is not None:
+                        recorder.merge(report)
+                del running[name]
+                # Record the hashes seen before the stage ran, so inputs that
+                # changed while it ran are picked up next time
+                state[name] = hashes
+                save_state(state, directory)
+                ran[name] = seasons
+                done.add(name)
+                logger.info('%s: done', name)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if ran and not dry_run:
+        # Tell readers such as the query service that new outputs are complete
+        publish(sorted(ran))
+    return ran
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='Scrape Basketball-Reference and rebuild the correlation '
+                                                 'outputs of the app, skipping stages whose inputs are unchanged.')
+    parser.add_argument('stages', nargs='*', help='Stages to consider, out of {0}. Defaults to all of them.'
+                                                  .format(', '.join(STAGES_BY_NAME)))
+    parser.add_argument('--force', action='store_true', help='Rebuild the selected stages in full.')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Stages run at once.')
+    parser.add_argument('--dry-run', action='store_true', help='Only show what would run.')
+    parser.add_argument('--report', nargs='?', const=os.path.join(DATA_DIRECTORY, REPORT_FILE),
+                        help='Record timings, memory, HTTP requests and cache hits of every stage and season '
+                             'and write them as JSON to this path (default {0}).'.format(REPORT_FILE))
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='With --report, trace allocations with tracemalloc for per-stage peak memory.')
+    parser.add_argument('--profile', help='With --report, profile with cProfile and write the statistics to '
+                                          'this path, suffixed with the stage name for stages run by workers.')
+    arguments = parser.parse_args()
+    unknown = [name for name in arguments.stages if name not in STAGES_BY_NAME]
+    if unknown:
+        parser.error('unknown stages: {0}'.format(', '.join(unknown)))
+    if (arguments.trace_memory or arguments.profile) and not arguments.report:
+        parser.error('--trace-memory and --profile require --report')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    if arguments.report:
+        instrumentation.enable(arguments.trace_memory, arguments.profile)
+    try:
+        run_pipeline(arguments.stages or None, arguments.force, arguments.workers, arguments.dry_run)
+    finally:
+        # Failed runs are reported too; their failing spans are marked
+        recorder = instrumentation.disable()
+        if recorder is not None:
+            instrumentation.write_report(recorder.report(), arguments.report)
+            logger.info('Run report written to %s', arguments.report)
@@ -0,0 +1,182 @@
+# Project: NBA Correlations App
+# Description: On-disk HTTP response cache with record/replay modes for the scraper
+# Data Sources: Basketball-Reference
+
+import datetime
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from instrumentation import count
+
+CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+CACHE_MODES = ['record', 'replay', 'refresh', 'off']
+CURRENT_SEASON_TTL = 6 * 60 * 60
+
+
+class CacheMissError(Exception):
+    """Raised in replay mode when a URL has no recorded response."""
+
+
+def season_from_url(url):
+    """
+    Extract the season (year in which it ends) from a Basketball-Reference
+    league URL, e.g. 2019 for .../leagues/NBA_2019.html.
+
+    Args:
+        url (str): Basketball-Reference URL.
+
+    Returns:
+        season (int or None): Season referenced by the URL, None if the URL
+        does not reference a season.
+    """
+    match = re.search(r'NBA_(\d{4})', url)
+    return int(match.group(1)) if match else None
+
+
+def is_completed_season(season, today=None):
+    """
+    Indicate whether a season is over and its pages will no longer change.
+    The NBA Finals end in June, so a season is treated as complete from July
+    of the year in which it ends.
+
+    Args:
+        season (int): Year in which the season ends.
+        today (date): Reference date. Defaults to today.
+
+    Returns:
+        completed (bool): True if the season has ended.
+    """
+    today = today or datetime.date.today()
+    return season < today.year or (season == today.year and today.month >= 7)
+
+
+class ResponseCache(object):
+    """
+    Content-addressed store of HTTP response bodies keyed by URL.
+
+    Each entry is two files named by the SHA-256 of the URL: the response
+    body and a JSON sidecar with the URL, fetch time and validators (ETag,
+    Last-Modified). Pages for completed seasons never expire; any other
+    entry is fresh for `ttl` seconds and is then revalidated with a
+    conditional request before being re-downloaded.
+
+    Modes:
+        record: Serve fresh entries from disk, fetch and store otherwise.
+        replay: Serve entries from disk regardless of age and raise
+                CacheMissError instead of touching the network.
+        refresh: Always fetch and overwrite the stored entry.
+        off: Bypass the cache entirely.
+
+    Args:
+        fetch (callable): fetch(url, headers) returning a requests.Response.
+        directory (str): Root directory of the cache.
+        mode (str): One of CACHE_MODES.
+        ttl (int): Seconds before an entry for an in-progress season is stale.
+    """
+    def __init__(self, fetch, directory=CACHE_DIRECTORY, mode='record',
+                 ttl=CURRENT_SEASON_TTL):
+        if mode not in CACHE_MODES:
+            raise ValueError('mode must be one of {0}, got {1!r}'.format(CACHE_MODES, mode))
+        self.fetch = fetch
+        self.directory = directory
+        self.mode = mode
+        self.ttl = ttl
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        folder = os.path.join(self.directory, key[:2])
+        return os.path.join(folder, key + '.html'), os.path.join(folder, key + '.json')
+
+    def _read(self, url):
+        body_path, meta_path = self._paths(url)
+        if not (os.path.exists(body_path) and os.path.exists(meta_path)):
+            return None, None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        with open(body_path, encoding='utf-8') as f:
+            body = f.read()
+        return body, meta
+
+    def _write(self, url, body=None, meta=None):
+        body_path, meta_path = self._paths(url)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        # Write to a per-thread temporary file and rename so concurrent
+        # readers never see a partial entry
+        suffix = '.{0}.{1}.tmp'.format(os.getpid(), threading.get_ident())
+        if body is not None:
+            with open(body_path + suffix, 'w', encoding='utf-8') as f:
+                f.write(body)
+            os.replace(body_path + suffix, body_path)
+        with open(meta_path + suffix, 'w') as f:
+            json.dump(meta, f, indent=2, sort_keys=True)
+        os.replace(meta_path + suffix, meta_path)
+
+    def is_fresh(self, meta, now=None):
+        """
+        Indicate whether a stored entry can be served without revalidation.
+
+        Args:
+            meta (dict): Entry metadata as written by the cache.
+            now (float): Reference UNIX timestamp. Defaults to now.
+
+        Returns:
+            fresh (bool): True if the entry does not need to be revalidated.
+        """
+        season = season_from_url(meta['url'])
+        if season is not None and is_completed_season(season):
+            return True
+        now = time.time() if now is None else now
+        return now - meta['fetched_at'] < self.ttl
+
+    def get(self, url):
+        """
+        Return the body of `url`, from disk where the freshness rules allow.
+
+        Args:
+            url (str): URL to retrieve.
+
+        Returns:
+            text (str): Response body.
+        """
+        if self.mode == 'off':
+            count(cache_bypassed=1)
+            response = self.fetch(url, {})
+            response.raise_for_status()
+            return response.text
+
+        body, meta = self._read(url)
+        if self.mode == 'replay':
+            if body is None:
+                count(cache_misses=1)
+                raise CacheMissError('No recorded response for {0} in {1}'.format(url, self.directory))
+            count(cache_hits=1)
+            return body
+        if self.mode == 'record' and body is not None and self.is_fresh(meta):
+            count(cache_hits=1)
+            return body
+        count(cache_misses=1)
+
+        headers = {}
+        if self.mode == 'record' and body is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        response = self.fetch(url, headers)
+        if response.status_code == 304 and body is not None:
+            count(cache_revalidations=1)
+            meta['fetched_at'] = time.time()
+            self._write(url, meta=meta)
+            return body
+        response.raise_for_status()
+        meta = {'url': url,
+                'fetched_at': time.time(),
+                'status': response.status_code,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified')}
+        self._write(url, response.text, meta)
+        return response.text
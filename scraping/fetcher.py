@@ -0,0 +1,143 @@
+# Project: NBA Correlations App
+# Description: Concurrent, rate-limited page fetching over a pooled HTTP session
+# Data Sources: Basketball-Reference
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import count
+
+# Basketball-Reference blocks clients making more than 20 requests per minute
+DEFAULT_RATE = 1 / 3.5
+DEFAULT_BURST = 1
+DEFAULT_WORKERS = 4
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket shared by every request a Fetcher makes.
+
+    Args:
+        rate (float): Tokens added per second.
+        capacity (int): Maximum number of tokens held, i.e. the largest burst
+                        of back-to-back requests allowed.
+        clock (callable): Monotonic clock returning seconds.
+        sleep (callable): Function used to wait for a token.
+    """
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then consume it."""
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+class Fetcher(object):
+    """
+    Fetch pages concurrently over one keep-alive requests.Session.
+
+    Politeness comes from a global TokenBucket rather than a fixed sleep per
+    call, so worker threads only wait when the request budget is exhausted.
+    Responses with a status in RETRY_STATUSES and connection errors are
+    retried with exponential backoff (honoring Retry-After when present).
+
+    Args:
+        rate (float): Requests per second allowed across all workers.
+        burst (int): Requests allowed back-to-back before rate limiting.
+        max_workers (int): Number of concurrent download threads.
+        max_retries (int): Retries per request before giving up.
+        backoff (float): Base delay in seconds for exponential backoff.
+        timeout (float): Per-request timeout in seconds.
+        session (Session): Session to use. Defaults to a new pooled session.
+    """
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 max_workers=DEFAULT_WORKERS, max_retries=5, backoff=2.0,
+                 timeout=30, session=None):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+
+    def _delay(self, attempt, response=None):
+        if response is not None and response.headers.get('Retry-After', '').isdigit():
+            return float(response.headers['Retry-After'])
+        return self.backoff * 2 ** attempt + random.uniform(0, self.backoff)
+
+    def get(self, url, headers=None):
+        """
+        Request a page, waiting for the rate limit and retrying transient
+        failures.
+
+        Args:
+            url (str): URL to request.
+            headers (dict): Additional request headers.
+
+        Returns:
+            response (Response): requests.Response for the page. Responses with
+            non-retryable error statuses are returned as-is.
+        """
+        attempt = 0
+        while True:
+            waited = time.perf_counter()
+            self.bucket.acquire()
+            started = time.perf_counter()
+            count(rate_limit_seconds=started - waited)
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                count(requests=1, request_errors=1, request_seconds=time.perf_counter() - started)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._delay(attempt)
+            else:
+                count(requests=1, request_seconds=time.perf_counter() - started,
+                      response_bytes=len(response.content))
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                delay = self._delay(attempt, response)
+            count(retries=1, backoff_seconds=delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def map(self, function, items):
+        """
+        Apply `function` to every item on the worker pool.
+
+        Args:
+            function (callable): Function that makes requests through this
+                                 Fetcher (directly or via the response cache).
+            items (iterable): Arguments to call `function` with.
+
+        Returns:
+            results (list): function(item) for each item, in input order.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(function, items))
@@ -0,0 +1,384 @@
+# Project: NBA Correlations App
+# Description: Per-stage timings, memory, HTTP and cache counters for scraping and analysis runs
+# Data Sources: Basketball-Reference
+
+import cProfile
+import collections
+import datetime
+import functools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak memory is then not reported
+    resource = None
+
+# Functions by cumulative time and live allocation sites kept in a report
+PROFILE_FUNCTIONS = 30
+ALLOCATION_SITES = 20
+
+# Recorder of the current run; None when instrumentation is disabled, in
+# which case span and count do nothing
+_recorder = None
+
+
+def _max_rss():
+    """Peak resident memory of this process so far, in MB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def _children_cpu():
+    """CPU seconds of finished child processes, e.g. worker pools."""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _plain(value):
+    """Convert numpy scalars in labels to plain Python values for JSON."""
+    return value.item() if hasattr(value, 'item') else value
+
+
+class _NullSpan(object):
+    """Span returned while instrumentation is disabled."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    """
+    Timed region of a run. Counters recorded inside it, including inside
+    nested spans of the same thread, are added to it, and it inherits the
+    labels of the span it is nested in (e.g. the stage and season).
+    """
+    def __init__(self, recorder, name, labels):
+        self.recorder = recorder
+        self.name = name
+        self.labels = {key: _plain(value) for key, value in labels.items()}
+        self.counters = collections.Counter()
+        self.child_peak = 0
+
+    def __enter__(self):
+        stack = self.recorder._stack()
+        self.parent = stack[-1] if stack else None
+        if self.parent is not None:
+            self.labels = dict(self.parent.labels, **self.labels)
+        stack.append(self)
+        if self.recorder.memory:
+            # tracemalloc keeps one peak; start a fresh one for this span and
+            # hand the enclosing span's peak back to it on exit
+            current, self.outer_peak = tracemalloc.get_traced_memory()
+            self.traced_start = current
+            tracemalloc.reset_peak()
+        self.started = time.time()
+        self.children_cpu = _children_cpu()
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        record = {'name': self.name,
+                  'labels': self.labels,
+                  'parent': self.parent.name if self.parent is not None else None,
+                  'process': os.getpid(),
+                  'thread': threading.current_thread().name,
+                  'started': self.started,
+                  'wall': wall,
+                  'cpu': cpu,
+                  'children_cpu': _children_cpu() - self.children_cpu,
+                  'max_rss_mb': _max_rss(),
+                  'failed': exc_type is not None,
+                  'counters': dict(self.counters)}
+        if self.recorder.memory:
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            record['traced_peak_mb'] = max(peak - self.traced_start, 0) / 2 ** 20
+        stack = self.recorder._stack()
+        stack.pop()
+        if self.parent is not None:
+            self.parent.counters.update(self.counters)
+            if self.recorder.memory:
+                self.parent.child_peak = max(self.parent.child_peak, self.outer_peak, peak)
+        self.recorder._add(record)
+        return False
+
+
+class Recorder(object):
+    """
+    Collects spans and counters for one run.
+
+    Args:
+        memory (bool): Trace Python allocations with tracemalloc to report
+                       the peak memory of every span and the largest
+                       allocation sites. Slows the run down noticeably.
+        profile (str): Profile the run with cProfile, writing the statistics
+                       to this path. Only the thread that enabled the
+                       recorder is profiled.
+    """
+    def __init__(self, memory=False, profile=None):
+        self.memory = memory
+        self.profile = profile
+        self.spans = []
+        self.totals = collections.Counter()
+        self.functions = []
+        self.allocations = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.profiler = None
+        self.started_tracing = False
+
+    def _stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def _add(self, record):
+        with self.lock:
+            self.spans.append(record)
+
+    def start(self):
+        """Start the run clock and any requested tracing."""
+        self.started = time.time()
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        if self.profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop(self):
+        """Stop the run clock and tracing, keeping profile and allocation summaries."""
+        self.elapsed = time.perf_counter() - self.wall
+        self.elapsed_cpu = time.process_time() - self.cpu
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile)
+            self.functions = top_functions(pstats.Stats(self.profiler))
+            self.profiler = None
+        if self.memory and tracemalloc.is_tracing():
+            statistics = tracemalloc.take_snapshot().statistics('lineno')[:ALLOCATION_SITES]
+            self.allocations = [{'site': str(statistic.traceback[0]), 'size_mb': statistic.size / 2 ** 20,
+                                 'count': statistic.count} for statistic in statistics]
+            if self.started_tracing:
+                tracemalloc.stop()
+
+    def count(self, counters):
+        """Add counters to the innermost span of this thread and to the run totals."""
+        stack = self._stack()
+        if stack:
+            stack[-1].counters.update(counters)
+        with self.lock:
+            self.totals.update(counters)
+
+    def merge(self, report):
+        """
+        Add the spans and counters of a report recorded elsewhere, e.g. by a
+        worker process.
+
+        Args:
+            report (dict): Report returned by Recorder.report.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.spans.extend(report['spans'])
+            self.totals.update(report['totals'])
+            self.functions.extend(report['profile'])
+            self.allocations.extend(report['allocations'])
+
+    def report(self):
+        """
+        Summarize the run.
+
+        Returns:
+            report (dict): 'started' (ISO time), 'wall' and 'cpu' seconds,
+            'max_rss_mb', run 'totals' of every counter, 'stages' (spans
+            aggregated by name and labels, see summarize_spans), the raw
+            'spans', and the 'profile' and 'allocations' summaries when
+            requested.
+        """
+        with self.lock:
+            spans = sorted(self.spans, key=lambda record: record['started'])
+            return {'started': datetime.datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+                    'wall': getattr(self, 'elapsed', time.perf_counter() - self.wall),
+                    'cpu': getattr(self, 'elapsed_cpu', time.process_time() - self.cpu),
+                    'max_rss_mb': _max_rss(),
+                    'totals': dict(self.totals),
+                    'stages': summarize_spans(spans),
+                    'spans': spans,
+                    'profile': list(self.functions),
+                    'allocations': list(self.allocations)}
+
+
+def top_functions(stats, limit=PROFILE_FUNCTIONS):
+    """
+    Functions taking the most cumulative time in cProfile statistics.
+
+    Args:
+        stats (Stats): pstats.Stats of a profile.
+        limit (int): Number of functions kept.
+
+    Returns:
+        functions (list): Dicts with 'function', 'calls', 'total' and
+        'cumulative' seconds.
+    """
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [{'function': '{0}:{1}({2})'.format(*key), 'calls': calls, 'total': total, 'cumulative': cumulative}
+            for key, (_, calls, total, cumulative, _) in rows]
+
+
+def summarize_spans(spans):
+    """
+    Aggregate spans with the same name and labels, e.g. one entry per stage
+    and season.
+
+    Args:
+        spans (list): Span records, in start order.
+
+    Returns:
+        stages (list): Dicts with 'name', 'labels', 'calls', total 'wall',
+        'cpu' and 'children_cpu' seconds, the largest 'max_rss_mb' (and
+        'traced_peak_mb' when traced), 'failed' calls and summed 'counters',
+        in order of first start.
+    """
+    stages = collections.OrderedDict()
+    for record in spans:
+        key = (record['name'], json.dumps(record['labels'], sort_keys=True))
+        if key not in stages:
+            stages[key] = {'name': record['name'], 'labels': record['labels'], 'calls': 0, 'wall': 0.0,
+                           'cpu': 0.0, 'children_cpu': 0.0, 'max_rss_mb': None, 'failed': 0,
+                           'counters': collections.Counter()}
+        stage = stages[key]
+        stage['calls'] += 1
+        stage['failed'] += int(record['failed'])
+        for field in ['wall', 'cpu', 'children_cpu']:
+            stage[field] += record[field]
+        for field in ['max_rss_mb', 'traced_peak_mb']:
+            if record.get(field) is not None:
+                stage[field] = max(stage.get(field) or 0.0, record[field])
+        stage['counters'].update(record['counters'])
+    return [dict(stage, counters=dict(stage['counters'])) for stage in stages.values()]
+
+
+def enable(memory=False, profile=None):
+    """
+    Start recording spans and counters for a new run, replacing any recorder
+    inherited from a parent process.
+
+    Args:
+        memory (bool): Trace allocations with tracemalloc.
+        profile (str): Profile with cProfile and write the statistics here.
+
+    Returns:
+        recorder (Recorder): Recorder of the run.
+    """
+    global _recorder
+    _recorder = Recorder(memory, profile)
+    _recorder.start()
+    return _recorder
+
+
+def disable():
+    """
+    Stop recording.
+
+    Returns:
+        recorder (Recorder): Recorder of the finished run, or None.
+    """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.stop()
+    return recorder
+
+
+def active_recorder():
+    """Recorder of the current run, or None when disabled."""
+    return _recorder
+
+
+def span(name, **labels):
+    """
+    Context manager timing a region of the run, e.g.
+    `with span('parse.tables', season=2019):`. Does nothing while
+    instrumentation is disabled.
+
+    Args:
+        name (str): Stage name; dotted names group related stages.
+        **labels: Values identifying the instance, such as the season.
+
+    Returns:
+        span (context manager): Span to enter.
+    """
+    if _recorder is None:
+        return _NULL_SPAN
+    return _Span(_recorder, name, labels)
+
+
+def count(**counters):
+    """
+    Add to counters such as requests or bytes of the innermost span. Does
+    nothing while instrumentation is disabled.
+
+    Args:
+        **counters: Counter name to amount.
+
+    Returns:
+        None
+    """
+    if _recorder is not None:
+        _recorder.count(counters)
+
+
+def traced(name):
+    """Decorator running every call of a function inside span(name)."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return function(*args, **kwargs)
+            with _Span(_recorder, name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def write_report(report, path):
+    """
+    Write a run report as JSON, atomically.
+
+    Args:
+        report (dict): Report returned by Recorder.report.
+        path (str): Output path.
+
+    Returns:
+        None
+    """
+    # A temporary file per process and thread, as in the response cache, so
+    # concurrent runs never rename each other's partial reports
+    temporary = '{0}.{1}.{2}.tmp'.format(path, os.getpid(), threading.get_ident())
+    with open(temporary, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(temporary, path)
@@ -4,13 +4,181 @@
 # Last Updated: 7/9/2019
 
 
+import hashlib
+import json
+import logging
+import os
+import time
 import numpy as np
 import pandas as pd
-import requests
-from time import sleep
-from bs4 import BeautifulSoup as BS
+from functools import wraps
+from cache import ResponseCache, is_completed_season
+from fetcher import Fetcher
+from instrumentation import span, traced
+from tables import extract_tables
 
-def scrape_per_100_possessions(save=False):
+# Override BBREF_BASE_URL to scrape from a local stand-in server
+BASE_URL = os.environ.get('BBREF_BASE_URL', 'https://www.basketball-reference.com')
+SEASON_SUMMARY_URL = BASE_URL + '/leagues/NBA_{0}.html'
+SEASON_RATINGS_URL = BASE_URL + '/leagues/NBA_{0}_ratings.html'
+# Tables are written next to the Shiny app, wherever the scraper is run from
+PARENT_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'correlation_app', 'data', '')
+MANIFEST_FILE = 'scrape_manifest.json'
+SEASONS = np.arange(2005, 2020)
+SEASON_SUMMARY_TABLES = ['team-stats-per_poss', 'opponent-stats-per_poss',
+                         'team_shooting', 'opponent_shooting', 'misc_stats']
+SEASON_RATINGS_TABLE = 'ratings'
+JOIN_KEYS = ['TEAM', 'SEASON']
+
+# Columns of each table .csv file, in the order they are written
+TEAM_RATINGS_COLUMNS = ['RANK', 'TEAM', 'SEASON', 'CONFERENCE', 'DIVISION', 'W', 'L',
+                        'W/L%', 'MOV', 'ORTG', 'DRTG', 'NRTG', 'ADJUSTED_MOV',
+                        'ADJUSTED_ORTG', 'ADJUSTED_DRTG', 'ADJUSTED_NRTG']
+MISC_STATS_COLUMNS = ['RANK', 'SEASON', 'TEAM', 'PLAYOFF_TEAM', 'AVERAGE_AGE',
+                      'W', 'L', 'W/L%', 'PW', 'PL', 'MOV', 'SOS', 'SRS', 'ORTG',
+                      'DRTG', 'NRTG', 'PACE', 'FT_RATE', '3PA_RATE', 'TS%',
+                      'OFFENSIVE_EFG%', 'OFFENSIVE_TOV%', 'OFFENSIVE_ORB%',
+                      'OFFENSIVE_FT/FGA', 'DEFENSIVE_eFG%', 'DEFENSIVE_TOV%',
+                      'DEFENSIVE_DRB%', 'DEFENSIVE_FT/FGA', 'ARENA',
+                      'TOTAL_ATTENDANCE', 'ATTENDANCE/G']
+PER_100_COLUMNS = ['RANK', 'SEASON', 'TEAM', 'PLAYOFF_TEAM', 'G', 'MP', 'PER100_FG',
+                   'PER100_FGA', 'PER100_FG%', 'PER100_3P', 'PER100_3PA',
+                   'PER100_3P%', 'PER100_2P', 'PER100_2PA', 'PER100_2P%',
+                   'PER100_FT', 'PER100_FTA', 'PER100_FT%', 'PER100_ORB',
+                   'PER100_DRB', 'PER100_TRB', 'PER100_AST', 'PER100_STL',
+                   'PER100_BLK', 'PER100_TOV', 'PER100_PF', 'PER100_PTS']
+OPPONENT_PER_100_COLUMNS = ['RANK', 'SEASON', 'TEAM', 'PLAYOFF_TEAM', 'G', 'MP',
+                            'OPP_PER100_FG', 'OPP_PER100_FGA', 'OPP_PER100_FG%',
+                            'OPP_PER100_3P', 'OPP_PER100_3PA', 'OPP_PER100_3P%',
+                            'OPP_PER100_2P', 'OPP_PER100_2PA', 'OPP_PER100_2P%',
+                            'OPP_PER100_FT', 'OPP_PER100_FTA', 'OPP_PER100_FT%',
+                            'OPP_PER100_ORB', 'OPP_PER100_DRB', 'OPP_PER100_TRB',
+                            'OPP_PER100_AST', 'OPP_PER100_STL', 'OPP_PER100_BLK',
+                            'OPP_PER100_TOV', 'OPP_PER100_PF', 'OPP_PER100_PTS']
+TEAM_SHOOTING_COLUMNS = ['RANK', 'SEASON', 'TEAM', 'PLAYOFF_TEAM', 'G', 'MP', 'FG%',
+                         'AVERAGE_DISTANCE', '%FGA_2P', '%FGA_0-3', '%FGA_3-10',
+                         '%FGA_10-16', 'FGA_16-3PT', '%FGA_3P', 'FG%_2P', 'FG%_0-3',
+                         'FG%_3-10', 'FG%_10-16', 'FG%_16-3PT', 'FG%_3P',
+                         '%ASTD_2P', '%FGA_DUNKS', 'DUNKS_MADE', '%FGA_LAYUPS',
+                         'LAYUPS_MADE', '%ASTD_3P', '%FGA3P_CORNER', 'FG%3_CORNER',
+                         'HEAVE_ATTEMPTS', 'HEAVE_MAKES']
+OPPONENT_SHOOTING_COLUMNS = ['RANK', 'SEASON', 'TEAM', 'PLAYOFF_TEAM', 'G', 'MP', 'OPP_FG%',
+                             'OPP_AVERAGE_DISTANCE', 'OPP_%FGA_2P', 'OPP_%FGA_0-3',
+                             'OPP_%FGA_3-10', 'OPP_%FGA_10-16', 'OPP_FGA_16-3PT',
+                             'OPP_%FGA_3P', 'OPP_FG%_2P', 'OPP_FG%_0-3', 'OPP_FG%_3-10',
+                             'OPP_FG%_10-16', 'OPP_FG%_16-3PT', 'OPP_FG%_3P',
+                             'OPP_%ASTD_2P', 'OPP_%FGA_DUNKS', 'OPP_DUNKS_MADE',
+                             'OPP_%FGA_LAYUPS', 'OPP_LAYUPS_MADE', 'OPP_%ASTD_3P',
+                             'OPP_%FGA3P_CORNER', 'OPP_FG%3_CORNER']
+
+SOURCE_COLUMNS = {'Team_Ratings.csv': TEAM_RATINGS_COLUMNS,
+                  'Miscellaneous_Stats.csv': MISC_STATS_COLUMNS,
+                  'Per_100_Poss.csv': PER_100_COLUMNS,
+                  'Opponent_Per_100_Poss.csv': OPPONENT_PER_100_COLUMNS,
+                  'Team_Shooting.csv': TEAM_SHOOTING_COLUMNS,
+                  'Opponent_Shooting.csv': OPPONENT_SHOOTING_COLUMNS}
+
+logger = logging.getLogger(__name__)
+
+# Shared pooled session; politeness is enforced by its global rate limit
+fetcher = Fetcher()
+
+# Set SCRAPER_CACHE_MODE=replay to rebuild from recorded pages without network access
+http_cache = ResponseCache(fetcher.get, mode=os.environ.get('SCRAPER_CACHE_MODE', 'record'))
+
+def memoize_season(function):
+    """
+    Memoize a function of a season. Results for completed seasons are kept
+    for the life of the process; a result for the in-progress season is only
+    reused while http_cache would still serve its page without revalidation,
+    so long-running processes pick up newly played games.
+
+    Args:
+        function (callable): function(season) to memoize.
+
+    Returns:
+        memoized (callable): Memoized function, with cache_clear() to drop
+        every result and __wrapped__ to call `function` directly.
+    """
+    results = {}
+
+    @wraps(function)
+    def memoized(season):
+        now = time.time()
+        if season in results:
+            result, computed_at = results[season]
+            if is_completed_season(season) or now - computed_at < http_cache.ttl:
+                return result
+        result = function(season)
+        results[season] = (result, now)
+        return result
+
+    memoized.cache_clear = results.clear
+    return memoized
+
+@memoize_season
+def scrape_season_summary(season):
+    """
+    Scrape every table used by the app from a single NBA Season Summary Page
+    on Basketball-Reference.com. The page is downloaded and parsed once,
+    including the tables commented out after placeholder blocks; results are
+    memoized so each scrape_* function below reuses the same download.
+
+    Args:
+        season (int): Year in which the season ends (e.g. 2019 for 2018-2019).
+
+    Returns:
+        season_tables (dict): Raw pandas DataFrame for each table id in
+        SEASON_SUMMARY_TABLES found on the page, with over-headers folded
+        into the column names (see tables.table_frame). Callers should copy
+        before modifying.
+    """
+    url = SEASON_SUMMARY_URL.format(season)
+    with span('scrape.season_summary', season=season):
+        with span('fetch', season=season):
+            html = http_cache.get(url)
+        with span('parse.tables', season=season):
+            return extract_tables(html, SEASON_SUMMARY_TABLES)
+
+@memoize_season
+def scrape_season_ratings(season):
+    """
+    Scrape the raw Team Ratings table for a single season. Results are
+    memoized so prefetch_seasons can download it ahead of scrape_team_ratings.
+
+    Args:
+        season (int): Year in which the season ends (e.g. 2019 for 2018-2019).
+
+    Returns:
+        season_team_ratings_df (DataFrame): Raw Team Ratings table. Callers
+        should copy before modifying.
+    """
+    url = SEASON_RATINGS_URL.format(season)
+    with span('scrape.season_ratings', season=season):
+        with span('fetch', season=season):
+            html = http_cache.get(url)
+        with span('parse.tables', season=season):
+            return extract_tables(html, [SEASON_RATINGS_TABLE])[SEASON_RATINGS_TABLE]
+
+def prefetch_seasons(seasons):
+    """
+    Download the Season Summary and Team Ratings pages for every season
+    concurrently, subject to the fetcher's global rate limit. The scrape_*
+    functions then read from the memoized results without further requests.
+
+    Args:
+        seasons (iterable): Years in which the seasons end.
+
+    Returns:
+        None
+    """
+    seasons = [int(season) for season in seasons]
+    with span('scrape.prefetch', seasons=len(seasons)):
+        fetcher.map(scrape_season_summary, seasons)
+        fetcher.map(scrape_season_ratings, seasons)
+
+def scrape_per_100_possessions(save=False, seasons=SEASONS):
     """
     Scrape Per 100 Possession table within NBA Season Summary Page on
     Basketball-Reference.com.
@@ -18,44 +186,27 @@ def scrape_per_100_possessions(save=False):
     Args:
         save (bool): Indicates whether to write resulting pandas DataFrame to
                      .csv file. Defaults to False.
+        seasons (iterable): Years in which the seasons to scrape end.
+                            Defaults to SEASONS.
 
     Returns:
         historical_per_100_possessions_df (DataFrame): Per 100 Possession table
         between 2004-2005 and 2018-2019 NBA seasons.
     """
     historical_per_100_possessions_df = pd.DataFrame()
-    for season in np.arange(2005, 2020):
-        sleep(np.random.randint(10, 15))
-        season_per_100_df = pd.DataFrame()
-        url = 'https://www.basketball-reference.com/leagues/NBA_{}.html#team-stats-per_poss::none'.format(season)
-        html = requests.get(url).text
-        soup = BS(html, 'html.parser')
-        placeholders = soup.find_all('div', {'class': 'placeholder'})
-        for x in placeholders:
-            comment = ''.join(x.next_siblings)
-            soup_comment = BS(comment, 'html.parser')
-            tables = soup_comment.find_all('table', attrs={"id":"team-stats-per_poss"})
-            for tag in tables:
-                df = pd.read_html(tag.prettify())[0]
-                season_per_100_df = season_per_100_df.append(df).reset_index()
-                season_per_100_df.drop('index', axis=1, inplace=True)
-                season_per_100_df.columns = ['RANK', 'TEAM', 'G', 'MP'] + \
-                                            ['PER100_' + str(col) for col in \
-                                            season_per_100_df.columns if col not in \
-                                            ['Rk', 'Team', 'G', 'MP']]
+    for season in seasons:
+        season_per_100_df = scrape_season_summary(int(season))['team-stats-per_poss'].copy()
+        season_per_100_df.columns = ['RANK', 'TEAM', 'G', 'MP'] + \
+                                    ['PER100_' + str(col) for col in \
+                                    season_per_100_df.columns if col not in \
+                                    ['Rk', 'Team', 'G', 'MP']]
         season_per_100_df['SEASON'] = '{0}-{1}'.format(season-1, season)
         season_per_100_df['PLAYOFF_TEAM'] = np.where(season_per_100_df['TEAM'].str.find('*') > -1, 1, 0)
         season_per_100_df['TEAM'] = season_per_100_df['TEAM'].str.strip(' * ')
         historical_per_100_possessions_df = historical_per_100_possessions_df.append(season_per_100_df, sort=False)
-    column_order = ['RANK', 'SEASON', 'TEAM', 'PLAYOFF_TEAM', 'G', 'MP', 'PER100_FG',
-                    'PER100_FGA', 'PER100_FG%', 'PER100_3P', 'PER100_3PA',
-                    'PER100_3P%', 'PER100_2P', 'PER100_2PA', 'PER100_2P%',
-                    'PER100_FT', 'PER100_FTA', 'PER100_FT%', 'PER100_ORB',
-                    'PER100_DRB', 'PER100_TRB', 'PER100_AST', 'PER100_STL',
-                    'PER100_BLK', 'PER100_TOV', 'PER100_PF', 'PER100_PTS']
-    historical_per_100_possessions_df = historical_per_100_possessions_df.reindex(columns=column_order)
+    historical_per_100_possessions_df = historical_per_100_possessions_df.reindex(columns=PER_100_COLUMNS)
     if save:
-        parent_directory = '../app/data/'
+        parent_directory = PARENT_DIRECTORY
         historical_per_100_possessions_df.to_csv(parent_directory +
                                                 'Per_100_Poss.csv',
                                                 index=False)
@@ -63,7 +214,7 @@ def scrape_per_100_possessions(save=False):
         pass
     return historical_per_100_possessions_df
 
-def scrape_opponent_per_100_possessions(save=False):
+def scrape_opponent_per_100_possessions(save=False, seasons=SEASONS):
     """
     Scrape Opponent Per 100 Possession table within NBA Season Summary Page on
     Basketball-Reference.com.
@@ -71,46 +222,27 @@ def scrape_opponent_per_100_possessions(save=False):
     Args:
         save (bool): Indicates whether to write resulting pandas DataFrame to
                      .csv file. Defaults to False.
+        seasons (iterable): Years in which the seasons to scrape end.
+                            Defaults to SEASONS.
 
     Returns:
         historical_opponent_per_100_df (DataFrame): Opponent Per 100 Possession
         table between 2004-2005 and 2018-2019 NBA seasons.
     """
     historical_opponent_per_100_df = pd.DataFrame()
-    for season in np.arange(2005, 2020):
-        sleep(np.random.randint(10, 15))
-        season_opponent_per_100_df = pd.DataFrame()
-        url = 'https://www.basketball-reference.com/leagues/NBA_{0}.html#opponent-stats-per_poss::none'.format(season)
-        html = requests.get(url).text
-        soup = BS(html, 'html.parser')
-        placeholders = soup.find_all('div', {'class': 'placeholder'})
-        for x in placeholders:
-            comment = ''.join(x.next_siblings)
-            soup_comment = BS(comment, 'html.parser')
-            tables = soup_comment.find_all('table', attrs={"id":"opponent-stats-per_poss"})
-            for tag in tables:
-                df = pd.read_html(tag.prettify())[0]
-                season_opponent_per_100_df = season_opponent_per_100_df.append(df).reset_index()
-                season_opponent_per_100_df.drop('index', axis=1, inplace=True)
-                season_opponent_per_100_df.columns = ['RANK', 'TEAM', 'G', 'MP'] + \
-                                                    ['OPP_PER100_' + str(col) for \
-                                                    col in season_opponent_per_100_df.columns \
-                                                    if col not in ['Rk', 'Team', 'G', 'MP']]
+    for season in seasons:
+        season_opponent_per_100_df = scrape_season_summary(int(season))['opponent-stats-per_poss'].copy()
+        season_opponent_per_100_df.columns = ['RANK', 'TEAM', 'G', 'MP'] + \
+                                            ['OPP_PER100_' + str(col) for \
+                                            col in season_opponent_per_100_df.columns \
+                                            if col not in ['Rk', 'Team', 'G', 'MP']]
         season_opponent_per_100_df['SEASON'] = '{0}-{1}'.format(season-1, season)
         season_opponent_per_100_df['PLAYOFF_TEAM'] = np.where(season_opponent_per_100_df['TEAM'].str.find('*') > -1, 1, 0)
         season_opponent_per_100_df['TEAM'] = season_opponent_per_100_df['TEAM'].str.strip(' * ')
         historical_opponent_per_100_df = historical_opponent_per_100_df.append(season_opponent_per_100_df, sort=False)
-    column_order = ['RANK', 'SEASON', 'TEAM', 'PLAYOFF_TEAM', 'G', 'MP',
-                    'OPP_PER100_FG', 'OPP_PER100_FGA', 'OPP_PER100_FG%',
-                    'OPP_PER100_3P', 'OPP_PER100_3PA', 'OPP_PER100_3P%',
-                    'OPP_PER100_2P', 'OPP_PER100_2PA', 'OPP_PER100_2P%',
-                    'OPP_PER100_FT', 'OPP_PER100_FTA', 'OPP_PER100_FT%',
-                    'OPP_PER100_ORB', 'OPP_PER100_DRB', 'OPP_PER100_TRB',
-                    'OPP_PER100_AST', 'OPP_PER100_STL', 'OPP_PER100_BLK',
-                    'OPP_PER100_TOV', 'OPP_PER100_PF', 'OPP_PER100_PTS']
-    historical_opponent_per_100_df = historical_opponent_per_100_df.reindex(columns=column_order)
+    historical_opponent_per_100_df = historical_opponent_per_100_df.reindex(columns=OPPONENT_PER_100_COLUMNS)
     if save:
-        parent_directory = '../app/data/'
+        parent_directory = PARENT_DIRECTORY
         historical_opponent_per_100_df.to_csv(parent_directory +
                                             'Opponent_Per_100_Poss.csv',
                                             index=False)
@@ -118,7 +250,7 @@ def scrape_opponent_per_100_possessions(save=False):
         pass
     return historical_opponent_per_100_df
 
-def scrape_team_shooting(save=False):
+def scrape_team_shooting(save=False, seasons=SEASONS):
     """
     Scrape Team Shooting table within NBA Season Summary Page on
     Basketball-Reference.com.
@@ -126,6 +258,8 @@ def scrape_team_shooting(save=False):
     Args:
         save (bool): Indicates whether to write resulting pandas DataFrame to
                      .csv file. Defaults to False.
+        seasons (iterable): Years in which the seasons to scrape end.
+                            Defaults to SEASONS.
 
     Returns:
         historical_team_shooting_df (DataFrame): Team Shooting table between
@@ -134,49 +268,28 @@ def scrape_team_shooting(save=False):
         between 2004-2005 and 2018-2019 seasons.
     """
     historical_team_shooting_df = pd.DataFrame()
-    for season in np.arange(2005, 2020):
-        sleep(np.random.randint(10, 15))
-        season_team_shooting_df = pd.DataFrame()
-        url = 'https://www.basketball-reference.com/leagues/NBA_{0}.html#team_shooting::none'.format(season)
-        html = requests.get(url).text
-        soup = BS(html, 'html.parser')
-        placeholders = soup.find_all('div', {'class': 'placeholder'})
-        for x in placeholders:
-            comment = ''.join(x.next_siblings)
-            soup_comment = BS(comment, 'html.parser')
-            tables = soup_comment.find_all('table', attrs={"id":"team_shooting"})
-            for tag in tables:
-                df = pd.read_html(tag.prettify())[0]
-                season_team_shooting_df = season_team_shooting_df.append(df).reset_index()
-                season_team_shooting_df.columns = season_team_shooting_df.columns.get_level_values(1)
-                season_team_shooting_df.drop('', axis=1, inplace=True)
-                season_team_shooting_df.columns = ['RANK', 'TEAM', 'G', 'MP',
-                                                   'FG%', 'AVERAGE_DISTANCE',
-                                                   '%FGA_2P', '%FGA_0-3',
-                                                   '%FGA_3-10', '%FGA_10-16',
-                                                   'FGA_16-3PT', '%FGA_3P',
-                                                   'FG%_2P', 'FG%_0-3', 'FG%_3-10',
-                                                   'FG%_10-16', 'FG%_16-3PT',
-                                                   'FG%_3P', '%ASTD_2P', '%FGA_DUNKS',
-                                                   'DUNKS_MADE', '%FGA_LAYUPS',
-                                                   'LAYUPS_MADE', '%ASTD_3P',
-                                                   '%FGA3P_CORNER', 'FG%3_CORNER',
-                                                   'HEAVE_ATTEMPTS', 'HEAVE_MAKES']
+    for season in seasons:
+        season_team_shooting_df = scrape_season_summary(int(season))['team_shooting'].copy()
+        season_team_shooting_df.columns = ['RANK', 'TEAM', 'G', 'MP',
+                                           'FG%', 'AVERAGE_DISTANCE',
+                                           '%FGA_2P', '%FGA_0-3',
+                                           '%FGA_3-10', '%FGA_10-16',
+                                           'FGA_16-3PT', '%FGA_3P',
+                                           'FG%_2P', 'FG%_0-3', 'FG%_3-10',
+                                           'FG%_10-16', 'FG%_16-3PT',
+                                           'FG%_3P', '%ASTD_2P', '%FGA_DUNKS',
+                                           'DUNKS_MADE', '%FGA_LAYUPS',
+                                           'LAYUPS_MADE', '%ASTD_3P',
+                                           '%FGA3P_CORNER', 'FG%3_CORNER',
+                                           'HEAVE_ATTEMPTS', 'HEAVE_MAKES']
         season_team_shooting_df['SEASON'] = '{0}-{1}'.format(season-1, season)
         season_team_shooting_df['PLAYOFF_TEAM'] = np.where(season_team_shooting_df['TEAM'].str.find('*') > -1, 1, 0)
         season_team_shooting_df['TEAM'] = season_team_shooting_df['TEAM'].str.strip(' * ')
         season_team_shooting_df = season_team_shooting_df[season_team_shooting_df['TEAM']!='League Average']
         historical_team_shooting_df = historical_team_shooting_df.append(season_team_shooting_df, sort=False)
-    column_order = ['RANK', 'SEASON', 'TEAM', 'PLAYOFF_TEAM', 'G', 'MP', 'FG%',
-                    'AVERAGE_DISTANCE', '%FGA_2P', '%FGA_0-3', '%FGA_3-10',
-                    '%FGA_10-16', 'FGA_16-3PT', '%FGA_3P', 'FG%_2P', 'FG%_0-3',
-                    'FG%_3-10', 'FG%_10-16', 'FG%_16-3PT', 'FG%_3P',
-                    '%ASTD_2P', '%FGA_DUNKS', 'DUNKS_MADE', '%FGA_LAYUPS',
-                    'LAYUPS_MADE', '%ASTD_3P', '%FGA3P_CORNER', 'FG%3_CORNER',
-                    'HEAVE_ATTEMPTS', 'HEAVE_MAKES']
-    historical_team_shooting_df = historical_team_shooting_df.reindex(columns=column_order)
+    historical_team_shooting_df = historical_team_shooting_df.reindex(columns=TEAM_SHOOTING_COLUMNS)
     if save:
-        parent_directory = '../app/data/'
+        parent_directory = PARENT_DIRECTORY
         historical_team_shooting_df.to_csv(parent_directory +
                                           'Team_Shooting.csv',
                                           index=False)
@@ -184,7 +297,7 @@ def scrape_team_shooting(save=False):
         pass
     return historical_team_shooting_df
 
-def scrape_opponent_shooting(save=False):
+def scrape_opponent_shooting(save=False, seasons=SEASONS):
     """
     Scrape Opponent Team Shooting table within NBA Season Summary Page on
     Basketball-Reference.com.
@@ -192,56 +305,36 @@ def scrape_opponent_shooting(save=False):
     Args:
         save (bool): Indicates whether to write resulting pandas DataFrame to
                      .csv file. Defaults to False.
+        seasons (iterable): Years in which the seasons to scrape end.
+                            Defaults to SEASONS.
 
     Returns:
         historical_opponent_shooting_df (DataFrame): Opponent Team Shooting
         table between 2004-2005 and 2018-2019 NBA seasons.
     """
     historical_opponent_shooting_df = pd.DataFrame()
-    for season in np.arange(2005, 2020):
-        sleep(np.random.randint(10, 15))
-        season_opponent_shooting_df = pd.DataFrame()
-        url = 'https://www.basketball-reference.com/leagues/NBA_{0}.html#opponent_shooting::none'.format(season)
-        html = requests.get(url).text
-        soup = BS(html, 'html.parser')
-        placeholders = soup.find_all('div', {'class': 'placeholder'})
-        for x in placeholders:
-            comment = ''.join(x.next_siblings)
-            soup_comment = BS(comment, 'html.parser')
-            tables = soup_comment.find_all('table', attrs={"id":"opponent_shooting"})
-            for tag in tables:
-                df = pd.read_html(tag.prettify())[0]
-                season_opponent_shooting_df = season_opponent_shooting_df.append(df).reset_index()
-                season_opponent_shooting_df.columns = season_opponent_shooting_df.columns.get_level_values(1)
-                season_opponent_shooting_df.drop('', axis=1, inplace=True)
-                season_opponent_shooting_df.columns = ['RANK', 'TEAM', 'G', 'MP',
-                                                       'OPP_FG%', 'OPP_AVERAGE_DISTANCE',
-                                                       'OPP_%FGA_2P', 'OPP_%FGA_0-3',
-                                                       'OPP_%FGA_3-10', 'OPP_%FGA_10-16',
-                                                       'OPP_FGA_16-3PT', 'OPP_%FGA_3P',
-                                                       'OPP_FG%_2P', 'OPP_FG%_0-3',
-                                                       'OPP_FG%_3-10', 'OPP_FG%_10-16',
-                                                       'OPP_FG%_16-3PT', 'OPP_FG%_3P',
-                                                       'OPP_%ASTD_2P', 'OPP_%FGA_DUNKS',
-                                                       'OPP_DUNKS_MADE', 'OPP_%FGA_LAYUPS',
-                                                       'OPP_LAYUPS_MADE', 'OPP_%ASTD_3P',
-                                                       'OPP_%FGA3P_CORNER', 'OPP_FG%3_CORNER']
+    for season in seasons:
+        season_opponent_shooting_df = scrape_season_summary(int(season))['opponent_shooting'].copy()
+        season_opponent_shooting_df.columns = ['RANK', 'TEAM', 'G', 'MP',
+                                               'OPP_FG%', 'OPP_AVERAGE_DISTANCE',
+                                               'OPP_%FGA_2P', 'OPP_%FGA_0-3',
+                                               'OPP_%FGA_3-10', 'OPP_%FGA_10-16',
+                                               'OPP_FGA_16-3PT', 'OPP_%FGA_3P',
+                                               'OPP_FG%_2P', 'OPP_FG%_0-3',
+                                               'OPP_FG%_3-10', 'OPP_FG%_10-16',
+                                               'OPP_FG%_16-3PT', 'OPP_FG%_3P',
+                                               'OPP_%ASTD_2P', 'OPP_%FGA_DUNKS',
+                                               'OPP_DUNKS_MADE', 'OPP_%FGA_LAYUPS',
+                                               'OPP_LAYUPS_MADE', 'OPP_%ASTD_3P',
+                                               'OPP_%FGA3P_CORNER', 'OPP_FG%3_CORNER']
         season_opponent_shooting_df['SEASON'] = '{0}-{1}'.format(season-1, season)
         season_opponent_shooting_df['PLAYOFF_TEAM'] = np.where(season_opponent_shooting_df['TEAM'].str.find('*') > -1, 1, 0)
         season_opponent_shooting_df['TEAM'] = season_opponent_shooting_df['TEAM'].str.strip(' * ')
         season_opponent_shooting_df = season_opponent_shooting_df[season_opponent_shooting_df['TEAM']!='League Average']
         historical_opponent_shooting_df = historical_opponent_shooting_df.append(season_opponent_shooting_df, sort=False)
-    column_order = ['RANK', 'SEASON', 'TEAM', 'PLAYOFF_TEAM', 'G', 'MP', 'OPP_FG%',
-                    'OPP_AVERAGE_DISTANCE', 'OPP_%FGA_2P', 'OPP_%FGA_0-3',
-                    'OPP_%FGA_3-10', 'OPP_%FGA_10-16', 'OPP_FGA_16-3PT',
-                    'OPP_%FGA_3P', 'OPP_FG%_2P', 'OPP_FG%_0-3', 'OPP_FG%_3-10',
-                    'OPP_FG%_10-16', 'OPP_FG%_16-3PT', 'OPP_FG%_3P',
-                    'OPP_%ASTD_2P', 'OPP_%FGA_DUNKS', 'OPP_DUNKS_MADE',
-                    'OPP_%FGA_LAYUPS', 'OPP_LAYUPS_MADE', 'OPP_%ASTD_3P',
-                    'OPP_%FGA3P_CORNER', 'OPP_FG%3_CORNER']
-    historical_opponent_shooting_df = historical_opponent_shooting_df.reindex(columns=column_order)
+    historical_opponent_shooting_df = historical_opponent_shooting_df.reindex(columns=OPPONENT_SHOOTING_COLUMNS)
     if save:
-        parent_directory = '../app/data/'
+        parent_directory = PARENT_DIRECTORY
         historical_opponent_shooting_df.to_csv(parent_directory +
                                               'Opponent_Shooting.csv',
                                               index=False)
@@ -249,7 +342,7 @@ def scrape_opponent_shooting(save=False):
         pass
     return historical_opponent_shooting_df
 
-def scrape_miscellaneous_stats(save=False):
+def scrape_miscellaneous_stats(save=False, seasons=SEASONS):
     """
     Scrape Miscellaneous Stats table within NBA Season Summary Page on
     Basketball-Reference.com.
@@ -257,6 +350,8 @@ def scrape_miscellaneous_stats(save=False):
     Args:
         save (bool): Indicates whether to write resulting pandas DataFrame to
                      .csv file. Defaults to False.
+        seasons (iterable): Years in which the seasons to scrape end.
+                            Defaults to SEASONS.
 
     Returns:
         historical_misc_stats_df (DataFrame): Miscellaneous Stats table between
@@ -265,48 +360,27 @@ def scrape_miscellaneous_stats(save=False):
         Stats between 2004-2005 and 2018-2019 season.
     """
     historical_misc_stats_df = pd.DataFrame()
-    for season in np.arange(2005, 2020):
-        sleep(np.random.randint(10, 15))
-        season_misc_stats_df = pd.DataFrame()
-        url = 'https://www.basketball-reference.com/leagues/NBA_{0}.html#misc_stats::none'.format(season)
-        html = requests.get(url).text
-        soup = BS(html, 'html.parser')
-        placeholders = soup.find_all('div', {'class': 'placeholder'})
-        for x in placeholders:
-            comment = ''.join(x.next_siblings)
-            soup_comment = BS(comment, 'html.parser')
-            tables = soup_comment.find_all('table', attrs={"id":"misc_stats"})
-            for tag in tables:
-                df = pd.read_html(tag.prettify())[0]
-                season_misc_stats_df = season_misc_stats_df.append(df).reset_index()
-                season_misc_stats_df.columns = season_misc_stats_df.columns.get_level_values(1)
-                season_misc_stats_df.drop('', axis=1, inplace=True)
-                season_misc_stats_df.columns = ['RANK', 'TEAM', 'AVERAGE_AGE',
-                                                'W', 'L', 'PW', 'PL', 'MOV',
-                                                'SOS', 'SRS', 'ORTG', 'DRTG',
-                                                'NRTG', 'PACE', 'FT_RATE',
-                                                '3PA_RATE', 'TS%', 'OFFENSIVE_EFG%',
-                                                'OFFENSIVE_TOV%', 'OFFENSIVE_ORB%',
-                                                'OFFENSIVE_FT/FGA', 'DEFENSIVE_eFG%',
-                                                'DEFENSIVE_TOV%', 'DEFENSIVE_DRB%',
-                                                'DEFENSIVE_FT/FGA', 'ARENA',
-                                                'TOTAL_ATTENDANCE', 'ATTENDANCE/G']
+    for season in seasons:
+        season_misc_stats_df = scrape_season_summary(int(season))['misc_stats'].copy()
+        season_misc_stats_df.columns = ['RANK', 'TEAM', 'AVERAGE_AGE',
+                                        'W', 'L', 'PW', 'PL', 'MOV',
+                                        'SOS', 'SRS', 'ORTG', 'DRTG',
+                                        'NRTG', 'PACE', 'FT_RATE',
+                                        '3PA_RATE', 'TS%', 'OFFENSIVE_EFG%',
+                                        'OFFENSIVE_TOV%', 'OFFENSIVE_ORB%',
+                                        'OFFENSIVE_FT/FGA', 'DEFENSIVE_eFG%',
+                                        'DEFENSIVE_TOV%', 'DEFENSIVE_DRB%',
+                                        'DEFENSIVE_FT/FGA', 'ARENA',
+                                        'TOTAL_ATTENDANCE', 'ATTENDANCE/G']
         season_misc_stats_df['SEASON'] = '{0}-{1}'.format(season-1, season)
         season_misc_stats_df['PLAYOFF_TEAM'] = np.where(season_misc_stats_df['TEAM'].str.find('*') > -1, 1, 0)
         season_misc_stats_df['TEAM'] = season_misc_stats_df['TEAM'].str.strip(' * ')
         season_misc_stats_df['W/L%'] = season_misc_stats_df['W']/(season_misc_stats_df['W'] + season_misc_stats_df['L'])
         season_misc_stats_df = season_misc_stats_df[season_misc_stats_df['TEAM']!='League Average']
         historical_misc_stats_df = historical_misc_stats_df.append(season_misc_stats_df, sort=False)
-    column_order = ['RANK', 'SEASON', 'TEAM', 'PLAYOFF_TEAM', 'AVERAGE_AGE',
-                    'W', 'L', 'W/L%', 'PW', 'PL', 'MOV', 'SOS', 'SRS', 'ORTG',
-                    'DRTG', 'NRTG', 'PACE', 'FT_RATE', '3PA_RATE', 'TS%',
-                    'OFFENSIVE_EFG%', 'OFFENSIVE_TOV%', 'OFFENSIVE_ORB%',
-                    'OFFENSIVE_FT/FGA', 'DEFENSIVE_eFG%', 'DEFENSIVE_TOV%',
-                    'DEFENSIVE_DRB%', 'DEFENSIVE_FT/FGA', 'ARENA',
-                    'TOTAL_ATTENDANCE', 'ATTENDANCE/G']
-    historical_misc_stats_df = historical_misc_stats_df.reindex(columns=column_order)
+    historical_misc_stats_df = historical_misc_stats_df.reindex(columns=MISC_STATS_COLUMNS)
     if save:
-        parent_directory = '../app/data/'
+        parent_directory = PARENT_DIRECTORY
         historical_misc_stats_df.to_csv(parent_directory +
                                         'Miscellaneous_Stats.csv',
                                         index=False)
@@ -314,7 +388,7 @@ def scrape_miscellaneous_stats(save=False):
         pass
     return historical_misc_stats_df
 
-def scrape_team_ratings(save=False):
+def scrape_team_ratings(save=False, seasons=SEASONS):
     """
     Scrape Team Ratings table within NBA Season Summary Page on
     Basketball-Reference.com.
@@ -322,29 +396,25 @@ def scrape_team_ratings(save=False):
     Args:
         save (bool): Indicates whether to write resulting pandas DataFrame to
                      .csv file. Defaults to False.
+        seasons (iterable): Years in which the seasons to scrape end.
+                            Defaults to SEASONS.
 
     Returns:
         historical_team_ratings_df (DataFrame): Team Ratings table between
         2004-2005 and 2018-2019 NBA seasons.
     """
     historical_team_ratings_df = pd.DataFrame()
-    for season in np.arange(2005, 2020):
-        sleep(np.random.randint(10, 15))
-        url = 'https://www.basketball-reference.com/leagues/NBA_{0}_ratings.html#ratings::14'.format(season)
-        season_team_ratings_df = pd.read_html(url)[0]
-        season_team_ratings_df.columns = season_team_ratings_df.columns.get_level_values(1)
+    for season in seasons:
+        season_team_ratings_df = scrape_season_ratings(int(season)).copy()
         season_team_ratings_df.columns = ['RANK', 'TEAM', 'CONFERENCE', 'DIVISION',
                                           'W', 'L', 'W/L%', 'MOV', 'ORTG', 'DRTG',
                                           'NRTG', 'ADJUSTED_MOV', 'ADJUSTED_ORTG',
                                           'ADJUSTED_DRTG', 'ADJUSTED_NRTG']
         season_team_ratings_df['SEASON'] = '{0}-{1}'.format(season-1, season)
         historical_team_ratings_df = historical_team_ratings_df.append(season_team_ratings_df, sort=False)
-    column_order = ['RANK', 'TEAM', 'SEASON', 'CONFERENCE', 'DIVISION', 'W', 'L',
-                    'W/L%', 'MOV', 'ORTG', 'DRTG', 'NRTG', 'ADJUSTED_MOV',
-                    'ADJUSTED_ORTG', 'ADJUSTED_DRTG', 'ADJUSTED_NRTG']
-    historical_team_ratings_df = historical_team_ratings_df.reindex(columns=column_order)
+    historical_team_ratings_df = historical_team_ratings_df.reindex(columns=TEAM_RATINGS_COLUMNS)
     if save:
-        parent_directory = '../app/data/'
+        parent_directory = PARENT_DIRECTORY
         historical_team_ratings_df.to_csv(parent_directory +
                                               'Team_Ratings.csv',
                                               index=False)
@@ -353,81 +423,347 @@ def scrape_team_ratings(save=False):
         pass
     return historical_team_ratings_df
 
-def create_team_base_table(save=False):
+def join_team_tables(source_dfs):
+    """
+    Align every source table on (TEAM, SEASON) in a single pass. The first
+    table is the base: its rows and row order are kept, like a chain of left
+    merges. Each later table contributes the columns not already present;
+    columns it shares with an earlier table are compared rather than
+    silently dropped.
+
+    Args:
+        source_dfs (list): (file name, DataFrame) pairs in join order. File
+                           names must be keys of SOURCE_COLUMNS.
+
+    Returns:
+        team_stats_df (DataFrame): Joined table.
+        report (dict): Per source file: 'unexpected_columns' not declared in
+        SOURCE_COLUMNS, 'unmatched_keys' of base rows missing from the source,
+        'unused_keys' of source rows with no base row, and
+        'conflicting_columns' mapping each shared column (other than the
+        table-specific RANK) to the number of rows that disagree with the
+        earlier table.
+
+    Raises:
+        ValueError: If a source lacks a declared column or repeats a key.
+    """
+    base_df = source_dfs[0][1]
+    base_index = pd.MultiIndex.from_arrays([base_df[key].values for key in JOIN_KEYS], names=JOIN_KEYS)
+    aligned_dfs = []
+    aligned_columns = {}
+    report = {}
+    for file_name, df in source_dfs:
+        expected = SOURCE_COLUMNS[file_name]
+        missing = [col for col in expected if col not in df.columns]
+        if missing:
+            raise ValueError('{0} is missing columns {1}'.format(file_name, missing))
+        indexed_df = df.set_index(JOIN_KEYS, drop=False)
+        duplicate_keys = indexed_df.index[indexed_df.index.duplicated()]
+        if len(duplicate_keys):
+            raise ValueError('{0} has duplicate (TEAM, SEASON) keys {1}'.format(file_name, list(duplicate_keys)))
+
+        new_columns = [col for col in df.columns if col not in aligned_columns]
+        aligned_df = indexed_df.reindex(base_index)
+        conflicting_columns = {}
+        for col in df.columns:
+            if col in aligned_columns and col not in JOIN_KEYS + ['RANK']:
+                earlier, current = aligned_columns[col], aligned_df[col].values
+                if earlier.dtype.kind in 'fiu' and current.dtype.kind in 'fiu':
+                    # Basketball-Reference rounds to three decimals; derived
+                    # columns such as W/L% differ below that
+                    agree = np.isclose(earlier, current, rtol=0, atol=1e-3, equal_nan=True)
+                else:
+                    agree = (earlier == current) | (pd.isnull(earlier) & pd.isnull(current))
+                conflicting_columns[col] = int((~agree).sum())
+        for col in new_columns:
+            aligned_columns[col] = aligned_df[col].values
+        aligned_dfs.append(aligned_df[new_columns])
+
+        report[file_name] = {
+            'unexpected_columns': [col for col in df.columns if col not in expected],
+            'unmatched_keys': [list(key) for key in base_index.difference(indexed_df.index)],
+            'unused_keys': [list(key) for key in indexed_df.index.difference(base_index)],
+            'conflicting_columns': conflicting_columns}
+
+    team_stats_df = pd.concat(aligned_dfs, axis=1).reset_index(drop=True)
+    return team_stats_df, report
+
+def log_join_report(report):
+    """
+    Log any problems found by join_team_tables.
+
+    Args:
+        report (dict): Report returned by join_team_tables.
+
+    Returns:
+        None
+    """
+    for file_name, problems in report.items():
+        if problems['unexpected_columns']:
+            logger.warning('%s has undeclared columns %s', file_name, problems['unexpected_columns'])
+        if problems['unmatched_keys']:
+            logger.warning('%s has no rows for %d base keys: %s', file_name,
+                           len(problems['unmatched_keys']), problems['unmatched_keys'])
+        if problems['unused_keys']:
+            logger.warning('%s rows for %d keys were not joined: %s', file_name,
+                           len(problems['unused_keys']), problems['unused_keys'])
+        # Some shared columns legitimately differ between pages (e.g. ORTG on
+        # the ratings page uses a different possession estimate); the value
+        # from the earlier table is kept
+        for col, count in problems['conflicting_columns'].items():
+            if count:
+                logger.info('%s disagrees with an earlier table on %s in %d rows; keeping the earlier value',
+                            file_name, col, count)
+
+@traced('join.create_team_base_table')
+def create_team_base_table(save=False, seasons=None):
     """
     Combine Team Ratings, Miscellaneous Stats, Per 100 Possessions,
     Opponnent Per 100 Possessions, Team Shooting, and Opponent Shooting
     DataFrames to create comprehensive base table for team stats.
 
     Args:
-        None
+        save (bool): Indicates whether to write resulting pandas DataFrame to
+                     .csv file. Defaults to False.
+        seasons (list): Season labels (e.g. '2018-2019') to rebuild. Rows for
+                        these seasons are joined and upserted into the existing
+                        Team_Stats.csv; all other rows are kept as-is. Defaults
+                        to None, which rebuilds every season.
 
     Returns:
         team_stats_df (DataFrame): Team statistics for seasons between
         2004-2005 and 2018-2019 seasons
     """
-    parent_directory = '../app/data/'
-
-    team_ratings_df = pd.read_csv(parent_directory + 'Team_Ratings.csv')
-    misc_stats_df = pd.read_csv(parent_directory + 'Miscellaneous_Stats.csv')
-    per_100_possessions_df = pd.read_csv(parent_directory + 'Per_100_Poss.csv')
-    opponent_per_100_possessions_df = pd.read_csv(parent_directory + 'Opponent_Per_100_Poss.csv')
-    team_shooting_df = pd.read_csv(parent_directory + 'Team_Shooting.csv')
-    opponent_shooting_df = pd.read_csv(parent_directory + 'Opponent_Shooting.csv')
-
-    team_stats_df = team_ratings_df.merge(misc_stats_df,
-                                    on=['TEAM', 'SEASON'],
-                                    how='left',
-                                    suffixes=('', '_duplicate'))
-    team_stats_df.drop([col for col in team_stats_df.columns if '_duplicate' in col],
-                        axis=1,
-                        inplace=True)
-    team_stats_df = team_stats_df.merge(per_100_possessions_df,
-                                    on=['TEAM', 'SEASON'],
-                                    how='left',
-                                    suffixes=('', '_duplicate'))
-    team_stats_df.drop([col for col in team_stats_df.columns if '_duplicate' in col],
-                        axis=1,
-                        inplace=True)
-    team_stats_df = team_stats_df.merge(opponent_per_100_possessions_df,
-                                    on=['TEAM', 'SEASON'],
-                                    how='left',
-                                    suffixes=('', '_duplicate'))
-    team_stats_df.drop([col for col in team_stats_df.columns if '_duplicate' in col],
-                        axis=1,
-                        inplace=True)
-    team_stats_df = team_stats_df.merge(team_shooting_df,
-                                    on=['TEAM', 'SEASON'],
-                                    how='left',
-                                    suffixes=('', '_duplicate'))
-    team_stats_df.drop([col for col in team_stats_df.columns if '_duplicate' in col],
-                        axis=1,
-                        inplace=True)
-    team_stats_df = team_stats_df.merge(opponent_shooting_df,
-                                    on=['TEAM', 'SEASON'],
-                                    how='left',
-                                    suffixes=('', '_duplicate'))
-    team_stats_df.drop([col for col in team_stats_df.columns if '_duplicate' in col],
-                        axis=1,
-                        inplace=True)
+    parent_directory = PARENT_DIRECTORY
+
+    with span('join.read_csv'):
+        team_ratings_df = read_table(parent_directory + 'Team_Ratings.csv')
+        misc_stats_df = read_table(parent_directory + 'Miscellaneous_Stats.csv')
+        per_100_possessions_df = read_table(parent_directory + 'Per_100_Poss.csv')
+        opponent_per_100_possessions_df = read_table(parent_directory + 'Opponent_Per_100_Poss.csv')
+        team_shooting_df = read_table(parent_directory + 'Team_Shooting.csv')
+        opponent_shooting_df = read_table(parent_directory + 'Opponent_Shooting.csv')
+
+    if seasons is not None:
+        team_ratings_df = team_ratings_df[team_ratings_df['SEASON'].isin(seasons)]
+
+    with span('join.merge', seasons=len(seasons) if seasons is not None else 'all'):
+        team_stats_df, report = join_team_tables([('Team_Ratings.csv', team_ratings_df),
+                                                  ('Miscellaneous_Stats.csv', misc_stats_df),
+                                                  ('Per_100_Poss.csv', per_100_possessions_df),
+                                                  ('Opponent_Per_100_Poss.csv', opponent_per_100_possessions_df),
+                                                  ('Team_Shooting.csv', team_shooting_df),
+                                                  ('Opponent_Shooting.csv', opponent_shooting_df)])
+    log_join_report(report)
+
+    if seasons is not None and os.path.exists(parent_directory + 'Team_Stats.csv'):
+        with span('join.upsert'):
+            existing_team_stats_df = read_table(parent_directory + 'Team_Stats.csv')
+            team_stats_df = upsert_seasons(existing_team_stats_df, team_stats_df)
 
     if save:
-        parent_directory = '../app/data/'
-        team_stats_df.to_csv(parent_directory +
-                              'Team_Stats.csv',
-                              index=False)
+        with span('join.write'):
+            parent_directory = PARENT_DIRECTORY
+            team_stats_df.to_csv(parent_directory +
+                                  'Team_Stats.csv',
+                                  index=False)
     else:
         pass
     return team_stats_df
 
+def season_label(season):
+    """
+    Format a season as it appears in the SEASON column of every table.
+
+    Args:
+        season (int): Year in which the season ends (e.g. 2019).
+
+    Returns:
+        label (str): Season label (e.g. '2018-2019').
+    """
+    return '{0}-{1}'.format(season-1, season)
+
+def season_checksum(season_df):
+    """
+    Fingerprint the rows of one season of a table as written to .csv.
+
+    Args:
+        season_df (DataFrame): Rows of a single season.
+
+    Returns:
+        checksum (str): SHA-256 hex digest of the rows.
+    """
+    return hashlib.sha256(season_df.to_csv(index=False).encode('utf-8')).hexdigest()
+
+def table_checksums(table_df):
+    """
+    Fingerprint every season of a table.
+
+    Args:
+        table_df (DataFrame): Table with a SEASON column.
+
+    Returns:
+        checksums (dict): Season label to season_checksum of its rows.
+    """
+    return {label: season_checksum(season_df)
+            for label, season_df in table_df.groupby('SEASON', sort=False)}
+
+def read_table(path):
+    """
+    Read a table previously written to .csv, parsing floats exactly so that
+    writing unchanged rows back reproduces their text.
+
+    Args:
+        path (str): Path to the .csv file.
+
+    Returns:
+        df (DataFrame): Table as written.
+    """
+    return pd.read_csv(path, float_precision='round_trip')
+
+def upsert_seasons(existing_df, new_df):
+    """
+    Replace the rows of every season present in `new_df` within `existing_df`,
+    appending seasons that do not exist yet. Seasons stay in ascending order
+    and rows within a season keep their scraped order.
+
+    Args:
+        existing_df (DataFrame): Table previously written to .csv.
+        new_df (DataFrame): Freshly scraped rows for one or more seasons.
+
+    Returns:
+        upserted_df (DataFrame): Combined table.
+    """
+    kept_df = existing_df[~existing_df['SEASON'].isin(new_df['SEASON'].unique())]
+    upserted_df = pd.concat([kept_df, new_df], sort=False)
+    upserted_df = upserted_df.reindex(columns=new_df.columns if existing_df.empty else existing_df.columns)
+    return upserted_df.sort_values(by='SEASON', kind='mergesort').reset_index(drop=True)
+
+def load_manifest():
+    """
+    Read the scrape manifest holding the checksum of every season of every
+    table .csv file, plus the seasons changed by the last incremental scrape.
+
+    Args:
+        None
+
+    Returns:
+        manifest (dict): Manifest contents, empty if no manifest exists yet.
+    """
+    path = PARENT_DIRECTORY + MANIFEST_FILE
+    if not os.path.exists(path):
+        return {'tables': {}, 'changed': []}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(manifest):
+    """
+    Write the scrape manifest next to the table .csv files.
+
+    Args:
+        manifest (dict): Manifest contents.
+
+    Returns:
+        None
+    """
+    with open(PARENT_DIRECTORY + MANIFEST_FILE, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+def stale_seasons(table_df, checksums, seasons=SEASONS):
+    """
+    Determine which seasons of a table need to be scraped. A season is stale
+    if it has no rows, if its rows no longer match the checksum recorded in
+    the manifest, or if it is still in progress.
+
+    Args:
+        table_df (DataFrame): Table previously written to .csv.
+        checksums (dict): Season label to checksum recorded in the manifest.
+        seasons (iterable): Years in which the seasons to consider end.
+
+    Returns:
+        stale (list): Years in which the stale seasons end.
+    """
+    current = table_checksums(table_df) if len(table_df) else {}
+    stale = []
+    for season in seasons:
+        label = season_label(season)
+        if label not in current:
+            stale.append(int(season))
+        elif label in checksums and checksums[label] != current[label]:
+            stale.append(int(season))
+        elif not is_completed_season(season):
+            stale.append(int(season))
+    return stale
+
+@traced('scrape.tables')
+def scrape_tables(seasons=SEASONS):
+    """
+    Scrape only the seasons that are missing or stale in the table .csv files
+    and upsert their rows in place. Without existing .csv files this is
+    equivalent to a full scrape.
+
+    Args:
+        seasons (iterable): Years in which the seasons to consider end.
+                            Defaults to SEASONS.
+
+    Returns:
+        changed (list): Labels of the seasons whose rows changed. Also recorded
+        in the manifest so the analysis stage can rebuild only those seasons.
+    """
+    manifest = load_manifest()
+    tables = {}
+    to_scrape = set()
+    for file_name in TABLE_SCRAPERS:
+        path = PARENT_DIRECTORY + file_name
+        tables[file_name] = read_table(path) if os.path.exists(path) else pd.DataFrame(columns=['SEASON'])
+        checksums = manifest['tables'].get(file_name, {})
+        to_scrape.update(stale_seasons(tables[file_name], checksums, seasons))
+    to_scrape = sorted(to_scrape)
+    prefetch_seasons(to_scrape)
+
+    changed = set()
+    for file_name, scrape in TABLE_SCRAPERS.items():
+        previous = manifest['tables'].get(file_name, {})
+        if to_scrape:
+            with span('scrape.table', table=file_name, seasons=len(to_scrape)):
+                new_df = scrape(seasons=to_scrape)
+                tables[file_name] = upsert_seasons(tables[file_name], new_df)
+                tables[file_name].to_csv(PARENT_DIRECTORY + file_name, index=False)
+        # Checksum the .csv as read back so later comparisons see the same dtypes
+        checksums = table_checksums(pd.read_csv(PARENT_DIRECTORY + file_name))
+        changed.update(label for label, checksum in checksums.items()
+                       if previous.get(label) != checksum)
+        manifest['tables'][file_name] = checksums
+
+    manifest['changed'] = sorted(changed)
+    save_manifest(manifest)
+    return manifest['changed']
+
+def scrape_incremental(seasons=SEASONS):
+    """
+    Scrape missing or stale seasons with scrape_tables and rebuild the
+    matching Team_Stats.csv rows.
+
+    Args:
+        seasons (iterable): Years in which the seasons to consider end.
+                            Defaults to SEASONS.
+
+    Returns:
+        changed (list): Labels of the seasons whose rows changed.
+    """
+    changed = scrape_tables(seasons)
+    if changed:
+        create_team_base_table(save=True, seasons=changed)
+    return changed
+
+TABLE_SCRAPERS = {'Team_Ratings.csv': scrape_team_ratings,
+                  'Miscellaneous_Stats.csv': scrape_miscellaneous_stats,
+                  'Per_100_Poss.csv': scrape_per_100_possessions,
+                  'Opponent_Per_100_Poss.csv': scrape_opponent_per_100_possessions,
+                  'Team_Shooting.csv': scrape_team_shooting,
+                  'Opponent_Shooting.csv': scrape_opponent_shooting}
+
 if __name__=='__main__':
-    # Scrape Basketball-Reference Tables
-    scrape_per_100_possessions(save=True)
-    scrape_opponent_per_100_possessions(save=True)
-    scrape_team_shooting(save=True)
-    scrape_opponent_shooting(save=True)
-    scrape_miscellaneous_stats(save=True)
-    scrape_team_ratings(save=True)
-
-    # Join dataframes
-    create_team_base_table(save=True)
+    # Scrape missing or stale seasons of the Basketball-Reference Tables and
+    # rebuild the matching rows of the joined team base table
+    scrape_incremental()
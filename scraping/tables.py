@@ -0,0 +1,262 @@
+# Project: NBA Correlations App
+# Description: Extract Basketball-Reference tables into typed DataFrames with a single lxml parse
+# Data Sources: Basketball-Reference
+
+import re
+
+import numpy as np
+import pandas as pd
+from lxml import etree, html as lxml_html
+
+# Cell text treated as missing, as pd.read_html does by default
+NA_VALUES = {'', 'NA', 'N/A', 'NaN', 'nan', 'null', 'NULL', '#N/A'}
+# Whitespace normalization applied to cell text by pd.read_html
+WHITESPACE = re.compile(r'[\r\n]+|\s{2,}')
+THOUSANDS = re.compile(r'(?<=\d),(?=\d{3})')
+
+
+def _text(cell):
+    """Text of a cell with whitespace normalized as pd.read_html does."""
+    return WHITESPACE.sub(' ', cell.text_content().strip())
+
+
+def find_tables(page, table_ids):
+    """
+    Locate tables by id in a page, including tables Basketball-Reference
+    ships inside HTML comments after placeholder divs. The page is parsed
+    once; only comments that contain one of the requested ids are parsed
+    again, as the fragments they hold.
+
+    Args:
+        page (str): HTML of the page.
+        table_ids (list): Ids of the tables to find.
+
+    Returns:
+        tables (dict): Table id to lxml element for every id found, the
+        first occurrence of each.
+    """
+    document = lxml_html.document_fromstring(page)
+    tables = {}
+    for element in document.iter('table'):
+        if element.get('id') in table_ids and element.get('id') not in tables:
+            tables[element.get('id')] = element
+    for comment in document.iter(etree.Comment):
+        if len(tables) == len(table_ids):
+            break
+        text = comment.text or ''
+        if not any('id="{0}"'.format(table_id) in text for table_id in table_ids if table_id not in tables):
+            continue
+        for fragment in lxml_html.fragments_fromstring(text):
+            if isinstance(fragment, str):
+                continue
+            for element in fragment.iter('table'):
+                if element.get('id') in table_ids and element.get('id') not in tables:
+                    tables[element.get('id')] = element
+    return tables
+
+
+def _grid(rows):
+    """
+    Lay out rows of cells on a grid, repeating the text of cells that span
+    several columns or rows.
+
+    Args:
+        rows (list): lxml <tr> elements.
+
+    Returns:
+        grid (list): One list of cell texts per row.
+    """
+    grid = []
+    pending = {}
+    for row in rows:
+        texts = []
+        cells = iter(row.iterchildren('th', 'td'))
+        position = 0
+        while True:
+            if position in pending:
+                text, remaining = pending.pop(position)
+                texts.append(text)
+                if remaining > 1:
+                    pending[position] = (text, remaining - 1)
+                position += 1
+                continue
+            cell = next(cells, None)
+            if cell is None:
+                break
+            text = _text(cell)
+            rowspan = int(cell.get('rowspan') or 1)
+            for _ in range(int(cell.get('colspan') or 1)):
+                if rowspan > 1:
+                    pending[position] = (text, rowspan - 1)
+                texts.append(text)
+                position += 1
+        while pending and max(pending) >= position:
+            # Cells spanning down past the end of a shorter row
+            text, remaining = pending.pop(position)
+            texts.append(text)
+            if remaining > 1:
+                pending[position] = (text, remaining - 1)
+            position += 1
+        grid.append(texts)
+    return grid
+
+
+def column_names(header):
+    """
+    Flatten a multi-level header into one name per column: the column's
+    own name, prefixed by its over-header when it has one (e.g. 'Dunks #').
+
+    Args:
+        header (list): Rows of header texts from the top level down.
+
+    Returns:
+        names (list): Name of every column.
+    """
+    width = max(len(row) for row in header) if header else 0
+    names = []
+    for position in range(width):
+        levels = [row[position] for row in header if position < len(row) and row[position]]
+        # A cell spanning header rows repeats its text on every level
+        names.append(' '.join(level for i, level in enumerate(levels) if i == 0 or level != levels[i - 1]))
+    return names
+
+
+def typed_column(values):
+    """
+    Convert the texts of one column like pd.read_html: integers when every
+    value is an integer, floats when every value is numeric or missing,
+    otherwise text with missing values as NaN. Thousands separators are
+    ignored in numbers.
+
+    Args:
+        values (list): Cell texts.
+
+    Returns:
+        column (ndarray): Typed values.
+    """
+    missing = [value in NA_VALUES for value in values]
+    numbers = [THOUSANDS.sub('', value) for value in values]
+    if not any(missing):
+        try:
+            return np.array(numbers, dtype=np.int64)
+        except (ValueError, OverflowError):
+            pass
+    try:
+        return np.array(['nan' if is_missing else number for number, is_missing in zip(numbers, missing)],
+                        dtype=np.float64)
+    except ValueError:
+        return np.array([np.nan if is_missing else value for value, is_missing in zip(values, missing)],
+                        dtype=object)
+
+
+def table_frame(table):
+    """
+    Build a DataFrame straight from the cells of a table. Header rows (in
+    <thead>, or leading rows made only of <th> cells) are flattened with
+    column_names; columns with no header text at all, such as the blank
+    spacer columns between groups, are dropped.
+
+    Args:
+        table (Element): lxml <table> element.
+
+    Returns:
+        table_df (DataFrame): Typed columns in page order.
+    """
+    head_rows = [row for section in table.iterchildren('thead') for row in section.iterchildren('tr')]
+    body_rows = [row for section in table.iterchildren('tbody', 'tfoot') for row in section.iterchildren('tr')]
+    body_rows += list(table.iterchildren('tr'))
+    if not head_rows:
+        while body_rows and all(cell.tag == 'th' for cell in body_rows[0].iterchildren('th', 'td')):
+            head_rows.append(body_rows.pop(0))
+    names = column_names(_grid(head_rows))
+    body = _grid(body_rows)
+    width = max([len(names)] + [len(row) for row in body])
+    names += [''] * (width - len(names))
+    columns = {}
+    for position, name in enumerate(names):
+        if not name:
+            continue
+        if name in columns:
+            name = '{0}.{1}'.format(name, position)
+        columns[name] = typed_column([row[position] if position < len(row) else '' for row in body])
+    return pd.DataFrame(columns)
+
+
+def extract_tables(page, table_ids):
+    """
+    Extract tables by id from a page with one lxml parse.
+
+    Args:
+        page (str): HTML of the page.
+        table_ids (list): Ids of the tables to extract.
+
+    Returns:
+        tables (dict): Table id to DataFrame (see table_frame) for every id
+        found on the page.
+    """
+    return {table_id: table_frame(element) for table_id, element in find_tables(page, table_ids).items()}
+
+
+def read_html_tables(page, table_ids):
+    """
+    Extract tables the way the scraper did before extract_tables: parse the
+    placeholder comments with BeautifulSoup, prettify each table and read it
+    back with pd.read_html. Kept as the reference for compare_extraction.
+
+    Args:
+        page (str): HTML of the page.
+        table_ids (list): Ids of the tables to extract.
+
+    Returns:
+        tables (dict): Table id to the DataFrame pd.read_html returns.
+    """
+    from bs4 import BeautifulSoup as BS
+    soup = BS(page, 'html.parser')
+    placeholders = soup.find_all('div', {'class': 'placeholder'})
+    comments = ''.join(''.join(x.next_siblings) for x in placeholders)
+    tables = {}
+    for soup_part in (soup, BS(comments, 'html.parser')):
+        for tag in soup_part.find_all('table', attrs={'id': table_ids}):
+            if tag['id'] not in tables:
+                tables[tag['id']] = pd.read_html(tag.prettify())[0]
+    return tables
+
+
+def compare_extraction(page, table_ids):
+    """
+    Check that extract_tables reads the same values as read_html_tables.
+    Columns are compared by position. Whitespace is ignored in text, since
+    prettify separates the text of nested tags with line breaks.
+
+    Args:
+        page (str): HTML of the page.
+        table_ids (list): Ids of the tables to compare.
+
+    Returns:
+        mismatches (dict): Table id to a description of the difference;
+        empty when every table matches.
+    """
+    extracted, expected = extract_tables(page, table_ids), read_html_tables(page, table_ids)
+    mismatches = {}
+    for table_id in table_ids:
+        if (table_id in extracted) != (table_id in expected):
+            mismatches[table_id] = 'found by only one extractor'
+            continue
+        if table_id not in extracted:
+            continue
+        expected_df = expected[table_id]
+        if isinstance(expected_df.columns, pd.MultiIndex):
+            expected_df = expected_df.loc[:, [not str(name).startswith('Unnamed:') and name != ''
+                                              for name in expected_df.columns.get_level_values(-1)]]
+        frames = []
+        for df in (extracted[table_id], expected_df):
+            df = df.copy()
+            df.columns = range(df.shape[1])
+            for column in df.columns[df.dtypes == object]:
+                df[column] = df[column].str.replace(r'\s+', '', regex=True)
+            frames.append(df)
+        try:
+            pd.testing.assert_frame_equal(frames[0], frames[1], check_dtype=False)
+        except AssertionError as error:
+            mismatches[table_id] = str(error)
+    return mismatches
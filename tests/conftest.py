@@ -0,0 +1,10 @@
+# Project: NBA Correlations App
+# Description: Makes the pipeline, scraping, analysis and benchmark modules importable by the tests
+# Data Sources: Basketball-Reference
+
+import os
+import sys
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT_DIRECTORY] + [os.path.join(ROOT_DIRECTORY, directory)
+                                  for directory in ('scraping', 'analysis', 'benchmarks')]
@@ -0,0 +1,118 @@
+# Project: NBA Correlations App
+# Description: Record, replay and refresh modes of the scraper's response cache
+# Data Sources: Basketball-Reference
+
+import datetime
+import time
+
+import pytest
+
+from cache import CacheMissError, ResponseCache, is_completed_season
+
+COMPLETED_URL = 'https://www.basketball-reference.com/leagues/NBA_2019.html'
+CURRENT_URL = 'https://www.basketball-reference.com/leagues/NBA_{0}.html'.format(
+    datetime.date.today().year + 1)
+
+
+class FakeResponse(object):
+    """Stand-in for requests.Response with the attributes the cache reads."""
+    def __init__(self, text, status_code=200, headers=None):
+        self.text = text
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError('HTTP {0}'.format(self.status_code))
+
+
+class FakeFetch(object):
+    """Serves numbered page versions and records the headers of each request."""
+    def __init__(self, etag=None):
+        self.requests = []
+        self.etag = etag
+
+    def __call__(self, url, headers):
+        self.requests.append((url, dict(headers)))
+        if self.etag and headers.get('If-None-Match') == self.etag:
+            return FakeResponse('', 304)
+        headers = {'ETag': self.etag} if self.etag else {}
+        return FakeResponse('page {0}'.format(len(self.requests)), headers=headers)
+
+
+def test_record_serves_completed_seasons_from_disk(tmp_path):
+    fetch = FakeFetch()
+    cache = ResponseCache(fetch, str(tmp_path), ttl=0)
+    assert cache.get(COMPLETED_URL) == 'page 1'
+    assert cache.get(COMPLETED_URL) == 'page 1'
+    assert len(fetch.requests) == 1
+
+
+def test_record_refetches_stale_current_season(tmp_path):
+    fetch = FakeFetch()
+    assert ResponseCache(fetch, str(tmp_path)).get(CURRENT_URL) == 'page 1'
+    assert ResponseCache(fetch, str(tmp_path)).get(CURRENT_URL) == 'page 1'
+    assert ResponseCache(fetch, str(tmp_path), ttl=0).get(CURRENT_URL) == 'page 2'
+    assert len(fetch.requests) == 2
+
+
+def test_record_revalidates_stale_entries(tmp_path):
+    fetch = FakeFetch(etag='"v1"')
+    cache = ResponseCache(fetch, str(tmp_path), ttl=0)
+    assert cache.get(CURRENT_URL) == 'page 1'
+    body, meta = cache._read(CURRENT_URL)
+    assert cache.get(CURRENT_URL) == 'page 1'
+    assert fetch.requests[1][1] == {'If-None-Match': '"v1"'}
+    assert cache._read(CURRENT_URL)[1]['fetched_at'] >= meta['fetched_at']
+
+
+def test_replay_serves_recorded_pages_regardless_of_age(tmp_path):
+    ResponseCache(FakeFetch(), str(tmp_path)).get(CURRENT_URL)
+    fetch = FakeFetch()
+    cache = ResponseCache(fetch, str(tmp_path), mode='replay', ttl=0)
+    assert cache.get(CURRENT_URL) == 'page 1'
+    assert fetch.requests == []
+
+
+def test_replay_raises_on_unrecorded_pages(tmp_path):
+    fetch = FakeFetch()
+    cache = ResponseCache(fetch, str(tmp_path), mode='replay')
+    with pytest.raises(CacheMissError):
+        cache.get(COMPLETED_URL)
+    assert fetch.requests == []
+
+
+def test_refresh_overwrites_recorded_pages(tmp_path):
+    fetch = FakeFetch()
+    ResponseCache(fetch, str(tmp_path)).get(COMPLETED_URL)
+    assert ResponseCache(fetch, str(tmp_path), mode='refresh').get(COMPLETED_URL) == 'page 2'
+    assert fetch.requests[1][1] == {}
+    assert ResponseCache(FakeFetch(), str(tmp_path), mode='replay').get(COMPLETED_URL) == 'page 2'
+
+
+def test_off_bypasses_the_cache(tmp_path):
+    fetch = FakeFetch()
+    cache = ResponseCache(fetch, str(tmp_path), mode='off')
+    assert cache.get(COMPLETED_URL) == 'page 1'
+    assert cache.get(COMPLETED_URL) == 'page 2'
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ResponseCache(FakeFetch(), str(tmp_path), mode='memory')
+
+
+def test_seasons_complete_in_july():
+    assert not is_completed_season(2019, datetime.date(2019, 6, 30))
+    assert is_completed_season(2019, datetime.date(2019, 7, 1))
+    assert is_completed_season(2018, datetime.date(2019, 1, 1))
+    assert not is_completed_season(2020, datetime.date(2019, 12, 31))
+
+
+def test_fresh_entries_expire_after_ttl(tmp_path):
+    cache = ResponseCache(FakeFetch(), str(tmp_path), ttl=60)
+    now = time.time()
+    assert cache.is_fresh({'url': CURRENT_URL, 'fetched_at': now - 59}, now)
+    assert not cache.is_fresh({'url': CURRENT_URL, 'fetched_at': now - 61}, now)
+    assert cache.is_fresh({'url': COMPLETED_URL, 'fetched_at': 0}, now)
@@ -0,0 +1,220 @@
+# Project: NBA Correlations App
+# Description: Equivalence of the vectorized correlation engine with pandas
+# Data Sources: Basketball-Reference
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation_engine import (METHODS, adjusted_correlation_matrices, correlation_blocks, correlation_frames,
+                                correlation_matrices, group_sums, grouped_adjusted_correlations,
+                                grouped_target_correlations, lagged_cross_correlations, rank_columns,
+                                rebase_sums, sums_correlations, window_sums)
+
+TEAM_STATS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'correlation_app', 'data', 'Team_Stats.csv')
+TOLERANCE = 1e-12
+
+
+def assert_matches(actual, expected, tolerance=TOLERANCE):
+    """Same NaN positions and values within `tolerance` elsewhere."""
+    actual, expected = np.asarray(actual), np.asarray(expected)
+    np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected))
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=tolerance)
+
+
+@pytest.fixture
+def values():
+    """
+    Observations with ties, a constant column and missing values whose
+    masks differ between columns, including a half-missing column.
+    """
+    rng = np.random.default_rng(0)
+    n = 80
+    values = rng.normal(size=(n, 8))
+    values[:, 2] = np.round(values[:, 2] * 2) / 2
+    values[:, 3] = 1.5
+    values[:, 7] = np.round(values[:, 0] + rng.normal(size=n) * 0.5)
+    for j in (4, 5, 6, 7):
+        values[rng.random(n) < 0.2, j] = np.nan
+    values[:3, 5] = np.nan
+    values[values[:, 6] > 0, 6] = np.nan
+    return values
+
+
+@pytest.fixture(scope='module')
+def team_stats():
+    """Numeric columns of the committed Team_Stats.csv."""
+    return pd.read_csv(TEAM_STATS, float_precision='round_trip').select_dtypes(include=[np.number])
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_matrices_match_pandas(values, method):
+    assert_matches(correlation_matrices(values, [method])[method], pd.DataFrame(values).corr(method))
+
+
+@pytest.mark.parametrize('method', METHODS)
+@pytest.mark.parametrize('min_periods', [1, 30, 60])
+def test_min_periods_match_pandas(values, method, min_periods):
+    assert_matches(correlation_matrices(values, [method], min_periods=min_periods)[method],
+                   pd.DataFrame(values).corr(method, min_periods=min_periods))
+
+
+def test_constant_columns_have_no_correlation(values):
+    for matrix in correlation_matrices(values).values():
+        assert np.isnan(matrix[3]).all() and np.isnan(matrix[:, 3]).all()
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_float32_products_match_pandas_to_single_precision(values, method):
+    assert_matches(correlation_matrices(values, [method], dtype=np.float32)[method],
+                   pd.DataFrame(values).corr(method), tolerance=1e-6)
+
+
+def test_column_level_ranks_match_pandas_on_complete_pairs(values):
+    matrix = correlation_matrices(values, ['spearman'], common_rows=False)['spearman']
+    expected = pd.DataFrame(values).corr('spearman').values
+    complete = [0, 1, 2, 3]
+    assert_matches(matrix[np.ix_(complete, complete)], expected[np.ix_(complete, complete)])
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_team_stats_match_pandas(team_stats, method):
+    assert_matches(correlation_frames(team_stats, [method])[method], team_stats.corr(method))
+
+
+def test_ranks_match_pandas(values):
+    assert_matches(rank_columns(values), pd.DataFrame(values).rank())
+
+
+def test_group_ranks_match_pandas(values):
+    groups = np.arange(len(values)) % 3
+    assert_matches(rank_columns(values, groups), pd.DataFrame(values).groupby(groups).rank())
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_blocks_match_pandas(values, method):
+    blocks = [block for _, block in correlation_blocks(values, method, block_size=3)]
+    assert_matches(np.concatenate(blocks), pd.DataFrame(values).corr(method))
+
+
+def test_frames_use_numeric_columns_only(values):
+    df = pd.DataFrame(values, columns=list('abcdefgh'))
+    df.insert(0, 'TEAM', 'Boston Celtics')
+    frame = correlation_frames(df, ['pearson'])['pearson']
+    pd.testing.assert_frame_equal(frame, df.corr(numeric_only=True), rtol=0, atol=TOLERANCE)
+
+
+def test_unknown_method_is_rejected(values):
+    with pytest.raises(ValueError):
+        correlation_matrices(values, ['kendall'])
+
+
+@pytest.mark.parametrize('method', METHODS)
+@pytest.mark.parametrize('min_periods', [1, 15])
+def test_grouped_target_correlations_match_pandas(values, method, min_periods):
+    groups = np.array(['2018-2019', '2016-2017', '2017-2018', '2016-2017'] * 20)
+    targets = [0, 7, 5]
+    labels, correlations = grouped_target_correlations(values, groups, targets, [method], min_periods)
+    assert list(labels) == ['2016-2017', '2017-2018', '2018-2019']
+    for k, label in enumerate(labels):
+        expected = pd.DataFrame(values[groups == label]).corr(method, min_periods=min_periods).values
+        assert_matches(correlations[method][k], expected[targets])
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_lagged_cross_correlations_match_pandas(values, method):
+    # 16 teams over 5 seasons, one team missing the middle season
+    entities = np.repeat(np.arange(16), 5)
+    periods = np.tile(['2015', '2016', '2017', '2018', '2019'], 16)
+    kept = ~((entities == 3) & (periods == '2017'))
+    values, entities, periods = values[kept], entities[kept], periods[kept]
+    df = pd.DataFrame(values).assign(TEAM=entities, SEASON=periods.astype(int))
+    correlations, counts = lagged_cross_correlations(values, entities, periods, [1, 2, 5], [method])
+    for l, lag in enumerate([1, 2]):
+        later = df.assign(SEASON=df['SEASON'] - lag)
+        paired = df.merge(later, on=['TEAM', 'SEASON'], suffixes=('', '_later'))
+        expected = paired.drop(columns=['TEAM', 'SEASON']).corr(method).values
+        assert counts[l] == len(paired)
+        assert_matches(correlations[method][l], expected[:values.shape[1], values.shape[1]:])
+    assert counts[2] == 0 and np.isnan(correlations[method][2]).all()
+
+
+def residuals_frame(df, controls):
+    """Residuals of each column regressed with an intercept on `controls`, over its own complete rows."""
+    residuals = pd.DataFrame(np.nan, index=df.index, columns=df.columns)
+    for column in df.columns.drop(controls):
+        rows = df[[column] + controls].dropna()
+        if len(rows):
+            design = np.column_stack([np.ones(len(rows)), rows[controls].values])
+            coefficients = np.linalg.lstsq(design, rows[column].values, rcond=None)[0]
+            residuals.loc[rows.index, column] = rows[column].values - np.dot(design, coefficients)
+    return residuals
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_controlled_correlations_match_pandas(values, method):
+    df = pd.DataFrame(values)
+    data = df.rank() if method == 'spearman' else df
+    matrix = adjusted_correlation_matrices(values, [method], controls=[0, 2])[method]
+    assert_matches(matrix, residuals_frame(data, [0, 2]).corr())
+
+
+def test_partial_correlations_match_residual_correlations(values):
+    # Without shrinkage, the partial correlation of two statistics given all
+    # others is the correlation of their residuals on the others
+    complete = values[:, [0, 1, 2, 7]]
+    complete = complete[~np.isnan(complete).any(axis=1)]
+    partial = adjusted_correlation_matrices(complete, ['pearson'], partial=True, shrinkage=0)['pearson']
+    df = pd.DataFrame(complete)
+    for i, j in [(0, 1), (0, 3), (1, 2), (2, 3)]:
+        others = [k for k in df.columns if k not in (i, j)]
+        expected = residuals_frame(df, others)[[i, j]].corr().iloc[0, 1]
+        assert partial[i, j] == pytest.approx(expected, abs=TOLERANCE)
+
+
+def test_partial_correlations_skip_constant_statistics(values):
+    partial = adjusted_correlation_matrices(values, partial=True)
+    for matrix in partial.values():
+        assert np.isnan(matrix[3]).all() and np.isnan(matrix[:, 3]).all()
+        assert not np.isnan(np.delete(np.delete(matrix, 3, axis=0), 3, axis=1)).any()
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_grouped_controlled_correlations_match_pandas(values, method):
+    groups = np.arange(len(values)) % 2
+    labels, correlations = grouped_adjusted_correlations(values, groups, [1, 7], [method], controls=[0])
+    for k in labels:
+        df = pd.DataFrame(values[groups == k])
+        data = df.rank() if method == 'spearman' else df
+        assert_matches(correlations[method][k], residuals_frame(data, [0]).corr().values[[1, 7]])
+
+
+@pytest.mark.parametrize('window', [None, 1, 3, 5])
+def test_window_correlations_match_pandas(values, window):
+    groups = np.arange(len(values)) // 16
+    targets = [0, 7]
+    labels, sums, references = group_sums(values, groups, targets)
+    combined = rebase_sums(sums, references, targets, references.mean(axis=0))
+    windows = sums_correlations(window_sums(combined, window))
+    assert len(windows) == (len(labels) if window is None else len(labels) - window + 1)
+    for w, last in enumerate(labels[len(labels) - len(windows):]):
+        first = labels[0] if window is None else last - window + 1
+        rows = (groups >= first) & (groups <= last)
+        expected = pd.DataFrame(values[rows]).corr().values[targets]
+        assert_matches(windows[w], expected)
+
+
+def test_rebased_sums_equal_sums_about_the_reference(values):
+    groups = np.arange(len(values)) % 4
+    reference = np.nanmedian(values, axis=0)
+    _, sums, references = group_sums(values, groups, [0, 5])
+    np.testing.assert_allclose(rebase_sums(sums, references, [0, 5], reference),
+                               group_sums(values, groups, [0, 5], reference)[1], rtol=1e-12, atol=1e-10)
+
+
+def test_windows_longer_than_the_groups_are_empty(values):
+    _, sums, _ = group_sums(values, np.zeros(len(values)), [0])
+    assert window_sums(sums, 2).shape == (0,) + sums.shape[1:]
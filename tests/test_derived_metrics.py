@@ -0,0 +1,175 @@
+# Project: NBA Correlations App
+# Description: Derived metric formulas, pattern expansion and memoization
+# Data Sources: Basketball-Reference
+
+import glob
+import os
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import derived_metrics
+from derived_metrics import DerivedMetric, compile_metrics, evaluate_metrics, required_metrics
+
+TEAM_STATS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'correlation_app', 'data', 'Team_Stats.csv')
+PER100_STATISTICS = ['FG', 'FGA', 'FG%', '3P', '3PA', '3P%', '2P', '2PA', '2P%', 'FT', 'FTA', 'FT%',
+                     'ORB', 'DRB', 'TRB', 'AST', 'STL', 'BLK', 'TOV', 'PF', 'PTS']
+
+
+@pytest.fixture
+def memo():
+    """Empty in-memory memo, restored afterwards."""
+    saved = derived_metrics._memo.copy(), dict(derived_metrics._entries)
+    derived_metrics._memo.clear()
+    derived_metrics._entries.clear()
+    yield derived_metrics._memo
+    derived_metrics._memo.clear()
+    derived_metrics._memo.update(saved[0])
+    derived_metrics._entries.clear()
+    derived_metrics._entries.update(saved[1])
+
+
+def _memoize_concurrently(task):
+    directory, keys = task
+    for _ in range(20):
+        for key in keys:
+            derived_metrics._memoize(key, np.arange(1000, dtype=np.float64) * len(key), directory)
+    return True
+
+
+def test_parallel_writers_of_the_same_results_do_not_fail(tmp_path):
+    # Parallel stages starting from an empty cache all write the same keys
+    directory = str(tmp_path / 'derived')
+    keys = ['{0:064x}'.format(key) for key in range(8)]
+    with get_context('fork').Pool(6) as pool:
+        assert all(pool.map(_memoize_concurrently, [(directory, keys)] * 12))
+    assert sorted(os.path.basename(path)[:-4] for path in glob.glob(os.path.join(directory, '*.npy'))) == keys
+    assert not glob.glob(os.path.join(directory, '*.tmp'))
+    derived_metrics._memo.clear()
+    np.testing.assert_array_equal(derived_metrics._memoized(keys[0], directory), np.arange(1000) * 64.0)
+
+
+def test_parallel_pruning_keeps_the_cap(tmp_path, monkeypatch):
+    monkeypatch.setattr(derived_metrics, 'MEMO_SIZE', 4)
+    directory = str(tmp_path / 'derived')
+    tasks = [(directory, ['{0:02d}{1:062x}'.format(worker, key) for key in range(6)]) for worker in range(6)]
+    with get_context('fork').Pool(6) as pool:
+        assert all(pool.map(_memoize_concurrently, tasks))
+    # The next write past the cap prunes whatever the workers left behind
+    derived_metrics._memoize('{0:064x}'.format(99), np.zeros(3), directory)
+    assert len(glob.glob(os.path.join(directory, '*.npy'))) == 4
+    assert not glob.glob(os.path.join(directory, '*.tmp'))
+
+
+@pytest.mark.parametrize('formula', [
+    'PER100_PTS.real',
+    '__import__("os")',
+    'open("Team_Stats.csv")',
+    'np.sqrt(PER100_PTS)',
+    '(lambda x: x)(PER100_PTS)',
+    'PER100_PTS[0]',
+    '[PER100_PTS]',
+    'PER100_PTS if PER100_FG else 0',
+    'PER100_PTS // 2',
+    'PER100_PTS and PER100_FG',
+    'PER100_PTS +',
+])
+def test_disallowed_formulas_are_rejected(formula):
+    with pytest.raises(ValueError):
+        DerivedMetric('METRIC', formula)
+
+
+def test_formulas_evaluate_elementwise():
+    metric = DerivedMetric('METRIC', 'where(`W/L%` > 0.5, sqrt(abs(-W)) / L, maximum(W, 2) ** 2)')
+    assert sorted(metric.inputs) == ['L', 'W', 'W/L%']
+    columns = {'W/L%': np.array([0.6, 0.5, 1.0]), 'W': np.array([49.0, 1.0, 81.0]), 'L': np.array([33.0, 1.0, 0.0])}
+    # Division by zero is missing rather than infinite
+    np.testing.assert_array_equal(metric.evaluate(columns), [np.sqrt(49.0) / 33.0, 4.0, np.nan])
+    np.testing.assert_array_equal(DerivedMetric('ONE', '1').evaluate(columns), [1.0, 1.0, 1.0])
+
+
+def test_spacing_does_not_change_the_formula():
+    assert DerivedMetric('A', 'W/(W+L)').canonical == DerivedMetric('B', ' W / ( W + L ) ').canonical
+
+
+def test_patterns_match_hand_written_differentials():
+    df = pd.read_csv(TEAM_STATS, float_precision='round_trip')
+    metrics = [metric for metric in compile_metrics(list(df.columns)) if metric.name.startswith('PER100_DIFF_')]
+    assert [metric.name for metric in metrics] == ['PER100_DIFF_' + statistic for statistic in PER100_STATISTICS]
+    assert not any(metric.representative for metric in metrics)
+    derived_df = evaluate_metrics(df, metrics, directory=None)
+    for statistic in PER100_STATISTICS:
+        pd.testing.assert_series_equal(derived_df['PER100_DIFF_' + statistic],
+                                       df['PER100_' + statistic] - df['OPP_PER100_' + statistic],
+                                       check_names=False)
+
+
+def test_patterns_skip_columns_without_every_input():
+    definitions = [{'name': 'DIFF_{0}', 'match': 'PER100_(.+)', 'formula': '`PER100_{0}` - `OPP_PER100_{0}`',
+                    'description': 'Differential of {0}'}]
+    metrics = compile_metrics(['PER100_AST', 'OPP_PER100_AST', 'PER100_STL'], definitions)
+    assert [(metric.name, metric.formula, metric.description) for metric in metrics] == \
+        [('DIFF_AST', '`PER100_AST` - `OPP_PER100_AST`', 'Differential of AST')]
+
+
+@pytest.mark.parametrize('definitions', [
+    [{'name': 'A', 'formula': 'B + 1'}, {'name': 'B', 'formula': 'A + 1'}],
+    [{'name': 'A', 'formula': 'MISSING + 1'}],
+    [{'name': 'W', 'formula': 'L + 1'}],
+    [{'name': 'A', 'formula': 'W'}, {'name': 'A', 'formula': 'L'}],
+])
+def test_invalid_definitions_are_rejected(definitions):
+    with pytest.raises(ValueError):
+        compile_metrics(['W', 'L'], definitions)
+
+
+def test_required_metrics_follow_dependencies():
+    definitions = [{'name': 'DIFFERENTIAL', 'formula': 'WIN_RATE - LOSS_RATE'},
+                   {'name': 'WIN_RATE', 'formula': 'W / GAMES'},
+                   {'name': 'LOSS_RATE', 'formula': 'L / GAMES'},
+                   {'name': 'GAMES', 'formula': 'W + L'},
+                   {'name': 'MARGIN', 'formula': 'MOV'}]
+    metrics = compile_metrics(['TEAM', 'W', 'L', 'MOV'], definitions)
+    stored, needed = required_metrics(metrics, ['TEAM', 'DIFFERENTIAL'])
+    assert stored == ['TEAM', 'W', 'L']
+    names = [metric.name for metric in needed]
+    assert sorted(names) == ['DIFFERENTIAL', 'GAMES', 'LOSS_RATE', 'WIN_RATE']
+    # Each metric follows the metrics it uses
+    assert names.index('GAMES') < names.index('WIN_RATE') < names.index('DIFFERENTIAL')
+    assert names.index('LOSS_RATE') < names.index('DIFFERENTIAL')
+
+
+def test_memo_follows_input_values(memo, tmp_path, monkeypatch):
+    directory = str(tmp_path / 'derived')
+    metrics = compile_metrics(['W', 'L'], [{'name': 'WIN_RATE', 'formula': 'W / (W + L)'}])
+    evaluations = []
+    evaluate = DerivedMetric.evaluate
+    monkeypatch.setattr(DerivedMetric, 'evaluate', lambda self, columns: evaluations.append(self.name) or
+                        evaluate(self, columns))
+    df = pd.DataFrame({'W': [49.0, 41.0], 'L': [33.0, 41.0]})
+    np.testing.assert_array_equal(evaluate_metrics(df, metrics, directory)['WIN_RATE'], [49 / 82, 0.5])
+    evaluate_metrics(df, metrics, directory)
+    memo.clear()
+    evaluate_metrics(df.copy(), metrics, directory)
+    assert len(evaluations) == 1
+
+    # A changed input value is a new key; the previous result is kept
+    changed = df.assign(W=[50.0, 41.0])
+    np.testing.assert_array_equal(evaluate_metrics(changed, metrics, directory)['WIN_RATE'], [50 / 83, 0.5])
+    assert len(evaluations) == 2
+    assert len(glob.glob(os.path.join(directory, '*.npy'))) == 2
+    np.testing.assert_array_equal(evaluate_metrics(df, metrics, directory)['WIN_RATE'], [49 / 82, 0.5])
+    assert len(evaluations) == 2
+
+
+def test_memo_is_capped(memo, tmp_path, monkeypatch):
+    monkeypatch.setattr(derived_metrics, 'MEMO_SIZE', 3)
+    directory = str(tmp_path / 'derived')
+    metrics = compile_metrics(['W'], [{'name': 'DOUBLE', 'formula': '2 * W'}])
+    for wins in range(6):
+        evaluate_metrics(pd.DataFrame({'W': [float(wins)]}), metrics, directory)
+    assert len(memo) == 3
+    assert len(glob.glob(os.path.join(directory, '*.npy'))) == 3
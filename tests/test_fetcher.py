@@ -0,0 +1,149 @@
+# Project: NBA Correlations App
+# Description: Rate limiting, retries and connection reuse of the fetcher against a local stand-in server
+# Data Sources: Basketball-Reference
+
+import socket
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import fetcher
+from fetcher import Fetcher, TokenBucket
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves /ok with a 200, and /fail/<status>/<times>[/<retry_after>] with
+    `status` for the first `times` requests to that path and a 200 after.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.client_address[1]))
+            server.hits[self.path] += 1
+            hits = server.hits[self.path]
+        parts = self.path.strip('/').split('/')
+        status, headers = 200, {}
+        if parts[0] == 'fail' and hits <= int(parts[2]):
+            status = int(parts[1])
+            if len(parts) > 3:
+                headers['Retry-After'] = parts[3]
+        body = '{0} {1}'.format(self.path, hits).encode('utf-8')
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """Stand-in Basketball-Reference server on a free local port."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = []
+    server.hits = Counter()
+    server.url = 'http://127.0.0.1:{0}'.format(server.server_address[1])
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays requested by the fetcher, without waiting for them."""
+    delays = []
+    monkeypatch.setattr(fetcher.time, 'sleep', delays.append)
+    return delays
+
+
+def test_retryable_statuses_are_retried_with_backoff(server, sleeps):
+    client = Fetcher(rate=1000, backoff=0.5)
+    response = client.get(server.url + '/fail/503/3')
+    assert response.status_code == 200
+    assert server.hits['/fail/503/3'] == 4
+    assert len(sleeps) == 3
+    for attempt, delay in enumerate(sleeps):
+        assert 0.5 * 2 ** attempt <= delay <= 0.5 * 2 ** attempt + 0.5
+
+
+@pytest.mark.parametrize('status', fetcher.RETRY_STATUSES)
+def test_every_retry_status_is_retried(server, sleeps, status):
+    path = '/fail/{0}/1'.format(status)
+    assert Fetcher(rate=1000, backoff=0.01).get(server.url + path).status_code == 200
+    assert server.hits[path] == 2
+
+
+def test_retry_after_overrides_backoff(server, sleeps):
+    client = Fetcher(rate=1000, backoff=0.5)
+    assert client.get(server.url + '/fail/429/2/7').status_code == 200
+    assert sleeps == [7.0, 7.0]
+
+
+def test_exhausted_retries_return_the_last_response(server, sleeps):
+    client = Fetcher(rate=1000, max_retries=2, backoff=0.01)
+    assert client.get(server.url + '/fail/500/5').status_code == 500
+    assert server.hits['/fail/500/5'] == 3
+
+
+def test_other_errors_are_not_retried(server, sleeps):
+    assert Fetcher(rate=1000).get(server.url + '/fail/404/5').status_code == 404
+    assert server.hits['/fail/404/5'] == 1
+    assert sleeps == []
+
+
+def test_connection_errors_are_retried_then_raised(sleeps):
+    with socket.socket() as closed:
+        closed.bind(('127.0.0.1', 0))
+        url = 'http://127.0.0.1:{0}/ok'.format(closed.getsockname()[1])
+    with pytest.raises(requests.ConnectionError):
+        Fetcher(rate=1000, max_retries=2, backoff=0.01, timeout=1).get(url)
+    assert len(sleeps) == 2
+
+
+def test_token_bucket_spaces_requests_at_the_rate():
+    now = [0.0]
+    acquired = []
+    bucket = TokenBucket(rate=2, capacity=3, clock=lambda: now[0],
+                         sleep=lambda seconds: now.__setitem__(0, now[0] + seconds))
+    for _ in range(7):
+        bucket.acquire()
+        acquired.append(now[0])
+    # The burst is served immediately, then one token every 1 / rate seconds
+    assert acquired == pytest.approx([0, 0, 0, 0.5, 1.0, 1.5, 2.0])
+
+
+def test_fetcher_rate_is_shared_by_every_worker(server):
+    client = Fetcher(rate=20, burst=1, max_workers=4)
+    started = time.monotonic()
+    responses = client.map(client.get, [server.url + '/ok'] * 9)
+    assert [response.status_code for response in responses] == [200] * 9
+    # The first request is free, the other eight wait 1 / 20 s each
+    assert time.monotonic() - started >= 8 / 20 - 0.01
+
+
+def test_sequential_requests_reuse_one_connection(server):
+    client = Fetcher(rate=1000)
+    for _ in range(5):
+        assert client.get(server.url + '/ok').status_code == 200
+    assert len({port for _, port in server.requests}) == 1
+
+
+def test_workers_share_a_bounded_connection_pool(server):
+    client = Fetcher(rate=1000, max_workers=3)
+    client.map(client.get, [server.url + '/ok'] * 30)
+    assert len(server.requests) == 30
+    assert len({port for _, port in server.requests}) <= 3
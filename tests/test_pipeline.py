@@ -0,0 +1,77 @@
+# Project: NBA Correlations App
+# Description: Pipeline state shared by concurrent pipeline invocations
+# Data Sources: Basketball-Reference
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+from multiprocessing import get_context
+
+import pandas as pd
+
+import instrumentation
+import pipeline
+
+# Stages that rebuild only the changed seasons, and their season outputs
+INCREMENTAL_STAGES = ['lags', 'season-correlations', 'window-correlations']
+INCREMENTAL_OUTPUTS = ['Basketball_Reference_Season_Lags.csv', 'Basketball_Reference_Season_Correlations.csv',
+                       'Basketball_Reference_Window_Correlations.csv']
+
+
+def _save_state(task):
+    directory, run = task
+    for step in range(50):
+        pipeline.save_state({'join': {'run': run, 'step': step}}, directory)
+        instrumentation.write_report({'run': run, 'step': step}, os.path.join(directory, pipeline.REPORT_FILE))
+    return True
+
+
+def test_concurrent_runs_write_whole_state_and_report_files(tmp_path):
+    with get_context('fork').Pool(4) as pool:
+        assert all(pool.map(_save_state, [(str(tmp_path), run) for run in range(8)]))
+    assert pipeline.load_state(str(tmp_path))['join']['step'] == 49
+    with open(tmp_path / pipeline.REPORT_FILE) as f:
+        assert json.load(f)['step'] == 49
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_scraping_stages_depend_on_every_scraping_module():
+    modules = sorted('scraping/' + name for name in os.listdir(os.path.join(os.path.dirname(pipeline.__file__),
+                                                                             'scraping'))
+                     if name.endswith('.py'))
+    for name in ('scrape', 'join'):
+        assert sorted(pipeline.STAGES_BY_NAME[name].code) == modules
+
+
+def _copy_tree(tmp_path):
+    """Copy of the code and data, without stored columnar tables or pipeline state."""
+    root = os.path.dirname(os.path.abspath(pipeline.__file__))
+    tree = tmp_path / 'package'
+    for directory in ('scraping', 'analysis'):
+        shutil.copytree(os.path.join(root, directory), tree / directory,
+                        ignore=shutil.ignore_patterns('__pycache__'))
+    shutil.copytree(os.path.join(root, 'correlation_app', 'data'), tree / 'correlation_app' / 'data',
+                    ignore=shutil.ignore_patterns('columnar', pipeline.STATE_FILE, pipeline.REPORT_FILE))
+    shutil.copy(os.path.join(root, 'pipeline.py'), tree)
+    return tree
+
+
+def _run(tree, *arguments):
+    subprocess.run([sys.executable, 'pipeline.py', '--workers', '1'] + list(INCREMENTAL_STAGES) + list(arguments),
+                   cwd=str(tree), check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def test_incremental_outputs_equal_a_full_rebuild(tmp_path):
+    tree = _copy_tree(tmp_path)
+    data = tree / 'correlation_app' / 'data'
+    _run(tree)
+    team_stats = pd.read_csv(data / 'Team_Stats.csv', float_precision='round_trip')
+    team_stats.loc[team_stats['SEASON'] == '2010-2011', 'PACE'] += 0.5
+    team_stats.to_csv(data / 'Team_Stats.csv', index=False)
+    _run(tree)
+    incremental = {name: (data / name).read_bytes() for name in INCREMENTAL_OUTPUTS}
+    _run(tree, '--force')
+    for name in INCREMENTAL_OUTPUTS:
+        assert (data / name).read_bytes() == incremental[name], name
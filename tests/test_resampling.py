@@ -0,0 +1,85 @@
+# Project: NBA Correlations App
+# Description: Equivalence of the batched bootstrap and permutation correlations with pandas
+# Data Sources: Basketball-Reference
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation_engine import METHODS
+from resampling import (_bootstrap_batch, _bootstrap_ranks, _permutation_batch, paired_correlations,
+                        resampled_correlations)
+from test_correlation_engine import assert_matches, values
+
+TARGETS = [0, 7, 5]
+
+
+def pandas_block(x, y, method='pearson'):
+    """DataFrame.corr of every column of `x` with every column of `y`."""
+    corr = pd.concat([pd.DataFrame(x), pd.DataFrame(y)], axis=1, ignore_index=True).corr(method).values
+    return corr[:x.shape[1], x.shape[1]:]
+
+
+@pytest.mark.parametrize('missing', [False, True])
+def test_paired_correlations_match_pandas(values, missing):
+    if not missing:
+        values = values[:, :4]
+    rng = np.random.default_rng(1)
+    indices = rng.integers(0, len(values), size=(5, len(values)))
+    samples = values[indices]
+    corr = paired_correlations(samples[:, :, :2], samples)
+    for b, sample in enumerate(samples):
+        assert_matches(corr[b], pandas_block(sample[:, :2], sample))
+
+
+def test_one_sample_is_broadcast(values):
+    permuted = values[np.random.default_rng(1).permutation(len(values))]
+    corr = paired_correlations(np.stack([permuted, values]), values[None])
+    assert_matches(corr[0], pandas_block(permuted, values))
+    assert_matches(corr[1], pandas_block(values, values))
+
+
+def test_bootstrap_ranks_match_pandas(values):
+    indices = np.random.default_rng(2).integers(0, len(values), size=(6, len(values)))
+    ranks = _bootstrap_ranks(values, indices)
+    for b, rows in enumerate(indices):
+        assert_matches(ranks[b], pd.DataFrame(values[rows]).rank())
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_bootstrap_estimates_match_pandas(values, method):
+    seed = np.random.SeedSequence(3)
+    estimates = _bootstrap_batch(values, TARGETS, [method], seed, 8, 1)[method]
+    indices = np.random.default_rng(seed).integers(0, len(values), size=(8, len(values)))
+    for b, rows in enumerate(indices):
+        # Spearman ranks the whole resample, including rows where the pair's
+        # other statistic is missing, like the engine's column-level ranks
+        sample = pd.DataFrame(values[rows])
+        sample = sample.rank() if method == 'spearman' else sample
+        expected = sample.corr().values[TARGETS]
+        # Estimates are stored as float32
+        assert_matches(estimates[b], expected, tolerance=1e-6)
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_permutation_exceedances_match_pandas(values, method):
+    seed = np.random.SeedSequence(4)
+    exceedances = _permutation_batch(values, TARGETS, [method], seed, 12, 1)[method]
+    df = pd.DataFrame(values)
+    df = df.rank() if method == 'spearman' else df
+    observed = df.corr().values[TARGETS]
+    indices = np.argsort(np.random.default_rng(seed).random((12, len(values))), axis=1)
+    expected = np.zeros(observed.shape)
+    for rows in indices:
+        permuted = pandas_block(df.values[rows][:, TARGETS], df.values)
+        expected += np.abs(permuted) >= np.abs(observed) - 1e-12
+    assert_matches(exceedances, np.where(np.isnan(observed), np.nan, expected))
+
+
+def test_results_do_not_depend_on_workers(values):
+    groups = np.arange(len(values)) % 2
+    serial = resampled_correlations(values, TARGETS, groups, resamples=30, batch_size=8, workers=1)
+    parallel = resampled_correlations(values, TARGETS, groups, resamples=30, batch_size=8, workers=2)
+    for method in METHODS:
+        for name, result in serial[1][method].items():
+            assert_matches(parallel[1][method][name], result, tolerance=0)
@@ -0,0 +1,72 @@
+# Project: NBA Correlations App
+# Description: Joining the scraped tables into Team_Stats.csv
+# Data Sources: Basketball-Reference
+
+import datetime
+import shutil
+
+import pytest
+
+import scraper
+from cache import ResponseCache
+from test_cache import FakeResponse
+
+
+@pytest.fixture
+def data_directory(tmp_path, monkeypatch):
+    """Copy of the scraped source tables and Team_Stats.csv the scraper writes to."""
+    for file_name in list(scraper.SOURCE_COLUMNS) + ['Team_Stats.csv']:
+        shutil.copy(scraper.PARENT_DIRECTORY + file_name, tmp_path / file_name)
+    monkeypatch.setattr(scraper, 'PARENT_DIRECTORY', str(tmp_path) + '/')
+    return tmp_path
+
+
+def test_rejoining_reproduces_team_stats(data_directory):
+    committed = (data_directory / 'Team_Stats.csv').read_bytes()
+    scraper.create_team_base_table(save=True)
+    assert (data_directory / 'Team_Stats.csv').read_bytes() == committed
+
+
+def test_incremental_join_equals_full_join(data_directory):
+    scraper.create_team_base_table(save=True)
+    full = (data_directory / 'Team_Stats.csv').read_bytes()
+    scraper.create_team_base_table(save=True, seasons=['2010-2011', '2018-2019'])
+    assert (data_directory / 'Team_Stats.csv').read_bytes() == full
+
+
+RATINGS_PAGE = ('<html><body><table id="ratings"><thead><tr><th>Team</th><th>W</th></tr></thead>'
+                '<tbody><tr><td>Boston Celtics</td><td>{0}</td></tr></tbody></table></body></html>')
+
+
+@pytest.fixture
+def ratings_pages(tmp_path, monkeypatch):
+    """Response cache whose ratings pages report one more win on every request."""
+    requests = []
+
+    def fetch(url, headers):
+        requests.append(url)
+        return FakeResponse(RATINGS_PAGE.format(len(requests)))
+
+    cache = ResponseCache(fetch, str(tmp_path))
+    monkeypatch.setattr(scraper, 'http_cache', cache)
+    scraper.scrape_season_ratings.cache_clear()
+    yield cache, requests
+    scraper.scrape_season_ratings.cache_clear()
+
+
+def test_completed_seasons_are_memoized(ratings_pages):
+    cache, requests = ratings_pages
+    cache.ttl = 0
+    assert scraper.scrape_season_ratings(2019)['W'].tolist() == [1]
+    assert scraper.scrape_season_ratings(2019)['W'].tolist() == [1]
+    assert len(requests) == 1
+
+
+def test_current_season_is_refreshed_once_stale(ratings_pages):
+    cache, requests = ratings_pages
+    season = datetime.date.today().year + 1
+    assert scraper.scrape_season_ratings(season)['W'].tolist() == [1]
+    assert scraper.scrape_season_ratings(season)['W'].tolist() == [1]
+    cache.ttl = 0
+    assert scraper.scrape_season_ratings(season)['W'].tolist() == [2]
+    assert len(requests) == 2
@@ -0,0 +1,39 @@
+# Project: NBA Correlations App
+# Description: Linkage cache shared by parallel pipeline stages
+# Data Sources: Basketball-Reference
+
+import os
+from multiprocessing import get_context
+
+import numpy as np
+
+import statistic_clusters
+
+
+def _cluster(task):
+    directory, seed = task
+    rng = np.random.default_rng(seed % 3)
+    corr = np.corrcoef(rng.normal(size=(12, 40)))
+    statistics = ['STAT_{0}'.format(statistic) for statistic in range(12)]
+    for _ in range(10):
+        merges = statistic_clusters.cached_linkage(corr, statistics, directory=directory)
+        np.testing.assert_array_equal(merges, statistic_clusters.linkage(
+            statistic_clusters.correlation_distance(corr), 'complete'))
+    return True
+
+
+def test_parallel_processes_share_the_linkage_cache(tmp_path, monkeypatch):
+    # A cache of one entry makes every process prune files the others load
+    monkeypatch.setattr(statistic_clusters, 'LINKAGE_CACHE_SIZE', 1)
+    with get_context('fork').Pool(4) as pool:
+        assert all(pool.map(_cluster, [(str(tmp_path), seed) for seed in range(12)]))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_pruned_linkage_is_a_cache_miss(tmp_path):
+    corr = np.corrcoef(np.random.default_rng(0).normal(size=(5, 30)))
+    statistics = list('ABCDE')
+    merges = statistic_clusters.cached_linkage(corr, statistics, directory=str(tmp_path))
+    for name in os.listdir(tmp_path):
+        os.remove(os.path.join(tmp_path, name))
+    np.testing.assert_array_equal(statistic_clusters.cached_linkage(corr, statistics, directory=str(tmp_path)), merges)
@@ -0,0 +1,80 @@
+# Project: NBA Correlations App
+# Description: Columnar and partitioned storage shared by parallel pipeline stages
+# Data Sources: Basketball-Reference
+
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+import storage
+
+
+def _team_stats(seasons, teams=4):
+    return pd.DataFrame({'SEASON': np.repeat(seasons, teams),
+                         'TEAM': ['Team {0}'.format(team) for team in range(teams)] * len(seasons),
+                         'W': np.arange(len(seasons) * teams) % 50 + 20,
+                         'MOV': np.linspace(-8.25, 8.25, len(seasons) * teams)})
+
+
+def _write_partitioned(task):
+    directory, name = task
+    for _ in range(5):
+        storage.write_partitioned(_team_stats(['2018-19', '2019-20']), name, directory=directory)
+    return name
+
+
+def _partitioned_entry(task):
+    directory, csv_directory = task
+    return sorted(storage.partitioned_entry('Team_Stats', directory, csv_directory)['partitions'])
+
+
+def _publish(directory):
+    for _ in range(50):
+        storage.publish(['Team_Stats'], directory)
+        assert storage.read_publication(directory)['tables'] == ['Team_Stats']
+    return True
+
+
+def test_parallel_publishers_write_whole_markers(tmp_path):
+    with get_context('fork').Pool(4) as pool:
+        assert all(pool.map(_publish, [str(tmp_path)] * 8))
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_parallel_partitioning_keeps_every_catalog_entry(tmp_path):
+    directory = str(tmp_path / 'partitioned')
+    names = ['Table_{0}'.format(table) for table in range(8)]
+    with get_context('fork').Pool(4) as pool:
+        pool.map(_write_partitioned, [(directory, name) for name in names])
+    catalog = storage.read_catalog(directory)
+    assert sorted(catalog['tables']) == names
+    assert not list((tmp_path / 'partitioned').glob('*.tmp'))
+
+
+def test_parallel_readers_of_a_stale_table_partition_it_once(tmp_path):
+    directory, csv_directory = str(tmp_path / 'partitioned'), str(tmp_path)
+    _team_stats(['2018-19', '2019-20', '2020-21']).to_csv(tmp_path / 'Team_Stats.csv', index=False)
+    with get_context('fork').Pool(4) as pool:
+        results = pool.map(_partitioned_entry, [(directory, csv_directory)] * 8)
+    assert results == [['2018-19', '2019-20', '2020-21']] * 8
+    df = storage.load_partitioned('Team_Stats', ['2019-20'], directory=directory, csv_directory=csv_directory)
+    assert list(df['TEAM'].astype(str)) == ['Team {0}'.format(team) for team in range(4)]
+
+
+def test_input_floats_load_exactly(tmp_path):
+    df = pd.DataFrame({'PRECISE': [0.123456, 0.654321, np.nan],
+                       'HALVES': [0.5, -1.25, 3.0],
+                       'PUBLISHED': [0.329, 0.1, 105.4]})
+    schema = storage.write_table(df, 'Team_Stats', str(tmp_path))
+    assert [entry['dtype'] for entry in schema['columns']] == ['float64', 'float32', 'float64']
+    pd.testing.assert_frame_equal(storage.load_table('Team_Stats', directory=str(tmp_path),
+                                                     csv_directory=str(tmp_path)), df)
+
+
+def test_rounding_is_opt_in_and_lossless(tmp_path):
+    df = pd.DataFrame({'PUBLISHED': [0.329, 0.1, 105.4], 'PRECISE': [0.123456, 0.654321, 0.5]})
+    schema = storage.write_table(df, 'Team_Stats', str(tmp_path), decimals=3)
+    assert [entry['dtype'] for entry in schema['columns']] == ['float32', 'float64']
+    pd.testing.assert_frame_equal(storage.load_table('Team_Stats', directory=str(tmp_path),
+                                                     csv_directory=str(tmp_path)), df)
@@ -0,0 +1,85 @@
+# Project: NBA Correlations App
+# Description: Equivalence of the streaming correlation accumulators with pandas
+# Data Sources: Basketball-Reference
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation_engine import METHODS, correlation_matrices
+from streaming import CovarianceAccumulator, streaming_correlations
+from test_correlation_engine import assert_matches, values
+
+STATISTICS = list('abcdefgh')
+
+
+def accumulate(chunks):
+    """Accumulator of the chunks, merged pairwise in reverse order."""
+    accumulators = [CovarianceAccumulator.from_values(chunk, STATISTICS) for chunk in chunks]
+    merged = CovarianceAccumulator(STATISTICS)
+    for accumulator in reversed(accumulators):
+        merged = accumulator.merge(merged)
+    return merged
+
+
+@pytest.mark.parametrize('sizes', [[80], [1, 79], [30, 7, 43], [10] * 8])
+def test_merged_chunks_match_pandas(values, sizes):
+    chunks = np.split(values, np.cumsum(sizes)[:-1])
+    accumulator = accumulate(chunks)
+    df = pd.DataFrame(values)
+    assert_matches(accumulator.correlation(), df.corr())
+    assert_matches(accumulator.covariance(), df.cov())
+
+
+def test_updates_match_pandas(values):
+    accumulator = CovarianceAccumulator(STATISTICS)
+    for chunk in np.split(values, [25, 50]):
+        accumulator.update(chunk)
+    assert_matches(accumulator.correlation(min_periods=40), pd.DataFrame(values).corr(min_periods=40))
+
+
+def test_saved_accumulators_merge(values, tmp_path):
+    accumulate([values[:40]]).save(str(tmp_path / 'first.npz'))
+    accumulate([values[40:]]).save(str(tmp_path / 'second.npz'))
+    merged = CovarianceAccumulator.load(str(tmp_path / 'first.npz'))
+    merged.merge(CovarianceAccumulator.load(str(tmp_path / 'second.npz')))
+    assert merged.statistics == STATISTICS
+    assert_matches(merged.correlation(), pd.DataFrame(values).corr())
+
+
+def test_different_statistics_do_not_merge(values):
+    with pytest.raises(ValueError):
+        CovarianceAccumulator(STATISTICS).merge(CovarianceAccumulator(STATISTICS[::-1]))
+
+
+@pytest.fixture
+def csv_paths(values, tmp_path):
+    """The observations split over two .csv files with a text column."""
+    df = pd.DataFrame(values, columns=STATISTICS)
+    df.insert(0, 'TEAM', 'Boston Celtics')
+    paths = [str(tmp_path / 'first.csv'), str(tmp_path / 'second.csv')]
+    df[:50].to_csv(paths[0], index=False, float_format='%.17g')
+    df[50:].to_csv(paths[1], index=False, float_format='%.17g')
+    return paths
+
+
+def test_streamed_pearson_matches_pandas(values, csv_paths):
+    frame = streaming_correlations(csv_paths, ['pearson'], chunksize=16)['pearson']
+    expected = pd.DataFrame(values, columns=STATISTICS).corr()
+    assert list(frame.columns) == STATISTICS
+    assert_matches(frame, expected)
+
+
+def test_streamed_spearman_uses_column_level_ranks(values, csv_paths):
+    frame = streaming_correlations(csv_paths, METHODS, chunksize=16)['spearman']
+    assert_matches(frame, correlation_matrices(values, ['spearman'], common_rows=False)['spearman'])
+    # Pairs of fully observed statistics match pandas exactly
+    complete = STATISTICS[:4]
+    expected = pd.DataFrame(values, columns=STATISTICS).corr('spearman')
+    assert_matches(frame.loc[complete, complete], expected.loc[complete, complete])
+
+
+def test_approximate_ranks_are_exact_below_the_sketch_size(values, csv_paths):
+    exact = streaming_correlations(csv_paths, ['spearman'], chunksize=16)['spearman']
+    approximate = streaming_correlations(csv_paths, ['spearman'], rank_mode='approximate', chunksize=16)
+    assert_matches(approximate['spearman'], exact)
@@ -0,0 +1,79 @@
+# Project: NBA Correlations App
+# Description: Equivalence of the lxml table extractor with pd.read_html on fixture pages
+# Data Sources: Basketball-Reference
+
+import pandas as pd
+import pytest
+
+import fixtures
+import scraper
+from tables import compare_extraction, extract_tables, find_tables
+
+SUMMARY_URLS = [scraper.SEASON_SUMMARY_URL.format(season) for season in fixtures.FIXTURE_SEASONS]
+RATINGS_URLS = [scraper.SEASON_RATINGS_URL.format(season) for season in fixtures.FIXTURE_SEASONS]
+SHOOTING_TABLES = ['team_shooting', 'opponent_shooting']
+
+
+@pytest.fixture(scope='module')
+def pages():
+    """Fixture pages by URL, replayed from the recorded response cache."""
+    cache = fixtures.fixture_cache()
+    return {url: cache.get(url) for url in SUMMARY_URLS + RATINGS_URLS}
+
+
+@pytest.mark.parametrize('url', SUMMARY_URLS)
+@pytest.mark.parametrize('table_id', scraper.SEASON_SUMMARY_TABLES)
+def test_summary_tables_match_read_html(pages, url, table_id):
+    assert compare_extraction(pages[url], [table_id]) == {}
+
+
+@pytest.mark.parametrize('url', RATINGS_URLS)
+def test_ratings_table_matches_read_html(pages, url):
+    assert compare_extraction(pages[url], [scraper.SEASON_RATINGS_TABLE]) == {}
+
+
+@pytest.mark.parametrize('url', SUMMARY_URLS)
+def test_every_summary_table_is_extracted(pages, url):
+    assert sorted(extract_tables(pages[url], scraper.SEASON_SUMMARY_TABLES)) == \
+        sorted(scraper.SEASON_SUMMARY_TABLES)
+
+
+@pytest.mark.parametrize('url', SUMMARY_URLS)
+@pytest.mark.parametrize('table_id', SHOOTING_TABLES)
+def test_shooting_over_headers_are_flattened(pages, url, table_id):
+    names = list(extract_tables(pages[url], [table_id])[table_id].columns)
+    expected = [' '.join(part for part in (group, name) if part)
+                for group, group_names in fixtures.SHOOTING_HEADER for name in group_names]
+    assert names[:len(expected)] == expected
+
+
+def test_comment_embedded_table_is_found(pages):
+    # Summary tables ship inside HTML comments after placeholder divs
+    page = pages[SUMMARY_URLS[0]]
+    assert '<!--' in page.split('id="team-stats-per_poss"')[0].rsplit('placeholder', 1)[1]
+    assert 'team-stats-per_poss' in find_tables(page, ['team-stats-per_poss'])
+
+
+def test_document_table_is_found(pages):
+    # The ratings table is part of the document itself
+    page = pages[RATINGS_URLS[0]]
+    assert '<!--' not in page
+    assert scraper.SEASON_RATINGS_TABLE in find_tables(page, [scraper.SEASON_RATINGS_TABLE])
+
+
+def test_document_and_comment_tables_on_one_page():
+    page = ('<html><body>'
+            '<table id="direct"><thead><tr><th>Team</th><th>W</th></tr></thead>'
+            '<tbody><tr><td>Boston Celtics</td><td>49</td></tr><tr><td>Utah Jazz</td><td>50</td></tr></tbody></table>'
+            '<div class="placeholder"></div>\n<!--\n'
+            '<table id="commented"><thead>'
+            '<tr><th colspan="2"></th><th colspan="2">Dunks</th></tr>'
+            '<tr><th>Rk</th><th>Team</th><th>%FGA</th><th>#</th></tr></thead>'
+            '<tbody><tr><td>1</td><td>Boston Celtics</td><td>.051</td><td>1,204</td></tr>'
+            '<tr><td>2</td><td>Utah Jazz</td><td></td><td>987</td></tr></tbody></table>\n-->'
+            '</body></html>')
+    tables = extract_tables(page, ['direct', 'commented', 'missing'])
+    assert sorted(tables) == ['commented', 'direct']
+    assert list(tables['commented'].columns) == ['Rk', 'Team', 'Dunks %FGA', 'Dunks #']
+    pd.testing.assert_series_equal(tables['commented']['Dunks #'], pd.Series([1204, 987], name='Dunks #'))
+    assert compare_extraction(page, ['direct', 'commented', 'missing']) == {}